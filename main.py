@@ -46,9 +46,11 @@ def generate_session_id():
     return str(uuid.uuid4())
 
 
-def main(mode, user_id, session_id):
+def main(mode, user_id, session_id, pipeline="multi-agent"):
     configure_logging()
-    front_end = FrontEnd(mode=mode, user_id=user_id, session_id=session_id)
+    front_end = FrontEnd(
+        mode=mode, user_id=user_id, session_id=session_id, pipeline=pipeline
+    )
     front_end.run_flask()
 
 
@@ -64,10 +66,21 @@ if __name__ == "__main__":
         help="Set the mode for the FrontEnd (semantic or episodic)",
     )
     parser.add_argument("--user", required=True, help="Provide the user ID string")
+    parser.add_argument(
+        "--pipeline",
+        choices=["multi-agent", "fused"],
+        default="multi-agent",
+        help="Extract memories with the agent graph or a single fused LLM call",
+    )
 
     # Parse arguments
     args = parser.parse_args()
 
     session_id = str(generate_session_id())
 
-    main(mode=args.mode, user_id=args.user, session_id=session_id)
+    main(
+        mode=args.mode,
+        user_id=args.user,
+        session_id=session_id,
+        pipeline=args.pipeline,
+    )
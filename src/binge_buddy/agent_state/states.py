@@ -6,13 +6,14 @@ from binge_buddy.message import Message, MessageDict, UserMessage
 
 
 class AgentStateDict(TypedDict, total=False):  # total=False makes all fields optional
+    state_type: str
     user_id: str
     existing_memories: List[MemoryDict]
     current_user_message: MessageDict
     contains_information: Optional[bool]
     extracted_memories: Optional[List[MemoryDict]]
     needs_repair: Optional[bool]
-    repair_message: Optional[Message]
+    repair_message: Optional[MessageDict]
     retry_count: int
 
 
@@ -42,6 +43,7 @@ class AgentState(ABC):
     def as_dict(self) -> AgentStateDict:
         """Convert state object to dictionary for LangGraph compatibility."""
         return {
+            "state_type": self.state_type,
             "user_id": self.user_id,
             "existing_memories": [mem.as_dict() for mem in self.existing_memories],
             "current_user_message": self.current_user_message.as_dict(),
@@ -52,35 +54,53 @@ class AgentState(ABC):
                 else None
             ),
             "needs_repair": self.needs_repair,
-            "repair_message": self.repair_message.as_dict(),
+            "repair_message": (
+                self.repair_message.as_dict() if self.repair_message else None
+            ),
             "retry_count": self.retry_count,
         }
 
     @classmethod
     def from_dict(cls, data: AgentStateDict) -> "AgentState":
-        """Reconstructs an AgentState object from a dictionary."""
-        return cls(
+        """
+        Reconstructs an AgentState object from a dictionary, as the subclass
+        named in `state_type` when called on `AgentState` itself.
+        """
+        if cls is AgentState:
+            if data.get("state_type") == "episodic":
+                return EpisodicAgentState.from_dict(data)
+            return SemanticAgentState.from_dict(data)
+
+        state = cls(
             user_id=data["user_id"],
             existing_memories=[Memory.from_dict(m) for m in data["existing_memories"]],
             current_user_message=UserMessage.from_dict(data["current_user_message"]),
-            contains_information=data.get("contains_information"),
-            extracted_memories=(
-                [Memory.from_dict(m) for m in data["extracted_memories"]]
-                if data.get("extracted_memories")
-                else None
-            ),
-            needs_repair=data.get("needs_repair"),
-            repair_message=data.get("repair_message"),
-            retry_count=data.get("retry_count"),
         )
+        state.contains_information = data.get("contains_information")
+        state.extracted_memories = (
+            [Memory.from_dict(m) for m in data["extracted_memories"]]
+            if data.get("extracted_memories")
+            else None
+        )
+        state.needs_repair = data.get("needs_repair")
+        state.repair_message = (
+            Message.from_dict(data["repair_message"])
+            if data.get("repair_message")
+            else None
+        )
+        state.retry_count = data.get("retry_count") or 0
+        return state
 
 
 class SemanticAgentStateDict(AgentStateDict):
     aggregated_memories: Optional[List[MemoryDict]]
+    approved_memories: Optional[List[MemoryDict]]
 
 
 class SemanticAgentState(AgentState):
     aggregated_memories: Optional[List[Memory]] = None
+    # The last aggregation the reviewer approved, kept while a repair is in progress
+    approved_memories: Optional[List[Memory]] = None
 
     def __init__(
         self,
@@ -95,17 +115,38 @@ class SemanticAgentState(AgentState):
             state_type="semantic",
         )
         self.aggregated_memories = None
+        self.approved_memories = None
 
     def as_dict(self) -> SemanticAgentStateDict:
-        """Extend `as_dict()` to include `aggregated_memories`."""
+        """Extend `as_dict()` to include `aggregated_memories` and `approved_memories`."""
         base_dict = super().as_dict()
         base_dict["aggregated_memories"] = (
             [mem.as_dict() for mem in self.aggregated_memories]
             if self.aggregated_memories
             else None
         )
+        base_dict["approved_memories"] = (
+            [mem.as_dict() for mem in self.approved_memories]
+            if self.approved_memories
+            else None
+        )
         return base_dict
 
+    @classmethod
+    def from_dict(cls, data: SemanticAgentStateDict) -> "SemanticAgentState":
+        state = super().from_dict(data)
+        state.aggregated_memories = (
+            [Memory.from_dict(m) for m in data["aggregated_memories"]]
+            if data.get("aggregated_memories")
+            else None
+        )
+        state.approved_memories = (
+            [Memory.from_dict(m) for m in data["approved_memories"]]
+            if data.get("approved_memories")
+            else None
+        )
+        return state
+
 
 class EpisodicAgentState(AgentState):
     def __init__(
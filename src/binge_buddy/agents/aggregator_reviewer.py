@@ -1,27 +1,27 @@
 import json
 import logging
 import re
+from typing import Dict, Optional
 
 from langchain.llms.base import LLM
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import AIMessage
-from langchain_core.runnables import RunnableLambda
 
 from binge_buddy import utils
 from binge_buddy.agent_state.states import AgentState, SemanticAgentState
 from binge_buddy.agents.base_agent import BaseAgent
 from binge_buddy.message import AgentMessage
+from binge_buddy.metrics import metrics
 from binge_buddy.ollama import OllamaLLM
 
 
 class AggregatorReviewer(BaseAgent):
-    def __init__(self, llm: LLM):
+    name = "aggregator_reviewer"
+
+    def __init__(self, llm: LLM, stable_prefix: Optional[bool] = None):
         super().__init__(
             llm=llm,
+            stable_prefix=stable_prefix,
             system_prompt_initial="""
 You are an expert memory reviewer ensuring that aggregated user memories are reasonably accurate, broadly complete, and free from major issues.
 
@@ -81,13 +81,13 @@ Be relaxed and trust small imperfections. Only flag things if they truly break t
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
+                self.system_prompt(),
                 MessagesPlaceholder(variable_name="existing_memories", optional=True),
                 MessagesPlaceholder(variable_name="extracted_memories"),
                 MessagesPlaceholder(variable_name="aggregated_memories"),
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.llm_runnable = self.build_llm_runnable()
         self.aggregator_reviewer_runnable = self.prompt | self.llm_runnable
 
     def parse_model_output(self, response):
@@ -111,7 +111,7 @@ Be relaxed and trust small imperfections. Only flag things if they truly break t
         # If the format is unrecognized, return as UNKNOWN
         return {"status": "UNKNOWN", "message": response}
 
-    def process(self, state: AgentState) -> AgentState:
+    def _prepare_messages(self, state: AgentState) -> Dict:
         if not isinstance(state, SemanticAgentState):
             raise TypeError(f"Expected SemanticAgentState, got {type(state).__name__}")
 
@@ -145,7 +145,9 @@ Be relaxed and trust small imperfections. Only flag things if they truly break t
         else:
             messages["existing_memories"] = []
 
-        response = self.aggregator_reviewer_runnable.invoke(messages)
+        return messages
+
+    def _update_state(self, state: AgentState, response: str) -> AgentState:
         response = utils.remove_think_tags(response)
 
         parsed_output = self.parse_model_output(response)
@@ -153,7 +155,12 @@ Be relaxed and trust small imperfections. Only flag things if they truly break t
         if parsed_output["status"] == "APPROVED":
             state.needs_repair = False
             state.retry_count = 0
+            if isinstance(state, SemanticAgentState):
+                state.approved_memories = state.aggregated_memories
         else:
+            if parsed_output["status"] == "UNKNOWN":
+                metrics.inc("parse_failures", agent=self.name)
+            metrics.inc("repairs_requested", agent=self.name)
             state.needs_repair = True
             state.repair_message = AgentMessage(
                 content=parsed_output["message"],
@@ -165,3 +172,15 @@ Be relaxed and trust small imperfections. Only flag things if they truly break t
         logging.info(f"Aggregator Reviewer Reasoning: {parsed_output['message']}")
 
         return state
+
+    def process(self, state: AgentState) -> AgentState:
+        response = self.aggregator_reviewer_runnable.invoke(
+            self._prepare_messages(state)
+        )
+        return self._update_state(state, response)
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+        response = await self.aggregator_reviewer_runnable.ainvoke(
+            self._prepare_messages(state)
+        )
+        return self._update_state(state, response)
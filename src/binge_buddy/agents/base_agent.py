@@ -1,14 +1,67 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 
+from langchain_core.runnables import RunnableLambda
+
+from binge_buddy import prompts
 from binge_buddy.agent_state.states import AgentState, AgentStateDict
 from binge_buddy.ollama import OllamaLLM
+from binge_buddy.prompts import stable_prefix_enabled
+from binge_buddy.structured_output import structured_output_enabled
 
 
 class BaseAgent(ABC):
-    def __init__(self, llm: OllamaLLM, system_prompt_initial: str):
+    # Identifies the agent in cache statistics, matches its node name in the workflows
+    name: str = "agent"
+    # Generation ends as soon as the visible answer contains one of these
+    stop: Optional[List[str]] = None
+    # Upper bound on the visible answer, the hidden <think> reasoning does not count
+    max_tokens: Optional[int] = None
+
+    def __init__(
+        self,
+        llm: OllamaLLM,
+        system_prompt_initial: str,
+        structured_output: Optional[bool] = None,
+        stable_prefix: Optional[bool] = None,
+    ):
         self.llm = llm
         self.system_prompt_initial = system_prompt_initial
+        # Ask the backend for JSON matching a schema instead of scraping free text
+        self.structured_output = structured_output_enabled(structured_output)
+        # Keep the system prompt identical across calls so providers can cache it
+        self.stable_prefix = stable_prefix_enabled(stable_prefix)
+
+    def system_prompt(self):
+        """Returns the system message for the agent's `ChatPromptTemplate`, see `prompts.system_prompt`."""
+        return prompts.system_prompt(self.system_prompt_initial, self.stable_prefix)
+
+    def build_llm_runnable(self, **llm_kwargs) -> RunnableLambda:
+        """
+        Wraps the LLM in a runnable that calls `_call` on `invoke` and the native
+        async `_acall` on `ainvoke`, so async workflows never block a thread.
+
+        Keyword arguments set to None (e.g. `response_schema` outside of
+        structured-output mode) are not passed on.
+        """
+        llm_kwargs.setdefault("stop", self.stop)
+        llm_kwargs.setdefault("max_tokens", self.max_tokens)
+        llm_kwargs = {k: v for k, v in llm_kwargs.items() if v is not None}
+        llm_kwargs.setdefault("agent", self.name)
+
+        def call(prompt):
+            return self.llm._call(prompt, **llm_kwargs)
+
+        async def acall(prompt):
+            return await self.llm._acall(prompt, **llm_kwargs)
+
+        return RunnableLambda(call, afunc=acall)
 
     @abstractmethod
     def process(self, state: AgentState) -> AgentState:
         pass
+
+    @abstractmethod
+    async def aprocess(self, state: AgentState) -> AgentState:
+        """Async variant of `process`."""
+        pass
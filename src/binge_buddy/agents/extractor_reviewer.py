@@ -1,27 +1,27 @@
 import json
 import logging
 import re
+from typing import Dict, Optional
 
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import AIMessage
-from langchain_core.runnables import RunnableLambda
 
 from binge_buddy import utils
 from binge_buddy.agent_state.states import AgentState, AgentStateDict
 from binge_buddy.agents.base_agent import BaseAgent
 from binge_buddy.memory import SemanticMemory
 from binge_buddy.message import AgentMessage
+from binge_buddy.metrics import metrics
 from binge_buddy.ollama import OllamaLLM
 
 
 class ExtractorReviewer(BaseAgent):
-    def __init__(self, llm: OllamaLLM):
+    name = "memory_reviewer"
+
+    def __init__(self, llm: OllamaLLM, stable_prefix: Optional[bool] = None):
         super().__init__(
             llm=llm,
+            stable_prefix=stable_prefix,
             system_prompt_initial="""
                 You are an expert memory reviewer.
 
@@ -79,12 +79,12 @@ class ExtractorReviewer(BaseAgent):
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
+                self.system_prompt(),
                 MessagesPlaceholder(variable_name="current_user_message"),
                 MessagesPlaceholder(variable_name="extracted_memories"),
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.llm_runnable = self.build_llm_runnable()
         self.memory_reviewer_runnable = self.prompt | self.llm_runnable
 
     def parse_model_output(self, response):
@@ -103,8 +103,7 @@ class ExtractorReviewer(BaseAgent):
         # If the format is unrecognized, return as UNKNOWN
         return {"status": "UNKNOWN", "message": response}
 
-    def process(self, state: AgentState) -> AgentState:
-
+    def _prepare_messages(self, state: AgentState) -> Dict:
         messages = {}
 
         messages["current_user_message"] = [
@@ -118,9 +117,10 @@ class ExtractorReviewer(BaseAgent):
                 )
             )
         ]
-        response = utils.remove_think_tags(
-            self.memory_reviewer_runnable.invoke(messages)
-        )
+        return messages
+
+    def _update_state(self, state: AgentState, response: str) -> AgentState:
+        response = utils.remove_think_tags(response)
 
         parsed_output = self.parse_model_output(response)
 
@@ -128,6 +128,9 @@ class ExtractorReviewer(BaseAgent):
             state.needs_repair = False
             state.retry_count = 0
         else:
+            if parsed_output["status"] == "UNKNOWN":
+                metrics.inc("parse_failures", agent=self.name)
+            metrics.inc("repairs_requested", agent=self.name)
             state.needs_repair = True
             state.repair_message = AgentMessage(
                 content=parsed_output["message"],
@@ -139,3 +142,13 @@ class ExtractorReviewer(BaseAgent):
         logging.info(f"Extractor Reviewer Reasoning: {parsed_output['message']}")
 
         return state
+
+    def process(self, state: AgentState) -> AgentState:
+        response = self.memory_reviewer_runnable.invoke(self._prepare_messages(state))
+        return self._update_state(state, response)
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+        response = await self.memory_reviewer_runnable.ainvoke(
+            self._prepare_messages(state)
+        )
+        return self._update_state(state, response)
@@ -0,0 +1,145 @@
+import logging
+import re
+from typing import List, Optional
+
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from binge_buddy import utils
+from binge_buddy.agent_state.states import AgentState
+from binge_buddy.agents.base_agent import BaseAgent
+from binge_buddy.memory import Memory
+from binge_buddy.metrics import metrics
+from binge_buddy.ollama import OllamaLLM
+from binge_buddy.structured_output import (
+    ATTRIBUTES,
+    load_memories,
+    memory_list_schema,
+)
+
+FUSED_MEMORIES_SCHEMA = memory_list_schema("fused_memories", True)
+
+# Memories longer than this are explanations rather than facts
+MAX_INFORMATION_LENGTH = 300
+
+
+class FusedMemoryAgent(BaseAgent):
+    """
+    Detects, extracts and attributes the memories of a message in one structured
+    call, replacing the sentinel, extractor, reviewer and attributor round-trips.
+
+    The answer is checked locally instead of by reviewer agents, see `validate`.
+    """
+
+    name = "fused_memory_agent"
+
+    def __init__(self, llm: OllamaLLM, stable_prefix: Optional[bool] = None):
+        # The single call is only cheap if its answer never needs repairing
+        super().__init__(
+            llm=llm,
+            structured_output=True,
+            stable_prefix=stable_prefix,
+            system_prompt_initial="""
+                You build a user's movie preference profile in a single pass.
+
+                Read the user message and return every piece of information about the user's movie and TV preferences that is worth remembering, each with the attribute it belongs to. If the message contains nothing worth remembering, return an empty list.
+
+                ### **Attributes to Choose From:**
+                - **LIKES:** Movies and genres the user likes.
+                - **DISLIKES:** Movies and genres the user dislikes.
+                - **FAVORITE:** Favorite movies.
+                - **WANTS_TO_WATCH:** Movies the user wants to watch.
+                - **PLATFORM:** Preferred streaming platforms.
+                - **GENRE:** Preferred genres.
+                - **PERSONALITY:** The user’s personality regarding movies.
+                - **WATCHING_HABIT:** Watching habits.
+                - **FREQUENCY:** How often the user watches movies/shows.
+                - **AVOID:** Categories the user avoids.
+                - **CHARACTER_PREFERENCES:** Preferred character types.
+                - **SHOW_LENGTH:** Preferred show length.
+                - **REWATCHER:** Whether the user enjoys rewatching content.
+                - **POPULARITY:** Preference for mainstream vs. niche content.
+
+                ### **Rules**
+                - Only record what the user said about themselves, never guess.
+                - Each memory is one short fact in the third person, e.g. "Likes psychological thrillers".
+                - Split a message with several facts into several memories.
+
+                ### **Correct Output Format**
+                {{"memories": [{{"information": "Likes psychological thrillers", "attribute": "GENRE"}}, {{"information": "Watches mostly on Netflix", "attribute": "PLATFORM"}}]}}
+                """,
+        )
+
+        self.prompt = ChatPromptTemplate.from_messages(
+            [
+                self.system_prompt(),
+                MessagesPlaceholder(variable_name="messages"),
+            ]
+        )
+        self.llm_runnable = self.build_llm_runnable(
+            response_schema=FUSED_MEMORIES_SCHEMA
+        )
+        self.fused_runnable = self.prompt | self.llm_runnable
+
+    @staticmethod
+    def validate(memories: List, message: str) -> List[dict]:
+        """
+        Returns the well-formed memories of a response: known attribute, short
+        non-empty information that shares a word with the message, no duplicates.
+        """
+        message_words = set(re.findall(r"[a-z0-9]{4,}", message.lower()))
+        valid, seen = [], set()
+        for memory in memories:
+            if not isinstance(memory, dict):
+                reason = "malformed"
+            else:
+                information = str(memory.get("information") or "").strip()
+                attribute = str(memory.get("attribute") or "").strip().upper()
+                words = set(re.findall(r"[a-z0-9]{4,}", information.lower()))
+                if attribute not in ATTRIBUTES:
+                    reason = "attribute"
+                elif not information or len(information) > MAX_INFORMATION_LENGTH:
+                    reason = "length"
+                elif message_words and not words & message_words:
+                    reason = "ungrounded"
+                elif (information.lower(), attribute) in seen:
+                    reason = "duplicate"
+                else:
+                    seen.add((information.lower(), attribute))
+                    valid.append({"information": information, "attribute": attribute})
+                    continue
+
+            metrics.inc("fused_rejected_memories", reason=reason)
+            logging.info(f"Fused memory agent rejected {memory!r}: {reason}")
+        return valid
+
+    def _update_state(self, state: AgentState, response: str) -> AgentState:
+        response = utils.remove_think_tags(response)
+        logging.info(f"Fused memory agent response: {response}")
+
+        memories = self.validate(
+            load_memories(response), state.current_user_message.content
+        )
+        state.extracted_memories = [
+            Memory.create(
+                information=mem["information"],
+                attribute=mem["attribute"],
+                state=state,
+            )
+            for mem in memories
+        ]
+        state.contains_information = bool(state.extracted_memories)
+
+        logging.info(f"Fused memories: {state.extracted_memories}")
+        return state
+
+    def process(self, state: AgentState) -> AgentState:
+        response = self.fused_runnable.invoke(
+            [state.current_user_message.to_langchain_message()]
+        )
+        return self._update_state(state, response)
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+        response = await self.fused_runnable.ainvoke(
+            [state.current_user_message.to_langchain_message()]
+        )
+        return self._update_state(state, response)
@@ -2,15 +2,10 @@ import ast
 import json
 import logging
 import re
-from typing import List
+from typing import Dict, List, Optional
 
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import AIMessage
-from langchain_core.runnables import RunnableLambda
 
 from binge_buddy import utils
 from binge_buddy.agent_state.states import (
@@ -20,13 +15,24 @@ from binge_buddy.agent_state.states import (
 )
 from binge_buddy.agents.base_agent import BaseAgent
 from binge_buddy.memory import Memory, SemanticMemory
+from binge_buddy.metrics import metrics
 from binge_buddy.ollama import OllamaLLM
+from binge_buddy.structured_output import AGGREGATED_MEMORIES_SCHEMA, load_memories
 
 
 class MemoryAggregator(BaseAgent):
-    def __init__(self, llm: OllamaLLM):
+    name = "memory_aggregator"
+
+    def __init__(
+        self,
+        llm: OllamaLLM,
+        structured_output: Optional[bool] = None,
+        stable_prefix: Optional[bool] = None,
+    ):
         super().__init__(
             llm=llm,
+            structured_output=structured_output,
+            stable_prefix=stable_prefix,
             system_prompt_initial="""
                 You are a supervisor responsible for aggregating user movie preference memories into a structured format.
 
@@ -86,7 +92,7 @@ class MemoryAggregator(BaseAgent):
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
+                self.system_prompt(),
                 MessagesPlaceholder(variable_name="existing_memories", optional=True),
                 MessagesPlaceholder(variable_name="extracted_memories"),
                 MessagesPlaceholder(
@@ -94,10 +100,24 @@ class MemoryAggregator(BaseAgent):
                 ),  # Holds the repair message if present
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.llm_runnable = self.build_llm_runnable(
+            response_schema=(
+                AGGREGATED_MEMORIES_SCHEMA if self.structured_output else None
+            )
+        )
         self.memory_aggregator_runnable = self.prompt | self.llm_runnable
 
     def format_memories(self, response: str, state: AgentState) -> List[Memory]:
+        if self.structured_output:
+            return [
+                Memory.create(
+                    information=mem["information"].strip(),
+                    attribute=mem["attribute"],
+                    state=state,
+                )
+                for mem in load_memories(response, with_attribute=True)
+            ]
+
         # Extract the part inside brackets using regex
         match = re.search(r"\[\s*{.*?}\s*\]", response, re.DOTALL)
 
@@ -130,15 +150,19 @@ class MemoryAggregator(BaseAgent):
         except (SyntaxError, ValueError):
             return []  # Return empty list if parsing fails
 
-    def process(self, state: AgentState) -> AgentState:
+    def _prepare_messages(self, state: AgentState) -> Optional[Dict]:
+        """
+        Builds the prompt inputs, switching to repair mode if the reviewer asked for it.
 
+        Returns None when there is nothing to aggregate or the repair budget is exhausted.
+        """
         if state.state_type != "semantic":
-            return state
+            return None
 
         messages = {}
 
         if state.extracted_memories is None:
-            return state
+            return None
 
         messages["extracted_memories"] = [
             AIMessage(
@@ -163,7 +187,7 @@ class MemoryAggregator(BaseAgent):
         if state.needs_repair and state.repair_message is not None:
             if state.retry_count > 20:
                 state.aggregated_memories = []
-                return state
+                return None
 
             messages["repair_message"] = [state.repair_message.to_langchain_message()]
 
@@ -171,11 +195,14 @@ class MemoryAggregator(BaseAgent):
             state.needs_repair = False
             state.repair_message = None
 
-        response = self.memory_aggregator_runnable.invoke(messages)
+        return messages
 
+    def _update_state(self, state: AgentState, response: str) -> AgentState:
         response = utils.remove_think_tags(response)
 
         aggregated_memories_with_attributes = self.format_memories(response, state)
+        if not aggregated_memories_with_attributes and not self.structured_output:
+            metrics.inc("parse_failures", agent=self.name)
 
         logging.info(f"Memory Aggregator response: {response}")
 
@@ -193,3 +220,19 @@ class MemoryAggregator(BaseAgent):
         state.aggregated_memories = aggregated_memories_with_attributes
 
         return state
+
+    def process(self, state: AgentState) -> AgentState:
+        messages = self._prepare_messages(state)
+        if messages is None:
+            return state
+
+        response = self.memory_aggregator_runnable.invoke(messages)
+        return self._update_state(state, response)
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+        messages = self._prepare_messages(state)
+        if messages is None:
+            return state
+
+        response = await self.memory_aggregator_runnable.ainvoke(messages)
+        return self._update_state(state, response)
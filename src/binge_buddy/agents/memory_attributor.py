@@ -2,27 +2,33 @@ import ast
 import json
 import logging
 import re
-from typing import List
+from typing import Dict, List, Optional
 
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import AIMessage
-from langchain_core.runnables import RunnableLambda
 
 from binge_buddy import utils
 from binge_buddy.agent_state.states import AgentState
 from binge_buddy.agents.base_agent import BaseAgent
 from binge_buddy.memory import Memory
+from binge_buddy.metrics import metrics
 from binge_buddy.ollama import OllamaLLM
+from binge_buddy.structured_output import ATTRIBUTED_MEMORIES_SCHEMA, load_memories
 
 
 class MemoryAttributor(BaseAgent):
-    def __init__(self, llm: OllamaLLM):
+    name = "memory_attributor"
+
+    def __init__(
+        self,
+        llm: OllamaLLM,
+        structured_output: Optional[bool] = None,
+        stable_prefix: Optional[bool] = None,
+    ):
         super().__init__(
             llm=llm,
+            structured_output=structured_output,
+            stable_prefix=stable_prefix,
             system_prompt_initial="""
                 You are a highly accurate memory attributor.
 
@@ -75,16 +81,30 @@ class MemoryAttributor(BaseAgent):
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
+                self.system_prompt(),
                 MessagesPlaceholder(
                     variable_name="extracted_memories"
                 ),  # Holds the list of extracted memories
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.llm_runnable = self.build_llm_runnable(
+            response_schema=(
+                ATTRIBUTED_MEMORIES_SCHEMA if self.structured_output else None
+            )
+        )
         self.memory_aggregator_runnable = self.prompt | self.llm_runnable
 
     def format_memories(self, response: str, state: AgentState) -> List[Memory]:
+        if self.structured_output:
+            return [
+                Memory.create(
+                    information=mem["information"].strip(),
+                    attribute=mem["attribute"],
+                    state=state,
+                )
+                for mem in load_memories(response, with_attribute=True)
+            ]
+
         # Extract the part inside brackets using regex
         match = re.search(r"\[\s*{.*?}\s*\]", response, re.DOTALL)
 
@@ -117,8 +137,7 @@ class MemoryAttributor(BaseAgent):
         except (SyntaxError, ValueError):
             return []  # Return empty list if parsing fails
 
-    def process(self, state: AgentState) -> AgentState:
-
+    def _prepare_messages(self, state: AgentState) -> Dict:
         messages = {}
 
         assert (
@@ -131,21 +150,15 @@ class MemoryAttributor(BaseAgent):
                 )
             )
         ]
+        return messages
 
-        response = self.memory_aggregator_runnable.invoke(messages)
-
+    def _parse_response(self, response: str, state: AgentState):
         response = utils.remove_think_tags(response)
+        return response, self.format_memories(response, state)
 
-        memories_with_attributes = self.format_memories(response, state)
-
-        # Attempt to run the pipeline once again
-        if not memories_with_attributes:
-            response = self.memory_aggregator_runnable.invoke(messages)
-
-            response = utils.remove_think_tags(response)
-
-            memories_with_attributes = self.format_memories(response, state)
-
+    def _update_state(
+        self, state: AgentState, response: str, memories_with_attributes: List[Memory]
+    ) -> AgentState:
         logging.info(f"Memory Attributor response: {response}")
 
         logging.info(f"Attributed Memories: {memories_with_attributes}")
@@ -153,3 +166,36 @@ class MemoryAttributor(BaseAgent):
         state.extracted_memories = memories_with_attributes
 
         return state
+
+    def process(self, state: AgentState) -> AgentState:
+
+        messages = self._prepare_messages(state)
+
+        response, memories_with_attributes = self._parse_response(
+            self.memory_aggregator_runnable.invoke(messages), state
+        )
+
+        # Attempt to run the pipeline once again, unless the output was schema constrained
+        if not memories_with_attributes and not self.structured_output:
+            metrics.inc("parse_failures", agent=self.name)
+            response, memories_with_attributes = self._parse_response(
+                self.memory_aggregator_runnable.invoke(messages), state
+            )
+
+        return self._update_state(state, response, memories_with_attributes)
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+
+        messages = self._prepare_messages(state)
+
+        response, memories_with_attributes = self._parse_response(
+            await self.memory_aggregator_runnable.ainvoke(messages), state
+        )
+
+        if not memories_with_attributes and not self.structured_output:
+            metrics.inc("parse_failures", agent=self.name)
+            response, memories_with_attributes = self._parse_response(
+                await self.memory_aggregator_runnable.ainvoke(messages), state
+            )
+
+        return self._update_state(state, response, memories_with_attributes)
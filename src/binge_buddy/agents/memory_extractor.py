@@ -4,26 +4,32 @@ import logging
 import re
 from typing import Dict, List, Optional
 
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import AIMessage
-from langchain_core.runnables import RunnableLambda
 
 from binge_buddy import utils
 from binge_buddy.agent_state.states import AgentState, AgentStateDict
 from binge_buddy.agents.base_agent import BaseAgent
 from binge_buddy.memory import EpisodicMemory, Memory, SemanticMemory
 from binge_buddy.message import AgentMessage
+from binge_buddy.metrics import metrics
 from binge_buddy.ollama import OllamaLLM
+from binge_buddy.structured_output import EXTRACTED_MEMORIES_SCHEMA, load_memories
 
 
 class MemoryExtractor(BaseAgent):
-    def __init__(self, llm: OllamaLLM):
+    name = "memory_extractor"
+
+    def __init__(
+        self,
+        llm: OllamaLLM,
+        structured_output: Optional[bool] = None,
+        stable_prefix: Optional[bool] = None,
+    ):
         super().__init__(
             llm=llm,
+            structured_output=structured_output,
+            stable_prefix=stable_prefix,
             system_prompt_initial="""
                 You are a supervisor managing a team of movie recommendation experts.
 
@@ -109,7 +115,7 @@ class MemoryExtractor(BaseAgent):
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
+                self.system_prompt(),
                 MessagesPlaceholder(
                     variable_name="current_user_message"
                 ),  # Holds the latest user message
@@ -121,10 +127,20 @@ class MemoryExtractor(BaseAgent):
                 ),  # Holds extracted memories if repair mode is active
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.llm_runnable = self.build_llm_runnable(
+            response_schema=(
+                EXTRACTED_MEMORIES_SCHEMA if self.structured_output else None
+            )
+        )
         self.memory_extractor_runnable = self.prompt | self.llm_runnable
 
     def format_memories(self, response: str, state: AgentState) -> List[Memory]:
+        if self.structured_output:
+            return [
+                Memory.create(information=mem.strip(), state=state)
+                for mem in load_memories(response)
+            ]
+
         # Extract the part inside brackets using regex (handling newlines properly)
         match = re.search(r"\[\s*([\s\S]*?)\s*\]", response)
 
@@ -158,8 +174,12 @@ class MemoryExtractor(BaseAgent):
             )  # Optional logging for debugging
             return []  # Return empty list if parsing fails
 
-    def process(self, state: AgentState) -> AgentState:
+    def _prepare_messages(self, state: AgentState) -> Optional[Dict]:
+        """
+        Builds the prompt inputs, switching to repair mode if the reviewer asked for it.
 
+        Returns None when the repair budget is exhausted.
+        """
         messages = {
             "current_user_message": [state.current_user_message.to_langchain_message()]
         }
@@ -171,7 +191,7 @@ class MemoryExtractor(BaseAgent):
         ):
             if state.retry_count > 20:
                 state.extracted_memories = []
-                return state
+                return None
 
             messages["repair_message"] = [state.repair_message.to_langchain_message()]
             messages["memories_to_repair"] = [
@@ -186,23 +206,16 @@ class MemoryExtractor(BaseAgent):
             state.needs_repair = False
             state.repair_message = None
 
-        # Run the pipeline and get the response
-        response = utils.remove_think_tags(
-            self.memory_extractor_runnable.invoke(messages)
-        )
-        response = response.split("Memory Extractor Result:", 1)[-1].strip()
-
-        memories = self.format_memories(response, state)
-
-        if not memories:
-            # Attempt to run the pipeline again just to make sure it's not a parsing error
-            response = utils.remove_think_tags(
-                self.memory_extractor_runnable.invoke(messages)
-            )
-            response = response.split("Memory Extractor Result:", 1)[-1].strip()
+        return messages
 
-            memories = self.format_memories(response, state)
+    def _parse_response(self, response: str, state: AgentState):
+        response = utils.remove_think_tags(response)
+        response = response.split("Memory Extractor Result:", 1)[-1].strip()
+        return response, self.format_memories(response, state)
 
+    def _update_state(
+        self, state: AgentState, response: str, memories: List[Memory]
+    ) -> AgentState:
         # Log the extracted response
         logging.info(f"Memory Extractor response: {response}")
         logging.info(f"Extracted Memories: {memories}")
@@ -210,3 +223,41 @@ class MemoryExtractor(BaseAgent):
         state.extracted_memories = memories
 
         return state
+
+    def process(self, state: AgentState) -> AgentState:
+
+        messages = self._prepare_messages(state)
+        if messages is None:
+            return state
+
+        # Run the pipeline and get the response
+        response, memories = self._parse_response(
+            self.memory_extractor_runnable.invoke(messages), state
+        )
+
+        if not memories and not self.structured_output:
+            # Attempt to run the pipeline again just to make sure it's not a parsing error
+            metrics.inc("parse_failures", agent=self.name)
+            response, memories = self._parse_response(
+                self.memory_extractor_runnable.invoke(messages), state
+            )
+
+        return self._update_state(state, response, memories)
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+
+        messages = self._prepare_messages(state)
+        if messages is None:
+            return state
+
+        response, memories = self._parse_response(
+            await self.memory_extractor_runnable.ainvoke(messages), state
+        )
+
+        if not memories and not self.structured_output:
+            metrics.inc("parse_failures", agent=self.name)
+            response, memories = self._parse_response(
+                await self.memory_extractor_runnable.ainvoke(messages), state
+            )
+
+        return self._update_state(state, response, memories)
@@ -1,23 +1,38 @@
 import logging
+from typing import Optional
 
 from langchain.llms.base import LLM
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
-from langchain_core.runnables import RunnableLambda
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from binge_buddy import utils
 from binge_buddy.agent_state.states import AgentState, AgentStateDict
 from binge_buddy.agents.base_agent import BaseAgent
 from binge_buddy.ollama import OllamaLLM
+from binge_buddy.sentinel_prefilter import SentinelPrefilter
 
 
 class MemorySentinel(BaseAgent):
-    def __init__(self, llm: LLM):
+    name = "sentinel"
+    # The answer is a single TRUE or FALSE
+    stop = ["\n"]
+    max_tokens = 5
+
+    def __init__(
+        self,
+        llm: LLM,
+        stable_prefix: Optional[bool] = None,
+        prefilter: Optional[SentinelPrefilter] = None,
+    ):
+        """
+        :param prefilter: Answers confident negatives such as "ok" or "thanks"
+            without the LLM, defaults to `SentinelPrefilter.from_env()`.
+        """
+        self.prefilter = (
+            prefilter if prefilter is not None else SentinelPrefilter.from_env()
+        )
         super().__init__(
             llm=llm,
+            stable_prefix=stable_prefix,
             system_prompt_initial="""
             Your job is to assess a brief chat history in order to determine if the conversation contains any details about a user's watching habits regarding streaming content. 
             You are part of a team building a knowledge base regarding a user's watching habits to assist in highly customized streaming content recommendations.
@@ -70,7 +85,7 @@ class MemorySentinel(BaseAgent):
 
         self.prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
+                self.system_prompt(),
                 MessagesPlaceholder(variable_name="messages"),
                 (
                     "system",
@@ -78,18 +93,58 @@ class MemorySentinel(BaseAgent):
                 ),
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.llm_runnable = self.build_llm_runnable()
         self.memory_sentinel_runnable = self.prompt | self.llm_runnable
 
+    def _prefilter(self, state: AgentState) -> Optional[bool]:
+        """
+        Returns False if the prefilter skips the LLM for the message, True if the
+        skip is audited by the LLM anyway and None if the message escalates.
+        """
+        if self.prefilter is None or not self.prefilter.should_skip(
+            state.current_user_message.content
+        ):
+            return None
+        if self.prefilter.should_audit():
+            return True
+        logging.info("Sentinel prefilter: no information, skipping the LLM")
+        state.contains_information = False
+        return False
+
+    def _record_audit(self, state: AgentState, audited: Optional[bool]):
+        if audited:
+            self.prefilter.record_audit(state.contains_information)
+
     def process(self, state: AgentState) -> AgentState:
+        audited = self._prefilter(state)
+        if audited is False:
+            return state
 
         # Run the pipeline and get the response
-        response = utils.remove_think_tags(
-            self.memory_sentinel_runnable.invoke(
-                [state.current_user_message.to_langchain_message()]
-            )
+        response = self.memory_sentinel_runnable.invoke(
+            [state.current_user_message.to_langchain_message()]
+        )
+
+        state = self._update_state(state, response)
+        self._record_audit(state, audited)
+        return state
+
+    async def aprocess(self, state: AgentState) -> AgentState:
+        audited = self._prefilter(state)
+        if audited is False:
+            return state
+
+        response = await self.memory_sentinel_runnable.ainvoke(
+            [state.current_user_message.to_langchain_message()]
         )
 
+        state = self._update_state(state, response)
+        self._record_audit(state, audited)
+        return state
+
+    def _update_state(self, state: AgentState, response: str) -> AgentState:
+        response = utils.remove_think_tags(response)
+
         # Return True/False based on the response
         state.contains_information = response.lower() == "true"
 
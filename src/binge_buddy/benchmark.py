@@ -0,0 +1,149 @@
+"""Compares the memory pipelines' LLM calls and latency against the fake LLM server"""
+
+import argparse
+import logging
+import os
+import statistics
+import time
+from typing import Dict, List
+
+from binge_buddy.agent_state.states import EpisodicAgentState, SemanticAgentState
+from binge_buddy.fake_llm_server import FakeLLMServer
+from binge_buddy.memory_handler import MemoryHandler
+from binge_buddy.memory_workflow.episodic_workflow import EpisodicWorkflow
+from binge_buddy.memory_workflow.fused_workflow import FusedWorkflow
+from binge_buddy.memory_workflow.multi_agent_workflow import MultiAgentWorkflow
+from binge_buddy.memory_workflow.semantic_workflow import SemanticWorkflow
+from binge_buddy.message import UserMessage
+from binge_buddy.ollama import BaseHTTPLLM, OllamaLLM, OpenAILLM
+
+SAMPLE_MESSAGES = [
+    "I love sci-fi movies like The Matrix, but I hate horror.",
+    "I watch mostly on Netflix and sometimes on Hulu.",
+    "Can you recommend something for tonight?",
+    "My favorite movie is Inception.",
+    "I want to watch Dune Part Two this weekend.",
+    "I usually binge a whole series in one weekend.",
+    "Thanks, that sounds good!",
+    "I prefer underrated hidden gems over mainstream blockbusters.",
+]
+
+
+class DiscardingMemoryHandler(MemoryHandler):
+    """Counts the memories it is given instead of storing them, so no database is needed."""
+
+    def __init__(self):
+        super().__init__(memory_db=None)
+        self.stored = 0
+
+    def process(self, state):
+        memories = (
+            state.aggregated_memories
+            if isinstance(state, SemanticAgentState)
+            else state.extracted_memories
+        )
+        self.stored += len(memories or [])
+
+    def load_memories(self, user_id: str):
+        return []
+
+
+def build_workflow(
+    pipeline: str, mode: str, memory_handler: MemoryHandler, llm: BaseHTTPLLM
+) -> MultiAgentWorkflow:
+    if pipeline == "fused":
+        return FusedWorkflow(memory_handler, llm=llm)
+    if mode == "semantic":
+        return SemanticWorkflow(memory_handler, llm=llm)
+    return EpisodicWorkflow(memory_handler, llm=llm)
+
+
+def run_pipeline(
+    pipeline: str,
+    mode: str,
+    llm: BaseHTTPLLM,
+    server: FakeLLMServer,
+    messages: List[str],
+) -> Dict[str, float]:
+    """Processes every message one after the other and returns the pipeline's statistics."""
+    memory_handler = DiscardingMemoryHandler()
+    workflow = build_workflow(pipeline, mode, memory_handler, llm)
+    state_cls = SemanticAgentState if mode == "semantic" else EpisodicAgentState
+
+    calls_before = sum(server.stats().values())
+    latencies = []
+    for i, content in enumerate(messages):
+        message = UserMessage(
+            content=content, role="user", session_id="benchmark", user_id=f"user-{i}"
+        )
+        state = state_cls(
+            user_id=message.user_id, existing_memories=[], current_user_message=message
+        )
+        started = time.perf_counter()
+        workflow.run(state)
+        latencies.append(time.perf_counter() - started)
+
+    calls = sum(server.stats().values()) - calls_before
+    return {
+        "messages": len(messages),
+        "calls_per_message": calls / len(messages),
+        "mean_seconds": statistics.mean(latencies),
+        "p50_seconds": statistics.median(latencies),
+        "max_seconds": max(latencies),
+        "memories_stored": memory_handler.stored,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["ollama", "openai"], default="ollama")
+    parser.add_argument("--mode", choices=["semantic", "episodic"], default="semantic")
+    parser.add_argument(
+        "--pipelines",
+        nargs="+",
+        choices=["multi-agent", "fused"],
+        default=["multi-agent", "fused"],
+    )
+    parser.add_argument(
+        "--messages",
+        type=int,
+        default=len(SAMPLE_MESSAGES),
+        help="Messages per pipeline",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Seconds before the first token"
+    )
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=50.0, help="0 streams instantly"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Every message has to reach the server, the fake one does not check the key
+    os.environ["LLM_CACHE_SIZE"] = "0"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    messages = [SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)] for i in range(args.messages)]
+    with FakeLLMServer(
+        port=0, latency=args.latency, tokens_per_second=args.tokens_per_second
+    ) as server:
+        if args.backend == "ollama":
+            llm = OllamaLLM(port=server.port, check_model="eager")
+        else:
+            llm = OpenAILLM(temperature=0.0)
+            llm.base_url = f"{server.url}/v1"
+
+        print(
+            f"{'pipeline':<12} {'calls/msg':>9} {'mean s':>8} {'p50 s':>8} {'max s':>8} {'stored':>7}"
+        )
+        for pipeline in args.pipelines:
+            result = run_pipeline(pipeline, args.mode, llm, server, messages)
+            print(
+                f"{pipeline:<12} {result['calls_per_message']:>9.2f} "
+                f"{result['mean_seconds']:>8.3f} {result['p50_seconds']:>8.3f} "
+                f"{result['max_seconds']:>8.3f} {result['memories_stored']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,52 @@
 import json
 import logging
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-)
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableLambda
 
 from binge_buddy import utils
+from binge_buddy.llm_registry import get_llm
 from binge_buddy.memory import Memory
 from binge_buddy.memory_db import MemoryDB
 from binge_buddy.memory_handler import MemoryHandler, SemanticMemoryHandler
 from binge_buddy.message import AgentMessage, Message, UserMessage
 from binge_buddy.message_log import MessageLog
-from binge_buddy.ollama import OllamaLLM, OpenAILLM
+from binge_buddy.metrics import metric_labels, metrics
+from binge_buddy.ollama import OllamaLLM
+from binge_buddy.ollama_sessions import sessions_enabled
+from binge_buddy.prompts import stable_prefix_enabled, system_prompt
 
 
 class ConversationalAgent:
     memories: Optional[List[Memory]] = None
+    # The model sometimes continues the chat log on its own, cut the reply there
+    stop = ["HumanMessage", "SystemMessage", "AIMessage"]
 
     def __init__(
-        self, llm: OllamaLLM, message_log: MessageLog, memory_handler: MemoryHandler
+        self,
+        llm: OllamaLLM,
+        message_log: MessageLog,
+        memory_handler: MemoryHandler,
+        stable_prefix: Optional[bool] = None,
+        sessions: Optional[bool] = None,
     ):
         """
         Initializes the BingeBuddy conversational agent.
 
         :param llm: The LLM model to use (e.g., OllamaLLM).
         :param message_log: The message_log that it needs to be observing
+        :param stable_prefix: Keep the system prompt identical across calls so
+            it can be served from the provider's prompt cache, see `prompts.system_prompt`.
+        :param sessions: Continue the conversation's Ollama session so that every
+            turn only sends the new message, see `OllamaLLM._build_payload`.
         """
         self.llm = llm
         self.message_log = message_log
         self.memory_handler = memory_handler
+        self.stable_prefix = stable_prefix_enabled(stable_prefix)
+        self.sessions = sessions_enabled(sessions) and isinstance(llm, OllamaLLM)
         # System prompt for the memory sentinel to decide whether to store information
         self.system_prompt_initial = """
             You are a conversational movie and TV show recommendation assistant "Binge Buddy". Your goal is to provide users with natural, engaging, and concise recommendations based on their preferences. Keep responses friendly and to the point—avoid long-winded explanations.
@@ -60,21 +73,49 @@ class ConversationalAgent:
 
             Your goal is to make discovering movies and shows fun and effortless! Do not ask too many questions and suggest movies where possible.
         """
+        if self.stable_prefix:
+            # Least to most frequently changing, the log only grows between turns
+            placeholders = ["message_logs", "memories", "message"]
+        else:
+            placeholders = ["message", "memories", "message_logs"]
         self.prompt = ChatPromptTemplate.from_messages(
+            [system_prompt(self.system_prompt_initial, self.stable_prefix)]
+            + [MessagesPlaceholder(variable_name=name) for name in placeholders]
+        )
+        # What a turn adds to a session, the earlier turns are in its context
+        self.delta_prompt = ChatPromptTemplate.from_messages(
             [
-                SystemMessagePromptTemplate.from_template(self.system_prompt_initial),
-                MessagesPlaceholder(variable_name="message"),
                 MessagesPlaceholder(variable_name="memories"),
-                MessagesPlaceholder(variable_name="message_logs"),
+                MessagesPlaceholder(variable_name="message"),
             ]
         )
-        self.llm_runnable = RunnableLambda(lambda x: self.llm._call(x))
+        self.conversational_agent_runnable = RunnableLambda(self._respond)
 
-        self.conversational_agent_runnable = self.prompt | self.llm_runnable
+    def _session_kwargs(self, inputs: dict, replay: bool = False) -> dict:
+        """
+        Returns the session arguments of an LLM call. With `replay` the full
+        prompt is sent and the session starts over from it.
+        """
+        if not self.sessions:
+            return {}
+        session_kwargs = {
+            "session_id": f"{self.message_log.user_id}:{self.message_log.session_id}"
+        }
+        if not replay:
+            session_kwargs["session_delta"] = self.delta_prompt.invoke(inputs)
+        return session_kwargs
+
+    def _respond(self, inputs: dict, replay: bool = False) -> str:
+        return self.llm._call(
+            self.prompt.invoke(inputs),
+            stop=self.stop,
+            agent="conversational_agent",
+            **self._session_kwargs(inputs, replay),
+        )
 
-    def process_message(self, message: Message) -> str:
+    def _build_inputs(self, message: Message) -> dict:
         """
-        Analyzes the current message and provide a response.
+        Fetches the user's memories, logs the message and returns the prompt inputs.
         """
         existing_memories = self.memory_handler.get_existing_memories(message.user_id)
         if existing_memories:
@@ -95,44 +136,41 @@ class ConversationalAgent:
 
         # Add the message to the log to trigger the memory workflow before calling the agent
         self.add_user_message(message)
-        # Run the pipeline and get the response
-        response = utils.remove_think_tags(
-            self.conversational_agent_runnable.invoke(
-                {
-                    "message": [message.to_langchain_message()],
-                    "message_logs": list(
-                        map(
-                            lambda message: message.to_langchain_message(),
-                            self.message_log,
-                        )
-                    ),
-                    "memories": memories,
-                }
-            )
-        )
 
-        # Very stupid but just retry generating a response if it's not proper
-        if (
-            "HumanMessage" in response
-            or "SystemMessage" in response
-            or "AIMessage" in response
-        ) or not isinstance(response, str):
+        return {
+            "message": [message.to_langchain_message()],
+            "message_logs": list(
+                map(
+                    lambda message: message.to_langchain_message(),
+                    self.message_log,
+                )
+            ),
+            "memories": memories,
+        }
+
+    def process_message(self, message: Message) -> str:
+        """
+        Analyzes the current message and provide a response.
+        """
+        inputs = self._build_inputs(message)
+
+        with metric_labels(user_id=message.user_id):
             # Run the pipeline and get the response
             response = utils.remove_think_tags(
-                self.conversational_agent_runnable.invoke(
-                    {
-                        "message": [message.to_langchain_message()],
-                        "message_logs": list(
-                            map(
-                                lambda message: message.to_langchain_message(),
-                                self.message_log,
-                            )
-                        ),
-                        "memories": memories,
-                    }
-                )
+                self.conversational_agent_runnable.invoke(inputs)
             )
 
+            # Retry if nothing was left before a stop sequence or the response is not proper
+            if (
+                not response
+                or "HumanMessage" in response
+                or "SystemMessage" in response
+                or "AIMessage" in response
+            ) or not isinstance(response, str):
+                metrics.inc("parse_failures", agent="conversational_agent")
+                # Replay the whole conversation so the session drops the bad answer
+                response = utils.remove_think_tags(self._respond(inputs, replay=True))
+
         agent_message = AgentMessage(
             content=response, user_id=message.user_id, session_id=message.session_id
         )
@@ -140,6 +178,35 @@ class ConversationalAgent:
 
         return response
 
+    def process_message_stream(self, message: Message) -> Iterator[str]:
+        """
+        Same as `process_message`, but yields the response tokens as they are generated.
+
+        The complete response is added to the message log once the stream is exhausted.
+        """
+        inputs = self._build_inputs(message)
+        prompt_value = self.prompt.invoke(inputs)
+
+        chunks = []
+        for chunk in self.llm.stream(
+            prompt_value,
+            agent="conversational_agent",
+            stop=self.stop,
+            **self._session_kwargs(inputs),
+        ):
+            if not chunk:
+                # A stream without a visible answer ends with one empty chunk
+                continue
+            chunks.append(chunk)
+            yield chunk
+
+        response = utils.remove_think_tags("".join(chunks))
+
+        agent_message = AgentMessage(
+            content=response, user_id=message.user_id, session_id=message.session_id
+        )
+        self.message_log.add_message(agent_message)
+
     def add_user_message(self, message: Message):
         self.message_log.add_message(message)
 
@@ -149,8 +216,7 @@ class ConversationalAgent:
 
 if __name__ == "__main__":
     # Initialize the message log and LLM (for now, using a mock LLM)
-    llm = OpenAILLM()
-    # llm = OllamaLLM()
+    llm = get_llm()
     memory_db = MemoryDB()
     mode = "semantic"
     memory_handler = SemanticMemoryHandler(memory_db)
@@ -0,0 +1,89 @@
+"""Maintenance commands for the memory collections in MongoDB"""
+
+import argparse
+import logging
+
+from binge_buddy.memory_db import INDEXES, MemoryDB
+from binge_buddy.memory_handler import EpisodicMemoryHandler
+
+
+def ensure_indexes(memory_db: MemoryDB, args: argparse.Namespace):
+    for collection_name, names in memory_db.ensure_indexes().items():
+        print(f"{collection_name}: {', '.join(names)}")
+
+
+def explain(memory_db: MemoryDB, args: argparse.Namespace):
+    """Shows whether the per-user lookups of the handlers are served by an index."""
+    print(f"{'collection':<24} {'index':>5} {'keys':>6} {'docs':>6} {'ms':>5}  plan")
+    for collection_name in INDEXES:
+        plan = memory_db.explain(collection_name, {"user_id": args.user})
+        print(
+            f"{collection_name:<24} {'yes' if plan['uses_index'] else 'NO':>5} "
+            f"{plan['keys_examined']:>6} {plan['docs_examined']:>6} "
+            f"{plan['millis']:>5}  {' > '.join(plan['stages'])}"
+        )
+
+
+def index_stats(memory_db: MemoryDB, args: argparse.Namespace):
+    """Lists every index with the number of operations that used it."""
+    for collection_name in INDEXES:
+        for entry in memory_db.index_stats(collection_name):
+            print(
+                f"{collection_name:<24} {entry['name']:<20} {entry['ops']:>8} ops "
+                f"since {entry['since']:%Y-%m-%d %H:%M}"
+            )
+
+
+def migrate_episodic(memory_db: MemoryDB, args: argparse.Namespace):
+    """Moves episodes from the one-document-per-user collection into buckets."""
+    handler = EpisodicMemoryHandler(memory_db)
+    totals = handler.migrate_legacy(user_ids=args.user, drop_legacy=args.drop_legacy)
+    print(
+        f"Migrated {totals['episodes']} episodes of {totals['users']} users "
+        f"into {totals['buckets']} buckets"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser(
+        "ensure-indexes", help="Create the indexes the memory handlers need"
+    ).set_defaults(run=ensure_indexes)
+
+    explain_parser = commands.add_parser(
+        "explain", help="Explain the per-user memory lookups"
+    )
+    explain_parser.add_argument("--user", default="user", help="User id to look up")
+    explain_parser.set_defaults(run=explain)
+
+    commands.add_parser(
+        "index-stats", help="Show how often each index is used ($indexStats)"
+    ).set_defaults(run=index_stats)
+
+    migrate_parser = commands.add_parser(
+        "migrate-episodic", help="Move episodic memories into monthly buckets"
+    )
+    migrate_parser.add_argument(
+        "--user", action="append", help="Only migrate this user (repeatable)"
+    )
+    migrate_parser.add_argument(
+        "--drop-legacy",
+        action="store_true",
+        help="Delete each legacy document once it is migrated",
+    )
+    migrate_parser.set_defaults(run=migrate_episodic)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    memory_db = MemoryDB()
+    try:
+        args.run(memory_db, args)
+    finally:
+        memory_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""SQLite-backed job queue that keeps memory workflows across restarts"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from binge_buddy.agent_state.states import AgentState
+from binge_buddy.metrics import metrics
+
+
+class DurableJobQueue:
+    """
+    Persistent queue of workflow jobs, each an `AgentState` stored with `as_dict`.
+
+    The file is opened in WAL mode, so several worker processes on the same
+    machine can share it. A job is leased by one worker at a time:
+
+    - `enqueue` stores a job already leased by this worker, which starts it right away,
+    - `renew` extends the lease before the job runs and tells whether it is still ours,
+    - `complete` deletes a finished job,
+    - `fail` makes the job due again after an exponential backoff, or marks it
+      "dead" after `max_attempts`,
+    - `release` gives a job back without running it, e.g. when it was dropped,
+    - `claim_due` leases retries that are due and jobs whose lease expired,
+      e.g. because the process that held them was restarted.
+
+    `watch` polls `claim_due` in the background and hands the jobs to a callback,
+    which resumes the unfinished work on startup. Jobs this worker holds, from
+    `enqueue` or `claim_due` until they are completed, failed or released, are
+    never claimed again by it, and each poll renews their leases, so a job that
+    waits or runs longer than `lease_seconds` is not taken over.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 5,
+        retry_seconds: float = 5.0,
+        poll_seconds: float = 10.0,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.poll_seconds = poll_seconds
+        # Leases of a restarted process must not look like ours
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Jobs handed to a dispatcher and not finished yet
+        self._held: Set[int] = set()
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workflow_jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "queue TEXT NOT NULL, "
+            "lane TEXT NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "lease_owner TEXT, "
+            "lease_until REAL, "
+            "available_at REAL NOT NULL, "
+            "last_error TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS workflow_jobs_due "
+            "ON workflow_jobs (queue, status, available_at)"
+        )
+
+    def enqueue(self, queue: str, lane: str, state: AgentState) -> int:
+        """Stores a job leased by this worker and returns its id."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO workflow_jobs (queue, lane, payload, status, lease_owner, "
+                "lease_until, available_at, created_at) VALUES (?, ?, ?, 'leased', ?, ?, ?, ?)",
+                (
+                    queue,
+                    lane,
+                    json.dumps(state.as_dict()),
+                    self.owner,
+                    now + self.lease_seconds,
+                    now,
+                    now,
+                ),
+            )
+            self._held.add(cursor.lastrowid)
+        metrics.inc("workflow_durable_jobs", outcome="enqueued")
+        return cursor.lastrowid
+
+    def renew(self, job_ids: List[int]) -> List[int]:
+        """Extends the lease of the jobs this worker still holds and returns their ids."""
+        if not job_ids:
+            return []
+        marks = ",".join("?" * len(job_ids))
+        with self._lock:
+            self._db.execute(
+                f"UPDATE workflow_jobs SET lease_until = ? WHERE id IN ({marks}) "
+                f"AND status = 'leased' AND lease_owner = ?",
+                (time.time() + self.lease_seconds, *job_ids, self.owner),
+            )
+            rows = self._db.execute(
+                f"SELECT id FROM workflow_jobs WHERE id IN ({marks}) "
+                f"AND status = 'leased' AND lease_owner = ?",
+                (*job_ids, self.owner),
+            ).fetchall()
+            owned = {row[0] for row in rows}
+            self._held.difference_update(set(job_ids) - owned)
+        return [job_id for job_id in job_ids if job_id in owned]
+
+    def complete(self, job_ids: List[int]):
+        if not job_ids:
+            return
+        marks = ",".join("?" * len(job_ids))
+        with self._lock:
+            self._db.execute(
+                f"DELETE FROM workflow_jobs WHERE id IN ({marks}) AND lease_owner = ?",
+                (*job_ids, self.owner),
+            )
+            self._held.difference_update(job_ids)
+        metrics.inc("workflow_durable_jobs", len(job_ids), outcome="completed")
+
+    def fail(self, job_ids: List[int], error: str):
+        """Releases the jobs for a later retry, or gives up on them after `max_attempts`."""
+        now = time.time()
+        with self._lock:
+            self._held.difference_update(job_ids)
+            for job_id in job_ids:
+                row = self._db.execute(
+                    "SELECT attempts FROM workflow_jobs WHERE id = ? AND lease_owner = ?",
+                    (job_id, self.owner),
+                ).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                dead = attempts >= self.max_attempts
+                self._db.execute(
+                    "UPDATE workflow_jobs SET status = ?, attempts = ?, lease_owner = NULL, "
+                    "lease_until = NULL, available_at = ?, last_error = ? WHERE id = ?",
+                    (
+                        "dead" if dead else "pending",
+                        attempts,
+                        now + self.retry_seconds * 2 ** (attempts - 1),
+                        error,
+                        job_id,
+                    ),
+                )
+                metrics.inc(
+                    "workflow_durable_jobs", outcome="dead" if dead else "retried"
+                )
+                if dead:
+                    logging.error(
+                        f"Workflow job {job_id} failed {attempts} times, giving up: {error}"
+                    )
+
+    def release(self, job_ids: List[int]):
+        """Makes the jobs due again after `retry_seconds`, without counting an attempt."""
+        if not job_ids:
+            return
+        marks = ",".join("?" * len(job_ids))
+        with self._lock:
+            self._held.difference_update(job_ids)
+            self._db.execute(
+                f"UPDATE workflow_jobs SET status = 'pending', lease_owner = NULL, "
+                f"lease_until = NULL, available_at = ? WHERE id IN ({marks}) "
+                f"AND lease_owner = ?",
+                (time.time() + self.retry_seconds, *job_ids, self.owner),
+            )
+        metrics.inc("workflow_durable_jobs", len(job_ids), outcome="released")
+
+    def claim_due(self, queue: str, limit: int = 32) -> List[Tuple[int, AgentState]]:
+        """
+        Leases up to `limit` due retries and expired jobs of `queue`, oldest first.
+
+        Taking over an expired lease counts as an attempt, so a job that keeps
+        crashing its process eventually stops being resumed. Jobs this worker
+        still holds are skipped even if their lease expired, they are queued or
+        running here already.
+        """
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes never claim the same job
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, payload, status, attempts FROM workflow_jobs WHERE queue = ? AND ("
+                    "(status = 'pending' AND available_at <= ?) OR "
+                    "(status = 'leased' AND lease_until < ?)) ORDER BY id",
+                    (queue, now, now),
+                )
+                jobs = []
+                for job_id, payload, status, attempts in rows.fetchall():
+                    if job_id in self._held:
+                        continue
+                    if len(jobs) == limit:
+                        break
+                    if status == "leased":
+                        attempts += 1
+                    if attempts >= self.max_attempts:
+                        self._db.execute(
+                            "UPDATE workflow_jobs SET status = 'dead', attempts = ?, "
+                            "lease_owner = NULL, lease_until = NULL, "
+                            "last_error = 'lease expired' WHERE id = ?",
+                            (attempts, job_id),
+                        )
+                        metrics.inc("workflow_durable_jobs", outcome="dead")
+                        continue
+                    self._db.execute(
+                        "UPDATE workflow_jobs SET status = 'leased', attempts = ?, "
+                        "lease_owner = ?, lease_until = ? WHERE id = ?",
+                        (attempts, self.owner, now + self.lease_seconds, job_id),
+                    )
+                    self._held.add(job_id)
+                    jobs.append((job_id, payload))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+        claimed = []
+        for job_id, payload in jobs:
+            try:
+                claimed.append((job_id, AgentState.from_dict(json.loads(payload))))
+            except (ValueError, KeyError, TypeError) as e:
+                self.fail([job_id], f"unreadable payload: {e}")
+        if claimed:
+            metrics.inc("workflow_durable_jobs", len(claimed), outcome="resumed")
+        return claimed
+
+    def watch(
+        self, queue: str, dispatch: Callable[[int, AgentState], None]
+    ) -> threading.Thread:
+        """
+        Passes the jobs returned by `claim_due` to `dispatch` every `poll_seconds`,
+        starting right away, until `close` is called. Each poll also renews the
+        leases of the jobs this worker holds, so `poll_seconds` must stay well
+        below `lease_seconds`.
+        """
+
+        def poll():
+            while not self._stop.is_set():
+                try:
+                    self.heartbeat()
+                    for job_id, state in self.claim_due(queue):
+                        dispatch(job_id, state)
+                except Exception as e:
+                    logging.exception(f"Durable queue '{queue}': polling failed: {e}")
+                self._stop.wait(self.poll_seconds)
+
+        thread = threading.Thread(
+            target=poll, name=f"durable-queue-{queue}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def heartbeat(self) -> List[int]:
+        """Renews the leases of every job this worker holds and returns those it still owns."""
+        with self._lock:
+            held = sorted(self._held)
+        return self.renew(held)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of jobs per status."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM workflow_jobs GROUP BY status"
+            ).fetchall()
+        stats = {"pending": 0, "leased": 0, "dead": 0}
+        stats.update(dict(rows))
+        return stats
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._db.close()
+
+
+_default_queue: Optional[DurableJobQueue] = None
+_default_queue_lock = threading.Lock()
+
+
+def get_durable_queue() -> Optional[DurableJobQueue]:
+    """
+    Returns the process-wide durable workflow queue, or None if it is disabled,
+    configured from environment variables:
+
+    - WORKFLOW_QUEUE_PATH SQLite file of the queue (disabled if unset)
+    - WORKFLOW_LEASE_SECONDS how long a worker may hold a job before others take it over (default 300)
+    - WORKFLOW_MAX_ATTEMPTS runs of a failing job before it is marked dead (default 5)
+    - WORKFLOW_RETRY_SECONDS backoff before the first retry, doubled after each failure (default 5)
+    - WORKFLOW_POLL_SECONDS how often leases are renewed and due jobs are picked up (default 10)
+    """
+    global _default_queue
+    path = os.getenv("WORKFLOW_QUEUE_PATH")
+    if not path:
+        return None
+
+    if _default_queue is None:
+        with _default_queue_lock:
+            if _default_queue is None:
+                _default_queue = DurableJobQueue(
+                    path,
+                    lease_seconds=float(os.getenv("WORKFLOW_LEASE_SECONDS", "300")),
+                    max_attempts=int(os.getenv("WORKFLOW_MAX_ATTEMPTS", "5")),
+                    retry_seconds=float(os.getenv("WORKFLOW_RETRY_SECONDS", "5")),
+                    poll_seconds=float(os.getenv("WORKFLOW_POLL_SECONDS", "10")),
+                )
+    return _default_queue
@@ -13,7 +13,7 @@ class Attribute(str, Enum):
     Frequency = "Frequency"
     Avoid = "Avoid"
     Tone = "Tone"
-    Character_Preference = "Character Preference"
+    Character_Preference = "Character Preferences"
     Show_Length = "Show Length"
     Rewatcher = "Rewatcher"
     Popularity = "Popularity"
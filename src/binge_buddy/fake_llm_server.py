@@ -0,0 +1,579 @@
+"""Stand-in for the Ollama and OpenAI HTTP APIs, for offline benchmarking"""
+
+import argparse
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# Phrases from each agent's system prompt that identify who is calling
+AGENT_MARKERS = [
+    ("aggregator_reviewer", "ensuring that aggregated user memories"),
+    ("memory_reviewer", "You are an expert memory reviewer"),
+    ("memory_attributor", "memory attributor"),
+    ("memory_aggregator", "aggregating user movie preference memories"),
+    ("memory_extractor", "managing a team of movie recommendation experts"),
+    ("sentinel", "ONLY RESPOND WITH TRUE OR FALSE"),
+    ("fused_memory_agent", "preference profile in a single pass"),
+    ("conversational_agent", "Binge Buddy"),
+]
+
+# Checked in order, so more specific attributes come before LIKES
+ATTRIBUTE_KEYWORDS = [
+    ("WANTS_TO_WATCH", ("want to watch", "wants to watch", "watchlist", "plan to")),
+    ("FAVORITE", ("favorite", "favourite", "all-time", "all time")),
+    ("DISLIKES", ("hate", "dislike", "don't like", "do not like", "can't stand")),
+    ("AVOID", ("avoid", "never watch", "stay away")),
+    ("PLATFORM", ("netflix", "hulu", "prime video", "disney", "hbo", "apple tv")),
+    ("REWATCHER", ("rewatch", "re-watch", "watch again")),
+    ("SHOW_LENGTH", ("miniseries", "short episodes", "long series", "episode")),
+    ("FREQUENCY", ("every day", "every night", "daily", "weekly", "weekend")),
+    ("WATCHING_HABIT", ("binge", "before bed", "late at night", "with my")),
+    ("CHARACTER_PREFERENCES", ("character", "protagonist", "villain", "hero")),
+    ("POPULARITY", ("mainstream", "niche", "underrated", "hidden gem", "popular")),
+    (
+        "GENRE",
+        (
+            "sci-fi",
+            "scifi",
+            "comed",
+            "horror",
+            "thriller",
+            "drama",
+            "documentar",
+            "anime",
+            "action",
+            "romance",
+            "fantasy",
+        ),
+    ),
+    ("PERSONALITY", ("i am", "i'm a", "mood")),
+    ("LIKES", ("love", "like", "enjoy", "into ")),
+]
+
+CONVERSATIONAL_REPLIES = [
+    "Great taste! If you enjoyed that, try Arrival or Blade Runner 2049 next.",
+    "Sounds fun! How about The Grand Budapest Hotel for something lighter?",
+    "Got it. Dark and twisty it is: Prisoners and Gone Girl are both great picks.",
+]
+
+
+def _split_tokens(text: str) -> List[str]:
+    """Splits text into word-sized chunks that concatenate back to the original."""
+    return re.findall(r"\s*\S+|\s+", text) or [""]
+
+
+def _attribute_of(text: str) -> Optional[str]:
+    lowered = text.lower()
+    for attribute, keywords in ATTRIBUTE_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return attribute
+    return None
+
+
+def _json_lists(messages: List[Tuple[str, str]]) -> List[list]:
+    """Returns every message body that is a JSON list, in order."""
+    lists = []
+    for _, content in messages:
+        try:
+            value = json.loads(content)
+        except ValueError:
+            continue
+        if isinstance(value, list):
+            lists.append(value)
+    return lists
+
+
+class RuleBasedResponder:
+    """
+    Answers each agent's prompt with a deterministic completion in the format it expects.
+
+    Responses for an agent can be scripted instead, in which case they are
+    returned in order and cycled once exhausted.
+    """
+
+    def __init__(self, scripted: Optional[Dict[str, Union[str, List[str]]]] = None):
+        self._scripted = {}
+        for agent, responses in (scripted or {}).items():
+            if isinstance(responses, str):
+                responses = [responses]
+            self._scripted[agent] = itertools.cycle(responses)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def detect_agent(messages: List[Tuple[str, str]]) -> str:
+        system_prompt = messages[0][1] if messages else ""
+        for agent, marker in AGENT_MARKERS:
+            if marker in system_prompt:
+                return agent
+        return "unknown"
+
+    @staticmethod
+    def _user_message(messages: List[Tuple[str, str]]) -> str:
+        for role, content in reversed(messages):
+            if role == "user":
+                return content
+        return ""
+
+    def respond(self, messages: List[Tuple[str, str]]) -> Tuple[str, str]:
+        """Returns the detected agent and its completion for the given chat messages."""
+        agent = self.detect_agent(messages)
+
+        with self._lock:
+            if agent in self._scripted:
+                return agent, next(self._scripted[agent])
+
+        user_message = self._user_message(messages)
+
+        if agent == "sentinel":
+            return agent, "TRUE" if _attribute_of(user_message) else "FALSE"
+
+        if agent == "memory_extractor":
+            return agent, json.dumps(self._extract(user_message))
+
+        if agent in ("memory_reviewer", "aggregator_reviewer"):
+            return agent, "APPROVED"
+
+        if agent == "memory_attributor":
+            memories = next(
+                (
+                    value
+                    for value in reversed(_json_lists(messages))
+                    if all(isinstance(item, str) for item in value)
+                ),
+                [],
+            )
+            return agent, json.dumps(
+                [
+                    {
+                        "information": memory,
+                        "attribute": _attribute_of(memory) or "LIKES",
+                    }
+                    for memory in memories
+                ]
+            )
+
+        if agent == "fused_memory_agent":
+            return agent, json.dumps(
+                [
+                    {"information": memory, "attribute": _attribute_of(memory)}
+                    for memory in self._extract(user_message)
+                ]
+            )
+
+        if agent == "memory_aggregator":
+            return agent, json.dumps(self._aggregate(_json_lists(messages)))
+
+        reply = CONVERSATIONAL_REPLIES[len(user_message) % len(CONVERSATIONAL_REPLIES)]
+        return agent, reply
+
+    @staticmethod
+    def _extract(message: str) -> List[str]:
+        clauses = re.split(r"[.!?;]+|,?\s+but\s+|,\s+and\s+", message)
+        return [
+            clause.strip()[0].upper() + clause.strip()[1:]
+            for clause in clauses
+            if clause.strip() and _attribute_of(clause)
+        ]
+
+    @staticmethod
+    def _aggregate(lists: List[list]) -> List[Dict[str, str]]:
+        """Merges every memory dict found in the prompt so each attribute appears once."""
+        merged: Dict[str, List[str]] = {}
+        for value in lists:
+            for memory in value:
+                if not isinstance(memory, dict) or "information" not in memory:
+                    continue
+                attribute = str(memory.get("attribute") or "LIKES")
+                informations = merged.setdefault(attribute, [])
+                if memory["information"] not in informations:
+                    informations.append(memory["information"])
+        return [
+            {"information": "; ".join(informations), "attribute": attribute}
+            for attribute, informations in merged.items()
+        ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real servers
+    server: "_FakeHTTPServer"
+
+    def log_message(self, format, *args):
+        logging.debug(f"Fake LLM server: {format % args}")
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, body: dict, status: int = 200):
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _send_stream(self, content_type: str, chunks: Iterator[str]):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. it hit a stop sequence), like Ollama we stop generating
+            self.close_connection = True
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(
+                {"models": [{"name": model} for model in self.server.fake.models]}
+            )
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        routes = {
+            "/api/generate": self._ollama_generate,
+            "/api/chat": self._ollama_chat,
+            "/v1/chat/completions": self._openai_chat,
+            "/chat/completions": self._openai_chat,
+        }
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+            return
+        try:
+            route(self._read_json())
+        except (ValueError, KeyError) as e:
+            self._send_json({"error": f"bad request: {e}"}, status=400)
+
+    def _ollama_generate(self, request: dict):
+        # A request continuing a session only carries the new turn, the rest of
+        # the conversation is behind its context
+        history = self.server.fake.resume(request.get("context"))
+        messages = parse_ollama_prompt(request["prompt"])
+        self._ollama_reply(request, messages, key="response", history=history)
+
+    def _ollama_chat(self, request: dict):
+        messages = [(m["role"], m["content"]) for m in request["messages"]]
+        self._ollama_reply(request, messages, key="message")
+
+    def _ollama_reply(self, request: dict, messages, key: str, history=()):
+        model = request.get("model", "")
+        # Like Ollama, only the tokens that were not in the context are evaluated
+        prompt_tokens = sum(len(content) for _, content in messages) // 4
+        conversation = [*history, *messages]
+        tokens = self.server.fake.complete(
+            conversation, structured=isinstance(request.get("format"), dict)
+        )
+
+        def body(text: str) -> dict:
+            if key == "message":
+                return {"message": {"role": "assistant", "content": text}}
+            return {"response": text}
+
+        def final() -> dict:
+            done = {
+                "model": model,
+                "created_at": _timestamp(),
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": len(tokens),
+            }
+            if key == "response":
+                done["context"] = self.server.fake.save_context(
+                    conversation + [("assistant", "".join(tokens))]
+                )
+            return done
+
+        if request.get("stream", True):
+
+            def chunks():
+                for token in self.server.fake.pace(tokens):
+                    yield json.dumps(
+                        {"model": model, "created_at": _timestamp(), "done": False}
+                        | body(token)
+                    ) + "\n"
+                yield json.dumps(final() | body("")) + "\n"
+
+            self._send_stream("application/x-ndjson", chunks())
+        else:
+            self.server.fake.wait(tokens)
+            self._send_json(final() | body("".join(tokens)))
+
+    def _openai_chat(self, request: dict):
+        messages = [(m["role"], m["content"]) for m in request["messages"]]
+        model = request.get("model", "")
+        prompt_tokens = sum(len(content) for _, content in messages) // 4
+        tokens = self.server.fake.complete(
+            messages,
+            structured=(request.get("response_format") or {}).get("type")
+            == "json_schema",
+        )
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            body = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(body | extra)}\n\n"
+
+        if request.get("stream"):
+
+            def chunks():
+                yield chunk({"role": "assistant", "content": ""})
+                for token in self.server.fake.pace(tokens):
+                    yield chunk({"content": token})
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    yield chunk({}, "stop", usage=usage)
+                else:
+                    yield chunk({}, "stop")
+                yield "data: [DONE]\n\n"
+
+            self._send_stream("text/event-stream", chunks())
+        else:
+            self.server.fake.wait(tokens)
+            self._send_json(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": "".join(tokens),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fake: "FakeLLMServer"):
+        super().__init__(address, _Handler)
+        self.fake = fake
+
+
+def _timestamp() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def parse_ollama_prompt(prompt: str) -> List[Tuple[str, str]]:
+    """
+    Splits a prompt built by `OllamaLLM._build_payload` ("Type: content" lines)
+    back into (role, content) messages.
+    """
+    roles = {"System": "system", "Human": "user", "Ai": "assistant"}
+    messages: List[Tuple[str, str]] = []
+    for line in prompt.split("\n"):
+        match = re.match(r"^(System|Human|Ai): ?(.*)$", line)
+        if match:
+            messages.append((roles[match.group(1)], match.group(2)))
+        elif messages:
+            role, content = messages[-1]
+            messages[-1] = (role, f"{content}\n{line}")
+        else:
+            messages.append(("user", line))
+    return messages
+
+
+class FakeLLMServer:
+    """
+    Serves `/api/tags`, `/api/generate`, `/api/chat` and `/v1/chat/completions`
+    with rule-based or scripted completions.
+
+    Every response waits `latency` seconds before the first token and then
+    produces `tokens_per_second` tokens per second (0 means instantly), so
+    benchmarks get a deterministic backend with realistic timing.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 11434,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        responder: Optional[RuleBasedResponder] = None,
+        models: Optional[List[str]] = None,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.responder = responder or RuleBasedResponder()
+        self.models = models or ["deepseek-r1:8b", "gpt-4o-mini"]
+
+        self._httpd = _FakeHTTPServer((host, port), self)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._requests: Dict[str, int] = defaultdict(int)
+        self._contexts: Dict[int, List[Tuple[str, str]]] = {}
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self._httpd.server_address[0]}:{self.port}"
+
+    def complete(
+        self, messages: List[Tuple[str, str]], structured: bool = False
+    ) -> List[str]:
+        """
+        Returns the completion split into tokens. With `structured`, list
+        responses are wrapped in the `{"memories": [...]}` object the
+        structured-output schemas describe.
+        """
+        agent, response = self.responder.respond(messages)
+        if structured:
+            try:
+                value = json.loads(response)
+            except ValueError:
+                value = None
+            if isinstance(value, list):
+                response = json.dumps({"memories": value})
+        with self._lock:
+            self._requests[agent] += 1
+        return _split_tokens(response)
+
+    def save_context(self, messages: List[Tuple[str, str]]) -> List[int]:
+        """
+        Stores a conversation and returns a fake `context` for it, one entry per
+        (estimated) token like Ollama's.
+        """
+        with self._lock:
+            handle = len(self._contexts) + 1
+            self._contexts[handle] = messages
+        return [handle] * max(1, sum(len(content) for _, content in messages) // 4)
+
+    def resume(self, context: Optional[List[int]]) -> List[Tuple[str, str]]:
+        """Returns the conversation behind a context from `save_context`."""
+        if not context:
+            return []
+        with self._lock:
+            return list(self._contexts[context[0]])
+
+    def pace(self, tokens: List[str]) -> Iterator[str]:
+        """Yields tokens at the configured latency and token rate."""
+        time.sleep(self.latency)
+        for token in tokens:
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield token
+
+    def wait(self, tokens: List[str]):
+        """Sleeps as long as streaming `tokens` would take."""
+        duration = self.latency
+        if self.tokens_per_second:
+            duration += len(tokens) / self.tokens_per_second
+        time.sleep(duration)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of completions served per detected agent."""
+        with self._lock:
+            return dict(self._requests)
+
+    def start(self) -> "FakeLLMServer":
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-llm-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a fake Ollama/OpenAI server for offline benchmarking."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds before the first token"
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=0.0,
+        help="Generation speed, 0 answers instantly",
+    )
+    parser.add_argument(
+        "--script",
+        help='JSON file mapping agent names to scripted responses, e.g. {"sentinel": ["TRUE", "FALSE"]}',
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        dest="models",
+        help="Model reported by /api/tags (repeatable)",
+    )
+    args = parser.parse_args()
+
+    scripted = None
+    if args.script:
+        with open(args.script) as f:
+            scripted = json.load(f)
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        responder=RuleBasedResponder(scripted),
+        models=args.models,
+    )
+    logging.info(f"Fake LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
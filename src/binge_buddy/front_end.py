@@ -1,26 +1,45 @@
+import json
 import logging
 import os
 import time
 
-from flask import Flask, jsonify, render_template, request
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    render_template,
+    request,
+    stream_with_context,
+)
 
 from binge_buddy.conversational_agent_manager import ConversationalAgentManager
+from binge_buddy.durable_queue import get_durable_queue
+from binge_buddy.http_pool import get_http_pool
+from binge_buddy.llm_cache import get_llm_cache
+from binge_buddy.llm_dispatcher import get_dispatcher
+from binge_buddy.llm_registry import get_llm
+from binge_buddy.memory_cache import get_memory_cache
 from binge_buddy.memory_db import MemoryDB
 from binge_buddy.memory_handler import EpisodicMemoryHandler, SemanticMemoryHandler
 from binge_buddy.message_log import MessageLog
-from binge_buddy.ollama import OllamaLLM, OpenAILLM
+from binge_buddy.metrics import metrics
 from binge_buddy.perception.audito_transcriber import AudioTranscriber
 from binge_buddy.perception.sentiment_analyzer import SentimentAnalyzer
+from binge_buddy.workflow_executor import get_workflow_executor
 
 
 class FrontEnd:
-    def __init__(self, mode, user_id="user", session_id="session"):
+    def __init__(
+        self, mode, user_id="user", session_id="session", pipeline="multi-agent"
+    ):
         # Set up the Flask app
         self.app = Flask(__name__)
-        # self.llm = OllamaLLM(model="neural-chat:7b")
-        self.llm = OpenAILLM()
+        # Shared client, set LLM_BACKEND=ollama and LLM_MODEL to switch models
+        self.llm = get_llm()
         self.sentiment_analyzer = SentimentAnalyzer()
         self.memory_db = MemoryDB()
+        # Idempotent, so every start makes sure the per-user lookups are indexed
+        self.memory_db.ensure_indexes()
         self.mode = mode
         if self.mode == "semantic":
             memory_handler = SemanticMemoryHandler(self.memory_db)
@@ -35,6 +54,8 @@ class FrontEnd:
             session_id=session_id,
             memory_handler=memory_handler,
             mode=mode,
+            llm=self.llm,
+            pipeline=pipeline,
         )
         self.conversational_agent_manager = ConversationalAgentManager(
             self.llm, self.message_log, memory_handler
@@ -42,6 +63,38 @@ class FrontEnd:
         self.audio_transcriber = AudioTranscriber()
         self.set_up_routes()
 
+    def runtime_gauges(self) -> dict:
+        """Point-in-time state of the shared connection pool, cache, dispatcher and workflow queues."""
+        gauges = {}
+        for key, value in get_http_pool().stats().items():
+            if isinstance(value, (int, float)):
+                gauges[f"http_pool_{key}"] = float(value)
+
+        cache = get_llm_cache()
+        if cache is not None:
+            gauges["llm_cache_entries"] = len(cache)
+
+        memory_cache = get_memory_cache()
+        if memory_cache is not None:
+            memory_stats = memory_cache.stats()
+            gauges["memory_cache_entries"] = memory_stats["entries"]
+            gauges["memory_cache_hit_rate"] = memory_stats["hit_rate"]
+
+        dispatcher = get_dispatcher(self.llm._llm_type)
+        if dispatcher is not None:
+            for key in ("queue_depth", "in_flight", "deduplicated", "batches"):
+                gauges[f"llm_dispatcher_{key}"] = dispatcher.stats()[key]
+
+        workflow_stats = get_workflow_executor().stats()
+        for key in ("queue_depth", "in_flight", "max_wait_seconds"):
+            gauges[f"workflow_{key}"] = workflow_stats[key]
+
+        durable_queue = get_durable_queue()
+        if durable_queue is not None:
+            for status, count in durable_queue.stats().items():
+                gauges[f"workflow_durable_{status}"] = count
+        return gauges
+
     def set_up_routes(self):
         @self.app.route("/")
         def index():
@@ -63,6 +116,41 @@ class FrontEnd:
                 response = ca.process_message(message)
                 return jsonify({"response": response})
 
+        @self.app.route("/send_message_stream", methods=["POST"])
+        def handle_user_message_stream():
+            """Same as /send_message, but streams the response as server-sent events."""
+            data = request.get_json()
+            if "text" not in data:
+                return jsonify({"error": "No text provided"}), 400
+
+            user_message = data["text"]
+            logging.info(f"FrontEnd: User message received (streaming): {user_message}")
+            message = self.sentiment_analyzer.extract_emotion(
+                user_message, self.user_id, self.session_id
+            )
+            ca = self.conversational_agent_manager.get_agent(
+                self.user_id, self.session_id
+            )
+
+            def generate():
+                for token in ca.process_message_stream(message):
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+                yield "event: done\ndata: {}\n\n"
+
+            return Response(
+                stream_with_context(generate()),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        @self.app.route("/metrics")
+        def export_metrics():
+            """Per-agent latency, token and retry metrics in the Prometheus text format."""
+            return Response(
+                metrics.render_prometheus(gauges=self.runtime_gauges()),
+                mimetype="text/plain; version=0.0.4",
+            )
+
         @self.app.route("/upload", methods=["POST"])
         def upload_audio():
             if "audio" not in request.files:
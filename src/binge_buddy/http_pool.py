@@ -0,0 +1,225 @@
+"""Shared keep-alive HTTP connection pool used by the LLM clients"""
+
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  # Only needed to enable HTTP/2 in httpx
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPPool:
+    """
+    Thread-safe pool of keep-alive HTTP connections shared by every LLM client.
+
+    A single `httpx.Client` is used for all requests so TCP connections (and TLS
+    sessions for OpenAI) are reused across agent calls instead of being set up
+    for every request. HTTP/2 is negotiated when the `h2` package is installed.
+
+    Async callers get an `httpx.AsyncClient` with the same limits. Async clients
+    are bound to an event loop, so one is kept per running loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 300.0,
+        connect_timeout: float = 5.0,
+        http2: Optional[bool] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = HTTP2_AVAILABLE if http2 is None else (http2 and HTTP2_AVAILABLE)
+
+        self._client: Optional[httpx.Client] = None
+        # Maps each running event loop to its own httpx.AsyncClient
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "connections_opened": 0,
+            "tls_handshakes": 0,
+            "errors": 0,
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        """Lazily create the underlying client so idle processes hold no sockets."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        limits=self.limits, timeout=self.timeout, http2=self.http2
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Returns the async client for the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    limits=self.limits, timeout=self.timeout, http2=self.http2
+                )
+                self._async_clients[loop] = client
+        return client
+
+    def _increment(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _trace(self, event_name: str, info: dict):
+        """httpcore trace hook, used to count the connections we actually open."""
+        if event_name == "connection.connect_tcp.complete":
+            self._increment("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            self._increment("tls_handshakes")
+
+    async def _atrace(self, event_name: str, info: dict):
+        self._trace(event_name, info)
+
+    def _with_trace(self, kwargs: dict, is_async: bool = False) -> dict:
+        extensions = dict(kwargs.pop("extensions", None) or {})
+        extensions["trace"] = self._atrace if is_async else self._trace
+        kwargs["extensions"] = extensions
+        return kwargs
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request over a pooled connection."""
+        self._increment("requests")
+        try:
+            return self.client.request(method, url, **self._with_trace(kwargs))
+        except httpx.HTTPError:
+            self._increment("errors")
+            raise
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs) -> Iterator[httpx.Response]:
+        """Send a request and yield the response without reading the body."""
+        self._increment("requests")
+        try:
+            with self.client.stream(method, url, **self._with_trace(kwargs)) as r:
+                yield r
+        except httpx.HTTPError:
+            self._increment("errors")
+            raise
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Async variant of `request`."""
+        self._increment("requests")
+        try:
+            return await self.async_client.request(
+                method, url, **self._with_trace(kwargs, is_async=True)
+            )
+        except httpx.HTTPError:
+            self._increment("errors")
+            raise
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def astream(
+        self, method: str, url: str, **kwargs
+    ) -> AsyncIterator[httpx.Response]:
+        """Async variant of `stream`."""
+        self._increment("requests")
+        try:
+            async with self.async_client.stream(
+                method, url, **self._with_trace(kwargs, is_async=True)
+            ) as r:
+                yield r
+        except httpx.HTTPError:
+            self._increment("errors")
+            raise
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns connection-reuse statistics.
+
+        `reused_requests` counts requests served over an already open connection,
+        so under steady load `reuse_ratio` should approach 1.0.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["reused_requests"] = max(
+            stats["requests"] - stats["connections_opened"], 0
+        )
+        stats["reuse_ratio"] = (
+            stats["reused_requests"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        stats["http2"] = self.http2
+        return stats
+
+    def close(self):
+        """Close all pooled sync connections."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """Close the async connections of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+_default_pool: Optional[HTTPPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_http_pool() -> HTTPPool:
+    """
+    Returns the process-wide HTTP pool, configured from environment variables:
+
+    - LLM_HTTP_MAX_CONNECTIONS (default 20)
+    - LLM_HTTP_MAX_KEEPALIVE (default 10)
+    - LLM_HTTP_KEEPALIVE_EXPIRY seconds (default 30)
+    - LLM_HTTP_TIMEOUT seconds (default 300)
+    - LLM_HTTP2 set to "0" to disable HTTP/2 negotiation
+    """
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = HTTPPool(
+                    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(
+                        os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")
+                    ),
+                    keepalive_expiry=float(
+                        os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30")
+                    ),
+                    timeout=float(os.getenv("LLM_HTTP_TIMEOUT", "300")),
+                    http2=os.getenv("LLM_HTTP2", "1") != "0",
+                )
+    return _default_pool
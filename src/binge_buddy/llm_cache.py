@@ -0,0 +1,172 @@
+"""Content-addressed cache for LLM responses"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of LLM completions keyed by a hash of the full request.
+
+    The first tier is an in-memory LRU bounded by `max_entries`. The optional
+    second tier is a SQLite file in WAL mode, so cached responses survive
+    restarts and can be shared by several worker processes on the same machine.
+
+    Only deterministic requests (temperature 0) are cached unless
+    `cache_sampled` is set, otherwise retries of a sampled call would keep
+    returning the same completion.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        path: Optional[str] = None,
+        cache_sampled: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.path = path
+        self.cache_sampled = cache_sampled
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = defaultdict(int)
+        self._misses: Dict[str, int] = defaultdict(int)
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(
+        backend: str,
+        model: str,
+        temperature: float,
+        messages: List[BaseMessage],
+        **params,
+    ) -> str:
+        """Returns the sha256 of the backend, model, temperature and rendered messages."""
+        request = {
+            "backend": backend,
+            "model": model,
+            "temperature": temperature,
+            "messages": [[msg.type, msg.content] for msg in messages],
+            "params": params,
+        }
+        encoded = json.dumps(request, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def should_cache(self, temperature: float) -> bool:
+        return self.cache_sampled or temperature == 0.0
+
+    def get(self, key: str, agent: Optional[str] = None) -> Optional[str]:
+        """Looks up a response, promoting disk hits into the in-memory tier."""
+        agent = agent or "unknown"
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits[agent] += 1
+                return self._entries[key]
+
+            response = None
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    response = row[0]
+                    self._remember(key, response)
+
+            if response is None:
+                self._misses[agent] += 1
+            else:
+                self._hits[agent] += 1
+            return response
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._remember(key, response)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, response, created_at) "
+                        "VALUES (?, ?, ?)",
+                        (key, response, time.time()),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    # The disk tier is best effort, a locked file must not fail the call
+                    logging.warning(f"LLM cache: failed to persist response: {e}")
+
+    def _remember(self, key: str, response: str):
+        """Inserts into the LRU tier. Caller must hold the lock."""
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns hits, misses and hit rate per agent."""
+        with self._lock:
+            agents = set(self._hits) | set(self._misses)
+            stats = {}
+            for agent in sorted(agents):
+                hits, misses = self._hits[agent], self._misses[agent]
+                stats[agent] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                }
+            return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_cache: Optional[LLMResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Returns the process-wide response cache, configured from environment variables:
+
+    - LLM_CACHE_SIZE max in-memory entries (default 1024, 0 disables the cache)
+    - LLM_CACHE_PATH SQLite file for the persistent tier (disabled if unset)
+    - LLM_CACHE_SAMPLED set to "1" to also cache calls with temperature > 0
+    """
+    global _default_cache
+    max_entries = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = LLMResponseCache(
+                    max_entries=max_entries,
+                    path=os.getenv("LLM_CACHE_PATH") or None,
+                    cache_sampled=os.getenv("LLM_CACHE_SAMPLED", "0") == "1",
+                )
+    return _default_cache
@@ -0,0 +1,217 @@
+"""Micro-batching dispatcher that sits in front of an LLM backend"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+class _Request:
+    def __init__(self, key: Optional[str], fn: Callable[[], str]):
+        self.key = key
+        self.fn = fn
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class LLMDispatcher:
+    """
+    Collects LLM requests that arrive within a short window and dispatches them as a batch.
+
+    Neither Ollama's `/api/generate` nor OpenAI's chat completions accept several
+    prompts in one request, so a batch is dispatched by:
+
+    - sending identical deterministic requests (same `key`) to the backend only
+      once and handing the completion to every caller, and
+    - running the remaining requests on at most `max_parallel` workers, which
+      should match what the backend can serve concurrently (e.g. OLLAMA_NUM_PARALLEL).
+    """
+
+    def __init__(
+        self,
+        max_parallel: int = 4,
+        window: float = 0.005,
+        max_batch_size: int = 32,
+        name: str = "llm",
+    ):
+        self.max_parallel = max_parallel
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.name = name
+
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_parallel, thread_name_prefix=f"{name}-dispatch"
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "deduplicated": 0,
+            "in_flight": 0,
+            "waiting": 0,
+            "max_batch_size": 0,
+            "total_wait_seconds": 0.0,
+        }
+        self._batch_sizes: Dict[int, int] = defaultdict(int)
+        self._closed = False
+
+        self._collector = threading.Thread(
+            target=self._collect_loop, name=f"{name}-collector", daemon=True
+        )
+        self._collector.start()
+
+    def submit(self, key: Optional[str], fn: Callable[[], str]) -> Future:
+        """
+        Queues a request and returns a future for its completion.
+
+        :param key: Identifies the request for deduplication, None if it must always be sent.
+        :param fn: Performs the request against the backend.
+        """
+        if self._closed:
+            raise RuntimeError(f"Dispatcher '{self.name}' has been shut down")
+
+        request = _Request(key, fn)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["waiting"] += 1
+        self._queue.put(request)
+        return request.future
+
+    def run(self, key: Optional[str], fn: Callable[[], str]) -> str:
+        """Submits a request and blocks until its completion is available."""
+        return self.submit(key, fn).result()
+
+    def _collect_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)  # Let the loop exit after this batch
+                    break
+                batch.append(request)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_Request]):
+        groups: Dict[object, List[_Request]] = {}
+        for request in batch:
+            # Requests without a key are never merged with another request
+            group_key = request.key if request.key is not None else id(request)
+            groups.setdefault(group_key, []).append(request)
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["deduplicated"] += len(batch) - len(groups)
+            self._stats["max_batch_size"] = max(
+                self._stats["max_batch_size"], len(batch)
+            )
+            self._batch_sizes[len(batch)] += 1
+
+        for requests in groups.values():
+            self._executor.submit(self._execute, requests)
+
+    def _execute(self, requests: List[_Request]):
+        started_at = time.monotonic()
+        with self._lock:
+            self._stats["waiting"] -= len(requests)
+            self._stats["in_flight"] += 1
+            self._stats["total_wait_seconds"] += sum(
+                started_at - request.enqueued_at for request in requests
+            )
+
+        try:
+            result = requests[0].fn()
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+        else:
+            for request in requests:
+                request.future.set_result(result)
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+
+    def stats(self) -> Dict[str, float]:
+        """Returns queue depth, in-flight requests and batch size statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batch_size_histogram"] = dict(sorted(self._batch_sizes.items()))
+        stats["queue_depth"] = stats.pop("waiting")
+        stats["mean_batch_size"] = (
+            stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        )
+        stats["mean_wait_seconds"] = (
+            stats.pop("total_wait_seconds") / stats["requests"]
+            if stats["requests"]
+            else 0.0
+        )
+        stats["max_parallel"] = self.max_parallel
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting requests and finishes the ones already queued."""
+        self._closed = True
+        self._queue.put(None)
+        if wait:
+            self._collector.join()
+        self._executor.shutdown(wait=wait)
+
+
+_dispatchers: Dict[str, LLMDispatcher] = {}
+_dispatchers_lock = threading.Lock()
+
+
+def default_max_parallel(backend: str) -> int:
+    """How many requests a backend serves well in parallel when nothing is configured."""
+    if backend == "ollama":
+        # Read on every call, so it follows the environment the server was started with
+        return int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+    if backend == "openai":
+        return 16
+    return 4
+
+
+def get_dispatcher(backend: str) -> Optional[LLMDispatcher]:
+    """
+    Returns the process-wide dispatcher of a backend, configured from environment variables:
+
+    - LLM_MAX_PARALLEL requests in flight per backend (0 disables dispatching),
+      defaults to OLLAMA_NUM_PARALLEL (4) for Ollama and 16 for OpenAI
+    - LLM_BATCH_WINDOW_MS how long to collect requests before dispatching (default 5)
+
+    Both are read when the dispatcher is first needed, not when the module is imported.
+    """
+    max_parallel = int(
+        os.getenv("LLM_MAX_PARALLEL", str(default_max_parallel(backend)))
+    )
+    if max_parallel <= 0:
+        return None
+
+    with _dispatchers_lock:
+        if backend not in _dispatchers:
+            _dispatchers[backend] = LLMDispatcher(
+                max_parallel=max_parallel,
+                window=float(os.getenv("LLM_BATCH_WINDOW_MS", "5")) / 1000,
+                name=backend,
+            )
+            logging.info(
+                f"LLM dispatcher for {backend}: {max_parallel} requests in parallel"
+            )
+        return _dispatchers[backend]
@@ -0,0 +1,69 @@
+"""Process-wide registry of LLM clients"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from binge_buddy.llm_dispatcher import get_dispatcher
+from binge_buddy.ollama import BaseHTTPLLM, OllamaLLM, OpenAILLM
+
+
+class LLMRegistry:
+    """
+    Builds each configured LLM client once and hands the same instance to every caller.
+
+    Clients are keyed by backend, model and any extra constructor arguments, so
+    the workflows, the conversational agent and every memory agent share one
+    client (and with it the connection pool, response cache and dispatcher).
+    """
+
+    backends = {"openai": OpenAILLM, "ollama": OllamaLLM}
+
+    def __init__(self):
+        self._llms: Dict[Tuple, BaseHTTPLLM] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, backend: str = "openai", model: Optional[str] = None, **kwargs
+    ) -> BaseHTTPLLM:
+        """Returns the client for the given configuration, building it on first use."""
+        if backend not in self.backends:
+            raise ValueError(
+                f"Unknown LLM backend '{backend}', expected one of {list(self.backends)}"
+            )
+
+        key = (backend, model, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key not in self._llms:
+                if model is not None:
+                    kwargs["model"] = model
+                if backend == "ollama":
+                    # Don't block startup on `/api/tags` or `ollama pull`
+                    kwargs.setdefault("check_model", "background")
+                kwargs.setdefault("dispatcher", get_dispatcher(backend))
+                self._llms[key] = self.backends[backend](**kwargs)
+            return self._llms[key]
+
+    def clear(self):
+        with self._lock:
+            self._llms.clear()
+
+
+registry = LLMRegistry()
+
+
+def get_llm(
+    backend: Optional[str] = None, model: Optional[str] = None, **kwargs
+) -> BaseHTTPLLM:
+    """
+    Returns the shared LLM client. The defaults come from environment variables:
+
+    - LLM_BACKEND either "openai" (default) or "ollama"
+    - LLM_MODEL the model name, uses the backend default if unset
+    - OLLAMA_PORT the port Ollama listens on (default 11434)
+    """
+    backend = backend or os.getenv("LLM_BACKEND", "openai")
+    model = model or os.getenv("LLM_MODEL") or None
+    if backend == "ollama" and os.getenv("OLLAMA_PORT"):
+        kwargs.setdefault("port", int(os.getenv("OLLAMA_PORT")))
+    return registry.get(backend, model, **kwargs)
@@ -9,10 +9,11 @@ if TYPE_CHECKING:
     from binge_buddy.agent_state.states import AgentState  # Only used for type hints
 
 
-class MemoryDict(TypedDict):
+class MemoryDict(TypedDict, total=False):
     memory_type: str
     information: str
     attribute: Optional[str]
+    timestamp: str  # Episodic memories only
 
 
 class Memory(ABC):
@@ -45,9 +46,16 @@ class Memory(ABC):
         current_user_message = state.current_user_message
         return EpisodicMemory(information, current_user_message.timestamp, attribute)
 
-    @classmethod
-    def from_dict(cls, data: dict) -> "Memory":
-        return cls(data["memory_type"], data["information"], data["attribute"])
+    @staticmethod
+    def from_dict(data: dict) -> "Memory":
+        """Rebuilds a memory of the type named in `memory_type`."""
+        if data["memory_type"] == "Episodic":
+            return EpisodicMemory(
+                data["information"],
+                datetime.fromisoformat(data["timestamp"]),
+                data["attribute"],
+            )
+        return SemanticMemory(data["information"], data["attribute"])
 
     def as_db_entry(self):
         raise NotImplementedError("Should be implemented in the inherited class")
@@ -88,6 +96,16 @@ class EpisodicMemory(Memory):
         super().__init__("Episodic", information, attribute)
         self.timestamp = timestamp
 
+    def as_dict(self) -> MemoryDict:
+        data = super().as_dict()
+        # Memories read back from the database keep their stored ISO string
+        data["timestamp"] = (
+            self.timestamp.isoformat()
+            if isinstance(self.timestamp, datetime)
+            else self.timestamp
+        )
+        return data
+
     def as_db_entry(self):
         if self.attribute is not None:
             return {
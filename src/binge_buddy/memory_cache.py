@@ -0,0 +1,133 @@
+"""Read-through cache of the memories stored for each user"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from binge_buddy.memory import Memory
+from binge_buddy.metrics import metrics
+
+CacheKey = Tuple[str, str]  # (collection, user_id)
+
+
+class MemoryCache:
+    """
+    In-memory LRU of `get_existing_memories` results, bounded by `max_entries`
+    and expiring after `ttl` seconds.
+
+    Handlers invalidate a user's entry after writing to it. Writes from other
+    processes are only seen once the entry expires, so `ttl` bounds how stale a
+    read can be.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[Memory]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        # Generation of each key with loads in flight, bumped by its invalidation,
+        # so a load that overlapped one is not cached
+        self._generations: Dict[CacheKey, int] = {}
+        self._loading: Dict[CacheKey, int] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_load(
+        self, collection: str, user_id: str, load: Callable[[], List[Memory]]
+    ) -> List[Memory]:
+        """Returns a copy of the cached memories, calling `load` on a miss."""
+        key = (collection, user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                result = "hit"
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                result = "expired" if entry is not None else "miss"
+                generation = self._generations.setdefault(key, 0)
+                self._loading[key] = self._loading.get(key, 0) + 1
+        metrics.inc("memory_cache_lookups", collection=collection, result=result)
+
+        if result == "hit":
+            # Agents must not be able to change the cached objects
+            return copy.deepcopy(entry[1])
+
+        try:
+            memories = load()
+            with self._lock:
+                if generation == self._generations[key]:
+                    self._entries[key] = (now + self.ttl, copy.deepcopy(memories))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+                    del self._generations[key]
+        return memories
+
+    def invalidate(self, collection: str, user_id: str):
+        key = (collection, user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            if key in self._generations:
+                self._generations[key] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for key in self._generations:
+                self._generations[key] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_default_cache: Optional[MemoryCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_memory_cache() -> Optional[MemoryCache]:
+    """
+    Returns the process-wide memory cache, configured from environment variables:
+
+    - MEMORY_CACHE_SIZE max users kept (default 1024, 0 disables the cache)
+    - MEMORY_CACHE_TTL seconds an entry is served before it is read again (default 60)
+    """
+    global _default_cache
+    max_entries = int(os.getenv("MEMORY_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = MemoryCache(
+                    max_entries=max_entries,
+                    ttl=float(os.getenv("MEMORY_CACHE_TTL", "60")),
+                )
+    return _default_cache
@@ -1,12 +1,15 @@
 """Database interface to interact with the mongoDB instance"""
 
+import logging
 import os
 import sys
 import time
 from pathlib import Path
+from typing import Dict, List
 
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
 
 # Load environment variables from the root `.env`
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -19,6 +22,46 @@ else:
     print("Warning: `.env` file not found! Using default values.")
 
 
+# Indexes the memory handlers rely on, created by `MemoryDB.ensure_indexes`
+INDEXES: Dict[str, List[IndexModel]] = {
+    # One document per user, the unique index also stops concurrent upserts from duplicating it
+    "semantic_memory": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)
+    ],
+    "episodic_memory": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)
+    ],
+    "episodic_memory_buckets": [
+        # Finds the month's bucket that still has room for a write
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("attribute", ASCENDING),
+                ("month", ASCENDING),
+                ("count", ASCENDING),
+            ],
+            name="user_attribute_month",
+        ),
+        # Reads only the buckets touched within the lookback window
+        IndexModel(
+            [("user_id", ASCENDING), ("last_at", DESCENDING)], name="user_last_at"
+        ),
+        IndexModel([("migrated_from", ASCENDING)], name="migrated_from", sparse=True),
+    ],
+}
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    """Flattens the stages of an explain plan, e.g. ["FETCH", "IXSCAN"]."""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("queryPlan", "inputStage"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
 class MemoryDB:
     """Long-term memory for Binge Buddy"""
 
@@ -57,10 +100,71 @@ class MemoryDB:
             query, {"$set": update_data}
         )
 
+    def bulk_write(self, collection_name, operations, ordered=True):
+        """Send many write operations (e.g. `UpdateOne`) in one round-trip."""
+        return self.get_collection(collection_name).bulk_write(
+            operations, ordered=ordered
+        )
+
     def delete_one(self, collection_name, query):
         """Delete a single document."""
         return self.get_collection(collection_name).delete_one(query)
 
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        """
+        Creates the indexes declared in `INDEXES` that are missing, which is a
+        no-op for existing ones. Returns the index names per collection.
+
+        A collection whose index cannot be built (e.g. it already holds
+        duplicate user documents) is logged and skipped, so startup goes on.
+        """
+        created = {}
+        try:
+            for collection_name, indexes in INDEXES.items():
+                try:
+                    created[collection_name] = self.get_collection(
+                        collection_name
+                    ).create_indexes(indexes)
+                except OperationFailure as e:
+                    logging.error(f"Could not create indexes on {collection_name}: {e}")
+        except PyMongoError as e:
+            logging.error(f"Could not reach MongoDB to create indexes: {e}")
+        return created
+
+    def explain(self, collection_name, query) -> dict:
+        """Summarizes how the server executes `find(query)`: plan stages, index and work done."""
+        result = self.db.command(
+            "explain",
+            {"find": collection_name, "filter": query},
+            verbosity="executionStats",
+        )
+        winning_plan = result["queryPlanner"]["winningPlan"]
+        stats = result["executionStats"]
+        stages = _plan_stages(winning_plan)
+        return {
+            "collection": collection_name,
+            "stages": stages,
+            "uses_index": "IXSCAN" in stages or "IDHACK" in stages,
+            "keys_examined": stats["totalKeysExamined"],
+            "docs_examined": stats["totalDocsExamined"],
+            "returned": stats["nReturned"],
+            "millis": stats["executionTimeMillis"],
+        }
+
+    def index_stats(self, collection_name) -> List[dict]:
+        """Returns how often each index of the collection was used since the server started."""
+        return [
+            {
+                "name": entry["name"],
+                "key": dict(entry["key"]),
+                "ops": entry["accesses"]["ops"],
+                "since": entry["accesses"]["since"],
+            }
+            for entry in self.get_collection(collection_name).aggregate(
+                [{"$indexStats": {}}]
+            )
+        ]
+
     def close(self):
         """Close the database connection."""
         self.client.close()
@@ -1,29 +1,84 @@
 import logging
+import os
 from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
 
 from binge_buddy.agent_state.states import (
     AgentState,
     EpisodicAgentState,
     SemanticAgentState,
 )
-from binge_buddy.memory import EpisodicMemory, SemanticMemory
+from binge_buddy.memory import EpisodicMemory, Memory, SemanticMemory
+from binge_buddy.memory_cache import MemoryCache, get_memory_cache
 from binge_buddy.memory_db import MemoryDB
 
 
 class MemoryHandler(ABC):
     """Base class for handling memory operations."""
 
-    def __init__(self, memory_db: MemoryDB):
+    collection_name: str
+
+    def __init__(self, memory_db: MemoryDB, cache: Optional[MemoryCache] = None):
+        """
+        :param cache: Serves `get_existing_memories` from memory, defaults to the
+            process-wide cache, see `get_memory_cache`.
+        """
         self.memory_db = memory_db
+        self.cache = cache or get_memory_cache()
+
+    def build_update(self, state: AgentState) -> Optional[dict]:
+        """Returns the single update that stores the state's memories, None if there are none."""
+        raise NotImplementedError("Should be implemented in the inherited class")
+
+    def build_operations(self, state: AgentState) -> List[UpdateOne]:
+        """Returns the writes that store the state's memories, by default its `build_update`."""
+        update = self.build_update(state)
+        if update is None:
+            return []
+        return [UpdateOne({"user_id": state.user_id}, update, upsert=True)]
 
-    @abstractmethod
     def process(self, state: AgentState):
-        """Process the given agent state."""
-        ...
+        """Stores the state's memories with one round-trip to the database."""
+        self.process_many([state])
+
+    def process_many(self, states: List[AgentState]):
+        """
+        Stores the memories of many states, e.g. from a batch job, with one
+        `bulk_write`. Updates are applied in order, so later states of the
+        same user win.
+        """
+        operations = []
+        for state in states:
+            operations += self.build_operations(state)
+        if not operations:
+            return
+
+        result = self.memory_db.bulk_write(self.collection_name, operations)
+        for user_id in {state.user_id for state in states}:
+            self._invalidate(user_id)
+        logging.info(
+            f"{type(self).__name__}: {len(operations)} updates in one bulk write "
+            f"({result.upserted_count} new documents)"
+        )
+
+    def _invalidate(self, user_id: str):
+        if self.cache is not None:
+            self.cache.invalidate(self.collection_name, user_id)
+
+    def get_existing_memories(self, user_id: str) -> List[Memory]:
+        """Returns the user's stored memories, from the cache if it has them."""
+        if self.cache is None:
+            return self.load_memories(user_id)
+        return self.cache.get_or_load(
+            self.collection_name, user_id, lambda: self.load_memories(user_id)
+        )
 
     @abstractmethod
-    def get_existing_memories(self, user_id: str):
-        """Process the given agent state."""
+    def load_memories(self, user_id: str) -> List[Memory]:
+        """Reads the user's memories from the database."""
         ...
 
 
@@ -32,31 +87,27 @@ class SemanticMemoryHandler(MemoryHandler):
 
     collection_name = "semantic_memory"
 
-    def process(self, state: SemanticAgentState):
+    def build_update(self, state: SemanticAgentState) -> Optional[dict]:
         if not isinstance(state, SemanticAgentState):
             raise TypeError("Expected SemanticAgentState")
 
-        collection = self.memory_db.get_collection(self.collection_name)
-        user_id = state.user_id
-
-        logging.info(f"Semantic Memory Handler: Adding memories...")
-        for memory in state.aggregated_memories:
+        # One $set covering every attribute, an attribute is overwritten by its merged memory
+        fields = {}
+        for memory in state.aggregated_memories or []:
             if not memory.has_attribute():
                 continue
 
             db_entry = memory.as_db_entry()  # {attribute: memory_str}
             attribute, memory_str = next(iter(db_entry.items()))
-
-            # Update or insert attribute in user document
-            collection.update_one(
-                {"user_id": user_id},
-                {"$set": {f"memory.{attribute}": memory_str}},
-                upsert=True,
-            )
-
+            fields[f"memory.{attribute}"] = memory_str
             logging.info(f"memory.{attribute}: {memory_str}")
 
-    def get_existing_memories(self, user_id):
+        if not fields:
+            return None
+        logging.info(f"Semantic Memory Handler: Adding memories...")
+        return {"$set": fields}
+
+    def load_memories(self, user_id):
         query = {"user_id": user_id}  # Query to find the user
         result = self.memory_db.find_one(
             self.collection_name, query
@@ -72,58 +123,277 @@ class SemanticMemoryHandler(MemoryHandler):
 
 
 class EpisodicMemoryHandler(MemoryHandler):
-    """Handles processing of episodic memories."""
+    """
+    Handles processing of episodic memories.
 
-    collection_name = "episodic_memory"
+    Episodes are stored in buckets, one document per user, attribute and month
+    holding at most `bucket_size` episodes, so no document grows without bound.
+    Reads only fetch the buckets touched in the last `lookback_days` and the
+    `recent_per_attribute` latest episodes of each attribute, see `query_memories`.
+    """
 
-    def process(self, state: EpisodicAgentState):
-        if not isinstance(state, EpisodicAgentState):
-            raise TypeError("Expected EpisodicAgentState")
+    collection_name = "episodic_memory_buckets"
+    # One document per user with every episode, see `migrate_legacy`
+    legacy_collection_name = "episodic_memory"
 
-        collection = self.memory_db.get_collection(self.collection_name)
-        user_id = state.user_id
+    def __init__(
+        self,
+        memory_db: MemoryDB,
+        cache: Optional[MemoryCache] = None,
+        bucket_size: Optional[int] = None,
+        lookback_days: Optional[float] = None,
+        recent_per_attribute: Optional[int] = None,
+    ):
+        """
+        :param bucket_size: Episodes per bucket, defaults to EPISODIC_BUCKET_SIZE or 200.
+        :param lookback_days: Age of the oldest episodes read back, defaults to
+            EPISODIC_LOOKBACK_DAYS or 90, 0 reads the whole history.
+        :param recent_per_attribute: Most recent episodes of each attribute read
+            back, defaults to EPISODIC_RECENT_PER_ATTRIBUTE or 20, 0 reads all.
+        """
+        super().__init__(memory_db, cache)
+        self.bucket_size = bucket_size or int(os.getenv("EPISODIC_BUCKET_SIZE", "200"))
+        self.lookback_days = (
+            lookback_days
+            if lookback_days is not None
+            else float(os.getenv("EPISODIC_LOOKBACK_DAYS", "90"))
+        )
+        self.recent_per_attribute = (
+            recent_per_attribute
+            if recent_per_attribute is not None
+            else int(os.getenv("EPISODIC_RECENT_PER_ATTRIBUTE", "20"))
+        )
+
+    @staticmethod
+    def bucket_month(timestamp: datetime) -> str:
+        return timestamp.strftime("%Y-%m")
 
-        logging.info(f"Episodic Memory Handler: Adding memories for user {user_id}...")
+    def build_operations(self, state: EpisodicAgentState) -> List[UpdateOne]:
+        if not isinstance(state, EpisodicAgentState):
+            raise TypeError("Expected EpisodicAgentState")
 
-        for memory in state.extracted_memories:
+        # Every new episode of an attribute and month goes into one $push $each
+        buckets: Dict[Tuple[str, str], List[dict]] = {}
+        for memory in state.extracted_memories or []:
             if not memory.has_attribute():
                 continue
 
             db_entry = memory.as_db_entry()
             attribute = memory.attribute
-
             memory_info = db_entry[attribute]
             timestamp = db_entry["timestamp"]
 
-            collection.update_one(
-                {"user_id": user_id},
+            month = self.bucket_month(_as_datetime(timestamp))
+            buckets.setdefault((attribute, month), []).append(
+                {"information": memory_info, "timestamp": timestamp}
+            )
+            logging.info(
+                f"Added to {attribute} ({month}): '{memory_info}' at {timestamp}"
+            )
+
+        if buckets:
+            logging.info(
+                f"Episodic Memory Handler: Adding memories for user {state.user_id}..."
+            )
+        operations = []
+        for (attribute, month), episodes in buckets.items():
+            for start in range(0, len(episodes), self.bucket_size):
+                operations.append(
+                    self._bucket_update(
+                        state.user_id,
+                        attribute,
+                        month,
+                        episodes[start : start + self.bucket_size],
+                    )
+                )
+        return operations
+
+    def _bucket_update(
+        self, user_id: str, attribute: str, month: str, episodes: List[dict]
+    ) -> UpdateOne:
+        """Appends to the month's bucket that still has room, or starts a new one."""
+        times = [_as_datetime(episode["timestamp"]) for episode in episodes]
+        return UpdateOne(
+            {
+                "user_id": user_id,
+                "attribute": attribute,
+                "month": month,
+                "count": {"$lte": self.bucket_size - len(episodes)},
+            },
+            {
+                "$push": {"episodes": {"$each": episodes}},
+                "$inc": {"count": len(episodes)},
+                "$min": {"first_at": min(times)},
+                "$max": {"last_at": max(times)},
+            },
+            upsert=True,
+        )
+
+    def load_memories(self, user_id):
+        since = None
+        if self.lookback_days > 0:
+            since = datetime.now() - timedelta(days=self.lookback_days)
+        return self.query_memories(
+            user_id,
+            since=since,
+            recent_per_attribute=self.recent_per_attribute or None,
+        )
+
+    def query_memories(
+        self,
+        user_id: str,
+        attributes: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        recent_per_attribute: Optional[int] = None,
+    ) -> List[EpisodicMemory]:
+        """
+        Returns the user's episodes in chronological order, filtered on the server.
+
+        :param attributes: Only these attributes, all by default.
+        :param since: Only episodes at or after this time.
+        :param until: Only episodes at or before this time.
+        :param recent_per_attribute: Only the most recent episodes of each attribute.
+        """
+        collection = self.memory_db.get_collection(self.collection_name)
+        pipeline = self.query_pipeline(
+            user_id, attributes, since, until, recent_per_attribute
+        )
+        return [
+            EpisodicMemory(
+                information=row["information"],
+                attribute=row["attribute"],
+                timestamp=row["timestamp"],
+            )
+            for row in collection.aggregate(pipeline)
+        ]
+
+    @staticmethod
+    def query_pipeline(
+        user_id: str,
+        attributes: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        recent_per_attribute: Optional[int] = None,
+    ) -> List[dict]:
+        """Builds the aggregation behind `query_memories`, only matching rows leave the server."""
+        # Whole buckets outside the window are skipped using the bucket bounds
+        bucket_match = {"user_id": user_id}
+        if attributes:
+            bucket_match["attribute"] = {"$in": attributes}
+        if since is not None:
+            bucket_match["last_at"] = {"$gte": since}
+        if until is not None:
+            bucket_match["first_at"] = {"$lte": until}
+        pipeline = [
+            {"$match": bucket_match},
+            {"$project": {"_id": 0, "attribute": 1, "episodes": 1}},
+            {"$unwind": "$episodes"},
+        ]
+
+        # Timestamps are stored as ISO strings, which sort like the times they hold
+        window = {}
+        if since is not None:
+            window["$gte"] = since.isoformat()
+        if until is not None:
+            window["$lte"] = until.isoformat()
+        if window:
+            pipeline.append({"$match": {"episodes.timestamp": window}})
+
+        if recent_per_attribute:
+            pipeline += [
+                {"$sort": {"episodes.timestamp": -1}},
+                {"$group": {"_id": "$attribute", "episodes": {"$push": "$episodes"}}},
                 {
-                    "$push": {
-                        f"memory.{attribute}": {
-                            "information": memory_info,
-                            "timestamp": timestamp,
-                        }
+                    "$project": {
+                        "attribute": "$_id",
+                        "episodes": {"$slice": ["$episodes", recent_per_attribute]},
                     }
                 },
-                upsert=True,
-            )
-            logging.info(f"Added to memory.{attribute}: '{memory_info}' at {timestamp}")
+                {"$unwind": "$episodes"},
+            ]
 
-    def get_existing_memories(self, user_id):
-        query = {"user_id": user_id}
-        result = self.memory_db.find_one(self.collection_name, query)
+        pipeline += [
+            {
+                "$project": {
+                    "_id": 0,
+                    "attribute": 1,
+                    "information": "$episodes.information",
+                    "timestamp": "$episodes.timestamp",
+                }
+            },
+            {"$sort": {"timestamp": 1}},
+        ]
+        return pipeline
 
-        existing_memories = []
+    def migrate_legacy(
+        self, user_ids: Optional[List[str]] = None, drop_legacy: bool = False
+    ) -> Dict[str, int]:
+        """
+        Copies the episodes of the legacy one-document-per-user collection into
+        buckets and marks each document as migrated.
+
+        Re-running it is safe: the buckets of a document are written together
+        with its id, and replaced if the document is migrated again. Episodes
+        stored in buckets by the app in the meantime are not touched.
+
+        :param user_ids: Only migrate these users, all not yet migrated ones by default.
+        :param drop_legacy: Delete each legacy document once its buckets are written.
+        """
+        legacy = self.memory_db.get_collection(self.legacy_collection_name)
+        buckets = self.memory_db.get_collection(self.collection_name)
+        query = {"migrated_at": {"$exists": False}}
+        if user_ids:
+            query = {"user_id": {"$in": user_ids}}
+
+        totals = {"users": 0, "episodes": 0, "buckets": 0}
+        for document in legacy.find(query):
+            grouped: Dict[Tuple[str, str], List[dict]] = {}
+            for attribute, episodes in (document.get("memory") or {}).items():
+                for episode in sorted(
+                    episodes, key=lambda e: _as_datetime(e["timestamp"])
+                ):
+                    month = self.bucket_month(_as_datetime(episode["timestamp"]))
+                    grouped.setdefault((attribute, month), []).append(episode)
 
-        if result and "memory" in result:
-            for attr, memories in result["memory"].items():  # Iterate over attributes
-                for memory_entry in memories:  # Iterate over memory list
-                    existing_memories.append(
-                        EpisodicMemory(
-                            information=memory_entry["information"],
-                            attribute=attr,
-                            timestamp=memory_entry["timestamp"],
-                        )
+            new_buckets = []
+            for (attribute, month), episodes in grouped.items():
+                for start in range(0, len(episodes), self.bucket_size):
+                    chunk = episodes[start : start + self.bucket_size]
+                    times = [_as_datetime(episode["timestamp"]) for episode in chunk]
+                    new_buckets.append(
+                        {
+                            "user_id": document["user_id"],
+                            "attribute": attribute,
+                            "month": month,
+                            "count": len(chunk),
+                            "episodes": chunk,
+                            "first_at": min(times),
+                            "last_at": max(times),
+                            "migrated_from": document["_id"],
+                        }
                     )
 
-        return existing_memories
+            buckets.delete_many({"migrated_from": document["_id"]})
+            if new_buckets:
+                buckets.insert_many(new_buckets)
+            if drop_legacy:
+                legacy.delete_one({"_id": document["_id"]})
+            else:
+                legacy.update_one(
+                    {"_id": document["_id"]}, {"$set": {"migrated_at": datetime.now()}}
+                )
+            self._invalidate(document["user_id"])
+
+            totals["users"] += 1
+            totals["buckets"] += len(new_buckets)
+            totals["episodes"] += sum(bucket["count"] for bucket in new_buckets)
+            logging.info(f"Migrated {document['user_id']}: {len(new_buckets)} buckets")
+        return totals
+
+
+def _as_datetime(timestamp) -> datetime:
+    """Episode timestamps are stored as ISO strings."""
+    if isinstance(timestamp, datetime):
+        return timestamp
+    return datetime.fromisoformat(timestamp)
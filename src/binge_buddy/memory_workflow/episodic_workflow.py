@@ -1,22 +1,30 @@
+from typing import Optional
+
+from langchain.llms.base import LLM
+
 from binge_buddy.agent_state.states import AgentState, EpisodicAgentState
 from binge_buddy.agents.extractor_reviewer import ExtractorReviewer
 from binge_buddy.agents.memory_attributor import MemoryAttributor
 from binge_buddy.agents.memory_extractor import MemoryExtractor
 from binge_buddy.agents.memory_sentinel import MemorySentinel
-from binge_buddy.memory import EpisodicMemory, Memory
+from binge_buddy.llm_registry import get_llm
+from binge_buddy.memory import Memory
 from binge_buddy.memory_db import MemoryDB
 from binge_buddy.memory_handler import EpisodicMemoryHandler
-from binge_buddy.memory_workflow.multi_agent_workflow import MultiAgentWorkflow
+from binge_buddy.memory_workflow.multi_agent_workflow import (
+    MultiAgentWorkflow,
+    merge_review_and_attribution,
+)
 from binge_buddy.message import UserMessage
-from binge_buddy.ollama import OllamaLLM, OpenAILLM
-from binge_buddy.state_graph import CustomStateGraph
+from binge_buddy.state_graph import CustomStateGraph, GraphRunResult
 
 
 class EpisodicWorkflow(MultiAgentWorkflow):
-    def __init__(self, memory_handler):
+    def __init__(self, memory_handler, llm: Optional[LLM] = None):
         super().__init__()
 
-        llm = OpenAILLM()
+        # Share the process-wide client unless one is passed in
+        llm = llm or get_llm()
         memory_sentinel = MemorySentinel(llm)
         memory_extractor = MemoryExtractor(llm)
         extractor_reviewer = ExtractorReviewer(llm)
@@ -28,10 +36,24 @@ class EpisodicWorkflow(MultiAgentWorkflow):
         self.state_graph: CustomStateGraph = CustomStateGraph(EpisodicAgentState)
 
         # Add Nodes
-        self.state_graph.add_node("sentinel", memory_sentinel.process)
-        self.state_graph.add_node("memory_extractor", memory_extractor.process)
-        self.state_graph.add_node("memory_reviewer", extractor_reviewer.process)
-        self.state_graph.add_node("memory_attributor", memory_attributor.process)
+        self.state_graph.add_node(
+            "sentinel", memory_sentinel.process, memory_sentinel.aprocess
+        )
+        self.state_graph.add_node(
+            "memory_extractor", memory_extractor.process, memory_extractor.aprocess
+        )
+        self.state_graph.add_node(
+            "memory_reviewer", extractor_reviewer.process, extractor_reviewer.aprocess
+        )
+        self.state_graph.add_node(
+            "memory_attributor", memory_attributor.process, memory_attributor.aprocess
+        )
+        # The attributor works on the extracted memories while they are reviewed
+        self.state_graph.add_parallel_node(
+            "review_and_attribute",
+            ["memory_reviewer", "memory_attributor"],
+            merge_review_and_attribution,
+        )
         self.state_graph.add_node("memory_handler", memory_handler.process)
 
         # Set the starting edge
@@ -51,29 +73,25 @@ class EpisodicWorkflow(MultiAgentWorkflow):
             "memory_extractor",
             lambda state: "continue" if state.extracted_memories else "end",
             {
-                "continue": "memory_reviewer",
+                "continue": "review_and_attribute",
                 "end": None,
             },
         )
 
         self.state_graph.add_conditional_edges(
-            "memory_reviewer",
-            lambda state: ("continue" if not state.needs_repair else "repair"),
-            {
-                "continue": "memory_attributor",
-                "repair": "memory_extractor",
-            },
-        )
-
-        self.state_graph.add_conditional_edges(
-            "memory_attributor",
+            "review_and_attribute",
             lambda state: (
-                "continue"
-                if all(mem.has_attribute() for mem in state.extracted_memories)
-                else "end"
+                "repair"
+                if state.needs_repair
+                else (
+                    "continue"
+                    if all(mem.has_attribute() for mem in state.extracted_memories)
+                    else "end"
+                )
             ),
             {
                 "continue": "memory_handler",
+                "repair": "memory_extractor",
                 "end": None,
             },
         )
@@ -81,8 +99,22 @@ class EpisodicWorkflow(MultiAgentWorkflow):
         # Add Normal Edges
         self.state_graph.add_edge("memory_handler", None)
 
-    def run(self, initial_state: AgentState):
-        self.state_graph.run(initial_state)
+        # A run that exhausts its budget in a repair loop keeps what it has
+        self.memory_handler = memory_handler
+        self.state_graph.add_node("best_effort_store", self.store_best_effort)
+        self.state_graph.set_budget_exit("best_effort_store")
+
+    def store_best_effort(self, state: AgentState):
+        """Stores the attributed memories, if the run got that far and they were approved."""
+        if (
+            not state.needs_repair
+            and state.extracted_memories
+            and all(mem.has_attribute() for mem in state.extracted_memories)
+        ):
+            self.memory_handler.process(state)
+
+    def run(self, initial_state: AgentState) -> GraphRunResult:
+        return self.state_graph.execute(initial_state)
 
     def run_with_logging(self, initial_state: AgentState):
         self.state_graph.run_with_logging(initial_state)
@@ -104,27 +136,8 @@ if __name__ == "__main__":
 
     user_id = "vivian"
 
-    collection_name = "episodic_memory"
-
-    query = {"user_id": user_id}
-    result = memory_db.find_one(collection_name, query)
-
-    if result:
-        existing_memories = []
-        print(
-            f"Found existing memories for user: {user_id}, Memories: {result['memory'].items()}"
-        )
-        for attr, information_list in result["memory"].items():
-            for memory_item in information_list:
-                existing_memories.append(
-                    EpisodicMemory(
-                        information=memory_item[attr],  # The actual memory text
-                        attribute=attr,
-                        timestamp=memory_item["timestamp"],  # The associated timestamp
-                    )
-                )
-    else:
-        existing_memories = []
+    existing_memories = memory_handler.get_existing_memories(user_id)
+    print(f"Found existing memories for user: {user_id}, Memories: {existing_memories}")
 
     episodic_workflow = EpisodicWorkflow(memory_handler)
 
@@ -142,9 +155,12 @@ if __name__ == "__main__":
 
     episodic_workflow.run_with_logging(state)
 
-    # Test db entry
-    query = {"user_id": user_id}
-    result = memory_db.find_one(collection_name, query)
-
-    print(f"Current DB entry for user: {result}")
-
+    # Test db entry, the episodes are stored in monthly buckets
+    buckets = memory_db.get_collection(memory_handler.collection_name).find(
+        {"user_id": user_id}
+    )
+    for bucket in buckets:
+        print(
+            f"Current DB bucket for user: {bucket['attribute']} {bucket['month']}, "
+            f"{bucket['count']} episodes"
+        )
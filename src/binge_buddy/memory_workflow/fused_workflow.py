@@ -0,0 +1,90 @@
+import logging
+from typing import Dict, List, Optional
+
+from langchain.llms.base import LLM
+
+from binge_buddy.agent_state.states import AgentState, SemanticAgentState
+from binge_buddy.agents.fused_memory_agent import FusedMemoryAgent
+from binge_buddy.llm_registry import get_llm
+from binge_buddy.memory import SemanticMemory
+from binge_buddy.memory_handler import MemoryHandler
+from binge_buddy.memory_workflow.multi_agent_workflow import MultiAgentWorkflow
+from binge_buddy.state_graph import CustomStateGraph, GraphRunResult
+
+
+def merge_memories(state: AgentState) -> AgentState:
+    """
+    Local replacement for the aggregator and its reviewer: appends each new
+    memory to the existing information of its attribute unless it is already
+    part of it, so every touched attribute ends up with one merged entry.
+    """
+    merged: Dict[str, List[str]] = {}
+    for memory in state.existing_memories:
+        if memory.has_attribute():
+            merged.setdefault(memory.attribute.upper(), []).append(memory.information)
+
+    touched = []
+    for memory in state.extracted_memories:
+        informations = merged.setdefault(memory.attribute, [])
+        if not any(memory.information.lower() in info.lower() for info in informations):
+            informations.append(memory.information)
+        if memory.attribute not in touched:
+            touched.append(memory.attribute)
+
+    state.aggregated_memories = [
+        SemanticMemory(information="; ".join(merged[attribute]), attribute=attribute)
+        for attribute in touched
+    ]
+    logging.info(f"Merged memories: {state.aggregated_memories}")
+    return state
+
+
+class FusedWorkflow(MultiAgentWorkflow):
+    """
+    Single-call alternative to `SemanticWorkflow` and `EpisodicWorkflow`.
+
+    One structured LLM call detects, extracts and attributes the memories,
+    semantic memories are then merged with the existing ones locally. The
+    memory handler decides where they are stored, so the workflow serves both modes.
+    """
+
+    def __init__(self, memory_handler: MemoryHandler, llm: Optional[LLM] = None):
+        super().__init__()
+
+        # Share the process-wide client unless one is passed in
+        llm = llm or get_llm()
+        fused_memory_agent = FusedMemoryAgent(llm)
+
+        self.state_graph: CustomStateGraph = CustomStateGraph(AgentState)
+
+        self.state_graph.add_node(
+            "fused_memory_agent",
+            fused_memory_agent.process,
+            fused_memory_agent.aprocess,
+        )
+        self.state_graph.add_node("memory_merger", merge_memories)
+        self.state_graph.add_node("memory_handler", memory_handler.process)
+
+        self.state_graph.set_entry_point("fused_memory_agent")
+
+        self.state_graph.add_conditional_edges(
+            "fused_memory_agent",
+            lambda state: (
+                "end"
+                if not state.extracted_memories
+                else "merge" if isinstance(state, SemanticAgentState) else "store"
+            ),
+            {
+                "merge": "memory_merger",
+                "store": "memory_handler",
+                "end": None,
+            },
+        )
+        self.state_graph.add_edge("memory_merger", "memory_handler")
+        self.state_graph.add_edge("memory_handler", None)
+
+    def run(self, initial_state: AgentState) -> GraphRunResult:
+        return self.state_graph.execute(initial_state)
+
+    def run_with_logging(self, initial_state: AgentState):
+        self.state_graph.run_with_logging(initial_state)
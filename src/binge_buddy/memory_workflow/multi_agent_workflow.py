@@ -1,6 +1,6 @@
 import json
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, Optional
 
 from langchain.tools import StructuredTool
 from langchain_core.messages import ToolMessage
@@ -10,7 +10,28 @@ from binge_buddy.agent_state.states import AgentState
 from binge_buddy.enums import Action, Attribute
 
 # from langgraph.graph import StateGraph
-from binge_buddy.state_graph import CustomStateGraph
+from binge_buddy.state_graph import CustomStateGraph, GraphRunResult
+
+
+def merge_review_and_attribution(
+    state: AgentState, branches: Dict[str, AgentState]
+) -> AgentState:
+    """
+    Joins the parallel reviewer and attributor branches. The review decides:
+    approved memories take the attributor's attributes, rejected ones go back
+    to the extractor with the reviewer's repair request and the attribution is dropped.
+
+    The attributor runs before the review is known, so every repair costs one
+    attributor call whose result is thrown away, see "Parallel graph branches"
+    in the README.
+    """
+    reviewed = branches["memory_reviewer"]
+    state.needs_repair = reviewed.needs_repair
+    state.repair_message = reviewed.repair_message
+    state.retry_count = reviewed.retry_count
+    if not state.needs_repair:
+        state.extracted_memories = branches["memory_attributor"].extracted_memories
+    return state
 
 
 class MultiAgentWorkflow(ABC):
@@ -20,5 +41,9 @@ class MultiAgentWorkflow(ABC):
     def __init__(self): ...
 
     @abstractmethod
-    def run(self, initial_state: AgentState):
+    def run(self, initial_state: AgentState) -> GraphRunResult:
         pass
+
+    async def arun(self, initial_state: AgentState) -> GraphRunResult:
+        """Runs the workflow on the current event loop without a thread per LLM call."""
+        return await self.state_graph.aexecute(initial_state)
@@ -1,4 +1,8 @@
 # from langgraph.graph import END, StateGraph
+from typing import Optional
+
+from langchain.llms.base import LLM
+
 from binge_buddy.agent_state.states import AgentState, SemanticAgentState
 from binge_buddy.agents.aggregator_reviewer import AggregatorReviewer
 from binge_buddy.agents.extractor_reviewer import ExtractorReviewer
@@ -6,23 +10,24 @@ from binge_buddy.agents.memory_aggregator import MemoryAggregator
 from binge_buddy.agents.memory_attributor import MemoryAttributor
 from binge_buddy.agents.memory_extractor import MemoryExtractor
 from binge_buddy.agents.memory_sentinel import MemorySentinel
+from binge_buddy.llm_registry import get_llm
 from binge_buddy.memory import Memory, SemanticMemory
 from binge_buddy.memory_db import MemoryDB
 from binge_buddy.memory_handler import SemanticMemoryHandler
-from binge_buddy.memory_workflow.multi_agent_workflow import MultiAgentWorkflow
+from binge_buddy.memory_workflow.multi_agent_workflow import (
+    MultiAgentWorkflow,
+    merge_review_and_attribution,
+)
 from binge_buddy.message import UserMessage
-from binge_buddy.ollama import OllamaLLM, OpenAILLM
-from binge_buddy.state_graph import CustomStateGraph
+from binge_buddy.state_graph import CustomStateGraph, GraphRunResult
 
 
 class SemanticWorkflow(MultiAgentWorkflow):
-    def __init__(self, memory_handler):
+    def __init__(self, memory_handler, llm: Optional[LLM] = None):
         super().__init__()
 
-        # todo: change this to use global llm
-        model = "mistral:7b"
-        # llm = OllamaLLM(model=model)
-        llm = OpenAILLM()
+        # Share the process-wide client unless one is passed in
+        llm = llm or get_llm()
         memory_sentinel = MemorySentinel(llm)
         memory_extractor = MemoryExtractor(llm)
         extractor_reviewer = ExtractorReviewer(llm)
@@ -36,12 +41,32 @@ class SemanticWorkflow(MultiAgentWorkflow):
         self.state_graph: CustomStateGraph = CustomStateGraph(SemanticAgentState)
 
         # Add Nodes
-        self.state_graph.add_node("sentinel", memory_sentinel.process)
-        self.state_graph.add_node("memory_extractor", memory_extractor.process)
-        self.state_graph.add_node("memory_reviewer", extractor_reviewer.process)
-        self.state_graph.add_node("memory_attributor", memory_attributor.process)
-        self.state_graph.add_node("memory_aggregator", memory_aggregator.process)
-        self.state_graph.add_node("aggregator_reviewer", aggregator_reviewer.process)
+        self.state_graph.add_node(
+            "sentinel", memory_sentinel.process, memory_sentinel.aprocess
+        )
+        self.state_graph.add_node(
+            "memory_extractor", memory_extractor.process, memory_extractor.aprocess
+        )
+        self.state_graph.add_node(
+            "memory_reviewer", extractor_reviewer.process, extractor_reviewer.aprocess
+        )
+        self.state_graph.add_node(
+            "memory_attributor", memory_attributor.process, memory_attributor.aprocess
+        )
+        # The attributor works on the extracted memories while they are reviewed
+        self.state_graph.add_parallel_node(
+            "review_and_attribute",
+            ["memory_reviewer", "memory_attributor"],
+            merge_review_and_attribution,
+        )
+        self.state_graph.add_node(
+            "memory_aggregator", memory_aggregator.process, memory_aggregator.aprocess
+        )
+        self.state_graph.add_node(
+            "aggregator_reviewer",
+            aggregator_reviewer.process,
+            aggregator_reviewer.aprocess,
+        )
         self.state_graph.add_node(
             "memory_handler", memory_handler.process
         )  # Final action node
@@ -63,29 +88,25 @@ class SemanticWorkflow(MultiAgentWorkflow):
             "memory_extractor",
             lambda state: "continue" if state.extracted_memories else "end",
             {
-                "continue": "memory_reviewer",
+                "continue": "review_and_attribute",
                 "end": None,
             },
         )
 
         self.state_graph.add_conditional_edges(
-            "memory_reviewer",
-            lambda state: ("continue" if not state.needs_repair else "repair"),
-            {
-                "continue": "memory_attributor",
-                "repair": "memory_extractor",
-            },
-        )
-
-        self.state_graph.add_conditional_edges(
-            "memory_attributor",
+            "review_and_attribute",
             lambda state: (
-                "continue"
-                if all(mem.has_attribute() for mem in state.extracted_memories)
-                else "end"
+                "repair"
+                if state.needs_repair
+                else (
+                    "continue"
+                    if all(mem.has_attribute() for mem in state.extracted_memories)
+                    else "end"
+                )
             ),
             {
                 "continue": "memory_aggregator",
+                "repair": "memory_extractor",
                 "end": None,
             },
         )
@@ -111,8 +132,22 @@ class SemanticWorkflow(MultiAgentWorkflow):
         # Add Normal Edges
         self.state_graph.add_edge("memory_handler", None)
 
-    def run(self, initial_state: AgentState):
-        self.state_graph.run(initial_state)
+        # A run that exhausts its budget in a repair loop keeps what it has
+        self.memory_handler = memory_handler
+        self.state_graph.add_node("best_effort_store", self.store_best_effort)
+        self.state_graph.set_budget_exit("best_effort_store")
+
+    def store_best_effort(self, state: AgentState):
+        """
+        Stores the last aggregation the reviewer approved, if any. An aggregation
+        that was rejected, or not reviewed yet, is never written.
+        """
+        if state.approved_memories:
+            state.aggregated_memories = state.approved_memories
+            self.memory_handler.process(state)
+
+    def run(self, initial_state: AgentState) -> GraphRunResult:
+        return self.state_graph.execute(initial_state)
 
     def run_with_logging(self, initial_state: AgentState):
         self.state_graph.run_with_logging(initial_state)
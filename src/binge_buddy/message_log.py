@@ -1,6 +1,5 @@
 import logging
-import threading
-from typing import Callable, Iterator, List, Optional
+from typing import Callable, Iterator, List, Optional, Tuple
 
 from langchain.schema import HumanMessage
 
@@ -9,27 +8,66 @@ from binge_buddy.agent_state.states import (
     EpisodicAgentState,
     SemanticAgentState,
 )
+from binge_buddy.durable_queue import DurableJobQueue, get_durable_queue
+from binge_buddy.memory import Memory
 from binge_buddy.memory_workflow.episodic_workflow import EpisodicWorkflow
+from binge_buddy.memory_workflow.fused_workflow import FusedWorkflow
 from binge_buddy.memory_workflow.semantic_workflow import SemanticWorkflow
 from binge_buddy.message import Message, UserMessage
+from binge_buddy.workflow_executor import (
+    WorkflowExecutor,
+    WorkflowQueueFull,
+    get_workflow_executor,
+)
 
 
 class MessageLog:
-    def __init__(self, user_id, session_id, memory_handler, mode):
+    def __init__(
+        self,
+        user_id,
+        session_id,
+        memory_handler,
+        mode,
+        llm=None,
+        pipeline="multi-agent",
+        executor: Optional[WorkflowExecutor] = None,
+        durable_queue: Optional[DurableJobQueue] = None,
+    ):
+        """
+        :param mode: Which memories are kept, "semantic" or "episodic".
+        :param pipeline: How they are extracted, "multi-agent" for the agent graph
+            or "fused" for a single structured call, see `FusedWorkflow`.
+        :param executor: Runs the subscribers in the background, defaults to the
+            process-wide bounded pool, see `get_workflow_executor`.
+        :param durable_queue: Persists every workflow run until it completes, so
+            runs lost to a restart are resumed, defaults to `get_durable_queue`
+            (disabled unless WORKFLOW_QUEUE_PATH is set).
+        """
         self.user_id = user_id
         self.session_id = session_id
         self.messages: List[Message] = []
         self.subscribers: List[Callable[[AgentState], None]] = []
         self.memory_handler = memory_handler
         self.mode = mode
-
-        if self.mode == "semantic":
-            workflow = SemanticWorkflow(memory_handler)
+        self.pipeline = pipeline
+        self.executor = executor or get_workflow_executor()
+        self.durable_queue = durable_queue or get_durable_queue()
+        # Jobs are picked up by any message log running the same workflow
+        self.queue_name = f"{pipeline}-{mode}"
+
+        if self.pipeline == "fused":
+            workflow = FusedWorkflow(memory_handler, llm=llm)
+        elif self.mode == "semantic":
+            workflow = SemanticWorkflow(memory_handler, llm=llm)
         else:
-            workflow = EpisodicWorkflow(memory_handler)
+            workflow = EpisodicWorkflow(memory_handler, llm=llm)
 
         self.subscribe(workflow.run)
 
+        if self.durable_queue is not None:
+            # Resumes the jobs of a previous process, then keeps picking up retries
+            self.durable_queue.watch(self.queue_name, self._resume)
+
     def add_message(self, message: Message):
         self.messages.append(message)
         if isinstance(message, UserMessage):
@@ -40,23 +78,102 @@ class MessageLog:
 
     def notify_subscribers(self, message: UserMessage):
         logging.info("notifying subscribers")
-        for subscriber in self.subscribers:
-            memories = self.memory_handler.get_existing_memories(message.user_id)
-            if self.mode == "semantic":
-                state = SemanticAgentState(
-                    user_id=message.user_id,
-                    existing_memories=memories,
-                    current_user_message=message,
-                )
-            else:
-                state = EpisodicAgentState(
-                    user_id=message.user_id,
-                    existing_memories=memories,
-                    current_user_message=message,
-                )
-
-            thread = threading.Thread(target=subscriber, args=(state,))
-            thread.start()
+        job_id = None
+        if self.durable_queue is not None:
+            # Stored before it runs, the existing memories are read when it does
+            job_id = self.durable_queue.enqueue(
+                self.queue_name, message.user_id, self._build_state(message, [])
+            )
+        self._dispatch(job_id, message)
+
+    def _resume(self, job_id: int, state: AgentState):
+        self._dispatch(job_id, state.current_user_message)
+
+    def _dispatch(self, job_id: Optional[int], message: UserMessage):
+        try:
+            # One lane per user keeps their workflow runs in order
+            self.executor.submit_serial(
+                message.user_id,
+                self._run_subscribers,
+                (job_id, message),
+                on_drop=self._drop,
+            )
+        except WorkflowQueueFull:
+            # The reply does not depend on the memories, so the chat goes on without them,
+            # the lane's messages were passed to `_drop`
+            pass
+
+    def _drop(self, item: Tuple[Optional[int], UserMessage]):
+        """Gives up on a message the executor refused, durable jobs are retried later."""
+        job_id, message = item
+        if job_id is None:
+            logging.warning(
+                f"Memory workflow skipped for a message of {message.user_id}: not queued"
+            )
+        else:
+            logging.warning(
+                f"Memory workflow deferred for a message of {message.user_id}: not queued"
+            )
+            self.durable_queue.release([job_id])
+
+    def _run_subscribers(self, items: List[Tuple[Optional[int], UserMessage]]):
+        """
+        Runs every subscriber once for the messages a user sent since its last run.
+
+        The state is built here rather than when the message arrived, so the
+        existing memories include what the previous run of the lane stored.
+        Durable jobs are completed once all subscribers succeeded and released
+        for a retry otherwise.
+        """
+        job_ids = [job_id for job_id, _ in items if job_id is not None]
+        if job_ids:
+            # Jobs taken over by another worker after our lease expired are its to run
+            job_ids = self.durable_queue.renew(job_ids)
+            items = [
+                (job_id, message)
+                for job_id, message in items
+                if job_id is None or job_id in job_ids
+            ]
+            if not items:
+                return
+
+        message = self._combine([message for _, message in items])
+        try:
+            for subscriber in self.subscribers:
+                memories = self.memory_handler.get_existing_memories(message.user_id)
+                subscriber(self._build_state(message, memories))
+        except Exception as e:
+            if job_ids:
+                self.durable_queue.fail(job_ids, repr(e))
+            raise
+        if job_ids:
+            self.durable_queue.complete(job_ids)
+
+    @staticmethod
+    def _combine(messages: List[UserMessage]) -> UserMessage:
+        """Merges messages that arrived in quick succession into one extraction input."""
+        if len(messages) == 1:
+            return messages[0]
+        last = messages[-1]
+        return UserMessage(
+            content="\n".join(message.content for message in messages),
+            user_id=last.user_id,
+            session_id=last.session_id,
+            timestamp=last.timestamp,
+        )
+
+    def _build_state(self, message: UserMessage, memories: List[Memory]) -> AgentState:
+        if self.mode == "semantic":
+            return SemanticAgentState(
+                user_id=message.user_id,
+                existing_memories=memories,
+                current_user_message=message,
+            )
+        return EpisodicAgentState(
+            user_id=message.user_id,
+            existing_memories=memories,
+            current_user_message=message,
+        )
 
     def get_last_message(self) -> Optional[Message]:
         """
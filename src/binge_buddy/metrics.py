@@ -0,0 +1,209 @@
+"""In-process metrics registry with Prometheus text export"""
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Labels attached to every metric recorded in the current context, e.g. the
+# agent and user a graph node is running for
+_current_labels: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar(
+    "metric_labels", default={}
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+@contextmanager
+def metric_labels(**labels) -> Iterator[None]:
+    """Adds labels to every metric recorded inside the block (on this thread or task)."""
+    merged = {
+        **_current_labels.get(),
+        **{k: str(v) for k, v in labels.items() if v is not None},
+    }
+    token = _current_labels.set(merged)
+    try:
+        yield
+    finally:
+        _current_labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    return dict(_current_labels.get())
+
+
+class RunUsage:
+    """LLM calls and tokens spent inside a `track_usage` block."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, llm_calls: int = 0, tokens: int = 0):
+        with self._lock:
+            self.llm_calls += llm_calls
+            self.tokens += tokens
+
+
+_current_usage: contextvars.ContextVar[Optional[RunUsage]] = contextvars.ContextVar(
+    "run_usage", default=None
+)
+
+
+@contextmanager
+def track_usage() -> Iterator[RunUsage]:
+    """
+    Adds up the LLM usage recorded inside the block, including on threads and
+    tasks that were started from it with a copy of the context.
+    """
+    usage = RunUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(llm_calls: int = 0, tokens: int = 0):
+    """Adds to the usage of the enclosing `track_usage` block, if any."""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(llm_calls, tokens)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and timings keyed by name and labels.
+
+    Labels passed explicitly are merged over the ones set with `metric_labels`.
+    """
+
+    def __init__(self, namespace: str = "binge_buddy"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        # name -> labels -> [count, sum, max]
+        self._timings: Dict[str, Dict[LabelKey, list]] = defaultdict(dict)
+
+    @staticmethod
+    def _label_key(labels: Dict[str, object]) -> LabelKey:
+        merged = {**_current_labels.get(), **labels}
+        return tuple(sorted((k, str(v)) for k, v in merged.items() if v is not None))
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._label_key(labels)
+        with self._lock:
+            self._counters[name][key] += amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._label_key(labels)
+        with self._lock:
+            timing = self._timings[name].setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observes how long the block takes, including when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """Returns the sum of a counter over every label set matching `labels`."""
+        wanted = {(k, str(v)) for k, v in labels.items()}
+        with self._lock:
+            return sum(
+                value
+                for key, value in self._counters.get(name, {}).items()
+                if wanted <= set(key)
+            )
+
+    def snapshot(self) -> Dict[str, list]:
+        """Returns every counter and timing with its labels."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(key), "value": value}
+                    for name, series in self._counters.items()
+                    for key, value in series.items()
+                ],
+                "timings": [
+                    {
+                        "name": name,
+                        "labels": dict(key),
+                        "count": count,
+                        "sum": total,
+                        "max": maximum,
+                    }
+                    for name, series in self._timings.items()
+                    for key, (count, total, maximum) in series.items()
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Renders the registry in the Prometheus text format. Counters are exported
+        as `<name>_total` and timings as summaries in seconds.
+
+        :param gauges: Extra point-in-time values (e.g. queue depth) keyed by name.
+        """
+        lines = []
+        snapshot = self.snapshot()
+
+        def series(name: str, labels: Dict[str, str], value: float):
+            rendered = ",".join(
+                f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())
+            )
+            lines.append(
+                f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}"
+            )
+
+        by_name = defaultdict(list)
+        for counter in snapshot["counters"]:
+            by_name[counter["name"]].append(counter)
+        for name, counters in sorted(by_name.items()):
+            metric = f"{self.namespace}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for counter in counters:
+                series(metric, counter["labels"], counter["value"])
+
+        by_name = defaultdict(list)
+        for timing in snapshot["timings"]:
+            by_name[timing["name"]].append(timing)
+        for name, timings in sorted(by_name.items()):
+            metric = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for timing in timings:
+                series(f"{metric}_count", timing["labels"], timing["count"])
+                series(f"{metric}_sum", timing["labels"], timing["sum"])
+            lines.append(f"# TYPE {metric}_max gauge")
+            for timing in timings:
+                series(f"{metric}_max", timing["labels"], timing["max"])
+
+        for name, value in sorted((gauges or {}).items()):
+            metric = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            series(metric, {}, value)
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsRegistry()
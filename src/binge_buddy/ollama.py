@@ -1,19 +1,549 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
 import json
+import logging
 import os
 import subprocess
+import threading
+import time
+from abc import abstractmethod
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Iterator, List, Optional
 
-import requests
+import httpx
 import yaml
 from dotenv import load_dotenv
 from langchain.llms.base import LLM
 from langchain.schema import PromptValue  # Import ChatPromptValue
+from langchain_core.callbacks import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.outputs import GenerationChunk, LLMResult
 from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.runnables import RunnableConfig, ensure_config
 from openai import OpenAI
+from pydantic import PrivateAttr
 
+from binge_buddy import utils
+from binge_buddy.http_pool import HTTPPool, get_http_pool
+from binge_buddy.llm_cache import LLMResponseCache, get_llm_cache
+from binge_buddy.llm_dispatcher import LLMDispatcher
+from binge_buddy.metrics import metric_labels, metrics, record_usage
+from binge_buddy.ollama_sessions import OllamaSessionStore, get_session_store
+from binge_buddy.rate_limiter import (
+    RateLimiter,
+    RetryPolicy,
+    estimate_tokens,
+    get_rate_limiter,
+)
 
-class OllamaLLM(LLM):  # Inherit from the LLM base class
+
+class LLMRequestError(Exception):
+    """Raised when an LLM backend answers a request with a non-200 status."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Error: {status_code}, {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+@lru_cache(maxsize=None)
+def _load_env_file() -> bool:
+    """Loads the root `.env` once per process. Returns whether the file exists."""
+    BASE_DIR = Path(__file__).resolve().parent.parent.parent
+    ENV_PATH = BASE_DIR / ".env"
+
+    if not ENV_PATH.exists():
+        return False
+
+    load_dotenv(ENV_PATH)
+    return True
+
+
+def _cached_tokens(usage: dict) -> Optional[int]:
+    """Returns the prompt tokens OpenAI served from its prompt cache, if reported."""
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+
+def _prompt_messages(prompt) -> List[BaseMessage]:
+    """Returns the chat messages of a prompt, wrapping plain strings as a human message."""
+    if isinstance(prompt, PromptValue):
+        return prompt.to_messages()
+    return [HumanMessage(content=str(prompt))]
+
+
+class BaseHTTPLLM(LLM):
+    """
+    Common plumbing for the HTTP backed LLMs: pooled connections, response caching
+    and request dispatching.
+
+    Subclasses implement `_complete`/`_acomplete` to send one request to their
+    backend; `_call`/`_acall` wrap those with a lookup in the response cache and,
+    if a dispatcher is set, route the request through it.
+    """
+
+    model: str
+    temperature: float
+    http_pool: Optional[HTTPPool] = None  # Shared keep-alive connection pool
+    response_cache: Optional[LLMResponseCache] = None  # Shared response cache
+    dispatcher: Optional[LLMDispatcher] = None  # Shared micro-batching dispatcher
+    retry_policy: Optional[RetryPolicy] = None  # Backoff for failed requests
+
+    def _retry_delay(self, attempt: int, status, error, response) -> Optional[float]:
+        """Returns how long to wait before retrying, or None if the request must not be retried."""
+        if attempt >= self.retry_policy.max_retries:
+            return None
+        if not self.retry_policy.is_retryable(status):
+            return None
+
+        metrics.inc(
+            "llm_retries",
+            model=self.model,
+            backend=self._llm_type,
+            status=status or "connection_error",
+        )
+        retry_after = response.headers.get("retry-after") if response else None
+        delay = self.retry_policy.delay(attempt, retry_after)
+        logging.warning(
+            f"{type(self).__name__}: request failed ({status or error}), retrying in {delay:.1f}s "
+            f"(attempt {attempt + 1}/{self.retry_policy.max_retries})"
+        )
+        return delay
+
+    def _request_key(self, prompt, **params) -> str:
+        return LLMResponseCache.make_key(
+            self._llm_type,
+            self.model,
+            self.temperature,
+            _prompt_messages(prompt),
+            **params,
+        )
+
+    def _use_cache(self, session_id: Optional[str] = None, **kwargs) -> bool:
+        # A session call also advances the session, so it must reach the backend
+        return (
+            session_id is None
+            and self.response_cache is not None
+            and self.response_cache.should_cache(self.temperature)
+        )
+
+    def _dedupe_key(
+        self, request_key: str, session_id: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        # Only deterministic requests may share one completion
+        return request_key if self.temperature == 0.0 and session_id is None else None
+
+    def _call(self, prompt, stop=None, run_manager=None, agent=None, **kwargs) -> str:
+        """
+        Return the completion for the prompt, from the cache if it was seen before.
+
+        :param agent: Name of the calling agent, used for per-agent cache statistics.
+        :param response_schema: Optional JSON schema the completion must follow.
+        :param max_tokens: Optional limit on the visible answer, see `_complete_until`.
+        :param session_id: Optional conversation the call continues, see `OllamaLLM`.
+        :param session_delta: The part of the prompt that is new to the session.
+        """
+        with metric_labels(agent=agent, model=self.model, backend=self._llm_type):
+            request_key = self._request_key(prompt, stop=stop, **kwargs)
+            if self._use_cache(**kwargs):
+                cached = self.response_cache.get(request_key, agent=agent)
+                if cached is not None:
+                    metrics.inc("llm_calls", cache="hit")
+                    return cached
+
+            metrics.inc("llm_calls", cache="miss")
+            record_usage(llm_calls=1)
+            with metrics.timer("llm_request_seconds"):
+                # Dispatcher workers record token usage under the caller's labels
+                complete = functools.partial(
+                    contextvars.copy_context().run,
+                    self._complete_until,
+                    prompt,
+                    stop=stop,
+                    **kwargs,
+                )
+                if self.dispatcher is not None:
+                    response = self.dispatcher.run(
+                        self._dedupe_key(request_key, **kwargs), complete
+                    )
+                else:
+                    response = complete()
+
+            if self._use_cache(**kwargs):
+                self.response_cache.put(request_key, response)
+            return response
+
+    async def _acall(
+        self, prompt, stop=None, run_manager=None, agent=None, **kwargs
+    ) -> str:
+        """
+        Async variant of `_call`.
+        """
+        with metric_labels(agent=agent, model=self.model, backend=self._llm_type):
+            request_key = self._request_key(prompt, stop=stop, **kwargs)
+            if self._use_cache(**kwargs):
+                cached = self.response_cache.get(request_key, agent=agent)
+                if cached is not None:
+                    metrics.inc("llm_calls", cache="hit")
+                    return cached
+
+            metrics.inc("llm_calls", cache="miss")
+            record_usage(llm_calls=1)
+            with metrics.timer("llm_request_seconds"):
+                if self.dispatcher is not None:
+                    # The dispatcher's bounded workers send the request, the event loop is not blocked
+                    response = await asyncio.wrap_future(
+                        self.dispatcher.submit(
+                            self._dedupe_key(request_key, **kwargs),
+                            functools.partial(
+                                contextvars.copy_context().run,
+                                self._complete_until,
+                                prompt,
+                                stop=stop,
+                                **kwargs,
+                            ),
+                        )
+                    )
+                else:
+                    response = await self._acomplete_until(prompt, stop=stop, **kwargs)
+
+            if self._use_cache(**kwargs):
+                self.response_cache.put(request_key, response)
+            return response
+
+    def _record_tokens(
+        self,
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int],
+        cached_tokens: Optional[int] = None,
+        **labels,
+    ):
+        """
+        Counts the tokens a request used, as reported by the backend.
+        `cached_tokens` are the prompt tokens served from the provider's prompt cache.
+        """
+        labels = {"model": self.model, "backend": self._llm_type, **labels}
+        record_usage(tokens=(prompt_tokens or 0) + (completion_tokens or 0))
+        if prompt_tokens:
+            metrics.inc("llm_prompt_tokens", prompt_tokens, **labels)
+        if cached_tokens:
+            metrics.inc("llm_cached_prompt_tokens", cached_tokens, **labels)
+        if completion_tokens:
+            metrics.inc("llm_completion_tokens", completion_tokens, **labels)
+
+    def _complete_until(self, prompt, stop=None, max_tokens=None, **kwargs) -> str:
+        """
+        Sends the prompt and returns the completion.
+
+        With a stop sequence or `max_tokens`, the completion is streamed through
+        `utils.StreamFilter`, which drops <think> spans, and the request is
+        closed as soon as the visible answer is complete, which also makes the
+        backend stop generating. Both are enforced on the client because the
+        hidden reasoning must neither trigger them nor count towards them.
+        """
+        if not stop and max_tokens is None:
+            return self._complete(prompt, **kwargs)
+
+        usage = {}
+        chunks_read = 0
+        stream_filter = utils.StreamFilter(stop, max_tokens)
+        answer = []
+        with contextlib.closing(
+            self._stream_completion(prompt, usage, **kwargs)
+        ) as chunks:
+            for chunk in chunks:
+                chunks_read += 1
+                answer.append(stream_filter.feed(chunk))
+                if stream_filter.done:
+                    break
+        answer.append(stream_filter.flush())
+
+        self._record_tokens(
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens") or chunks_read,
+            usage.get("cached_tokens"),
+        )
+        return "".join(answer)
+
+    async def _acomplete_until(
+        self, prompt, stop=None, max_tokens=None, **kwargs
+    ) -> str:
+        """
+        Async variant of `_complete_until`.
+        """
+        if not stop and max_tokens is None:
+            return await self._acomplete(prompt, **kwargs)
+
+        usage = {}
+        chunks_read = 0
+        stream_filter = utils.StreamFilter(stop, max_tokens)
+        answer = []
+        chunks = self._astream_completion(prompt, usage, **kwargs)
+        try:
+            async for chunk in chunks:
+                chunks_read += 1
+                answer.append(stream_filter.feed(chunk))
+                if stream_filter.done:
+                    break
+        finally:
+            await chunks.aclose()
+        answer.append(stream_filter.flush())
+
+        self._record_tokens(
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens") or chunks_read,
+            usage.get("cached_tokens"),
+        )
+        return "".join(answer)
+
+    def _stream_run(
+        self, manager_cls, prompt: PromptValue, config, stop, **kwargs
+    ) -> tuple:
+        """
+        Returns the callback manager and the `on_llm_start` arguments of a
+        streamed run, configured the way `BaseLLM.stream` does.
+        """
+        config = ensure_config(config)
+        callback_manager = manager_cls.configure(
+            config.get("callbacks"),
+            self.callbacks,
+            self.verbose,
+            config.get("tags"),
+            self.tags,
+            {
+                **(config.get("metadata") or {}),
+                **self._get_ls_params(stop=stop, **kwargs),
+            },
+            self.metadata,
+        )
+        start = {
+            "serialized": self._serialized,
+            "prompts": [prompt.to_string()],
+            "invocation_params": {**self.dict(), "stop": stop, **kwargs},
+            "options": {"stop": stop},
+            "name": config.get("run_name"),
+            "run_id": config.pop("run_id", None),
+            "batch_size": 1,
+        }
+        return callback_manager, start
+
+    def stream(
+        self,
+        input,
+        config: Optional[RunnableConfig] = None,
+        *,
+        stop: Optional[List[str]] = None,
+        **kwargs,
+    ) -> Iterator[str]:
+        """
+        Same as `BaseLLM.stream`, except that `_stream` gets the prompt itself
+        rather than the prompt flattened into one string. A streamed call thus
+        sends the same messages as `_call`.
+        """
+        prompt = self._convert_input(input)
+        callback_manager, start = self._stream_run(
+            CallbackManager, prompt, config, stop, **kwargs
+        )
+        (run_manager,) = callback_manager.on_llm_start(**start)
+        generation = None
+        try:
+            for chunk in self._stream(
+                prompt, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk.text
+                generation = chunk if generation is None else generation + chunk
+        except BaseException as e:
+            run_manager.on_llm_error(
+                e, response=LLMResult(generations=[[generation]] if generation else [])
+            )
+            raise
+        run_manager.on_llm_end(LLMResult(generations=[[generation]]))
+
+    async def astream(
+        self,
+        input,
+        config: Optional[RunnableConfig] = None,
+        *,
+        stop: Optional[List[str]] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of `stream`.
+        """
+        prompt = self._convert_input(input)
+        callback_manager, start = self._stream_run(
+            AsyncCallbackManager, prompt, config, stop, **kwargs
+        )
+        (run_manager,) = await callback_manager.on_llm_start(**start)
+        generation = None
+        try:
+            async for chunk in self._astream(
+                prompt, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk.text
+                generation = chunk if generation is None else generation + chunk
+        except BaseException as e:
+            await run_manager.on_llm_error(
+                e, response=LLMResult(generations=[[generation]] if generation else [])
+            )
+            raise
+        await run_manager.on_llm_end(LLMResult(generations=[[generation]]))
+
+    def _stream(
+        self,
+        prompt,
+        stop=None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        agent=None,
+        max_tokens=None,
+        **kwargs,
+    ) -> Iterator[GenerationChunk]:
+        """
+        Yields the visible completion as it arrives, without <think> spans, and
+        reports each token to the run's callbacks.
+
+        :param agent: Name of the calling agent, used to label the metrics.
+        :param stop: Sequences that end the answer, they are not yielded.
+        :param max_tokens: Maximum number of visible chunks to yield.
+        """
+        labels = {"agent": agent, "model": self.model, "backend": self._llm_type}
+        usage = {}
+        chunks_read = 0
+        started = time.perf_counter()
+        yielded = False
+        stream_filter = utils.StreamFilter(stop, max_tokens)
+        metrics.inc("llm_calls", cache="stream", **labels)
+        record_usage(llm_calls=1)
+        try:
+            with contextlib.closing(
+                self._stream_completion(prompt, usage, **kwargs)
+            ) as chunks:
+                for chunk in chunks:
+                    chunks_read += 1
+                    token = stream_filter.feed(chunk)
+                    if token:
+                        if not yielded:
+                            metrics.observe(
+                                "llm_first_token_seconds",
+                                time.perf_counter() - started,
+                                **labels,
+                            )
+                            yielded = True
+                        yield self._generation_chunk(token, run_manager)
+                    if stream_filter.done:
+                        break
+            token = stream_filter.flush()
+            if token or not yielded:
+                # A run ends with at least one chunk, e.g. one that only thought
+                yield self._generation_chunk(token, run_manager)
+        finally:
+            metrics.observe(
+                "llm_request_seconds", time.perf_counter() - started, **labels
+            )
+            self._record_tokens(
+                usage.get("prompt_tokens"),
+                usage.get("completion_tokens") or chunks_read,
+                usage.get("cached_tokens"),
+                **labels,
+            )
+
+    async def _astream(
+        self,
+        prompt,
+        stop=None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        agent=None,
+        max_tokens=None,
+        **kwargs,
+    ) -> AsyncIterator[GenerationChunk]:
+        """
+        Async variant of `_stream`.
+        """
+        labels = {"agent": agent, "model": self.model, "backend": self._llm_type}
+        usage = {}
+        chunks_read = 0
+        started = time.perf_counter()
+        yielded = False
+        stream_filter = utils.StreamFilter(stop, max_tokens)
+        metrics.inc("llm_calls", cache="stream", **labels)
+        record_usage(llm_calls=1)
+        chunks = self._astream_completion(prompt, usage, **kwargs)
+        try:
+            async for chunk in chunks:
+                chunks_read += 1
+                token = stream_filter.feed(chunk)
+                if token:
+                    if not yielded:
+                        metrics.observe(
+                            "llm_first_token_seconds",
+                            time.perf_counter() - started,
+                            **labels,
+                        )
+                        yielded = True
+                    yield await self._ageneration_chunk(token, run_manager)
+                if stream_filter.done:
+                    break
+            token = stream_filter.flush()
+            if token or not yielded:
+                yield await self._ageneration_chunk(token, run_manager)
+        finally:
+            await chunks.aclose()
+            metrics.observe(
+                "llm_request_seconds", time.perf_counter() - started, **labels
+            )
+            self._record_tokens(
+                usage.get("prompt_tokens"),
+                usage.get("completion_tokens") or chunks_read,
+                usage.get("cached_tokens"),
+                **labels,
+            )
+
+    @staticmethod
+    def _generation_chunk(
+        token: str, run_manager: Optional[CallbackManagerForLLMRun]
+    ) -> GenerationChunk:
+        chunk = GenerationChunk(text=token)
+        if run_manager is not None:
+            run_manager.on_llm_new_token(token, chunk=chunk)
+        return chunk
+
+    @staticmethod
+    async def _ageneration_chunk(
+        token: str, run_manager: Optional[AsyncCallbackManagerForLLMRun]
+    ) -> GenerationChunk:
+        chunk = GenerationChunk(text=token)
+        if run_manager is not None:
+            await run_manager.on_llm_new_token(token, chunk=chunk)
+        return chunk
+
+    @abstractmethod
+    def _complete(self, prompt, stop=None, **kwargs) -> str:
+        """Sends the prompt to the backend and returns the completion."""
+
+    @abstractmethod
+    async def _acomplete(self, prompt, stop=None, **kwargs) -> str:
+        """Async variant of `_complete`."""
+
+    @abstractmethod
+    def _stream_completion(self, input, usage: dict, **kwargs) -> Iterator[str]:
+        """
+        Streams the completion from the backend, storing the reported
+        `prompt_tokens` and `completion_tokens` in `usage` once it ends.
+        """
+
+    @abstractmethod
+    def _astream_completion(self, input, usage: dict, **kwargs) -> AsyncIterator[str]:
+        """Async variant of `_stream_completion`."""
+
+
+class OllamaLLM(BaseHTTPLLM):  # Inherit from the LLM base class
     # model: str = "llama2:7b"
     model: str = "deepseek-r1:8b"
     # model: Optional[str] = "neural-chat:7b"
@@ -23,11 +553,27 @@ class OllamaLLM(LLM):  # Inherit from the LLM base class
     gpu_layers: int = 15
     port: int = 11434  # Default port
     url: str = f"http://localhost:{port}"
+    check_model: str = (
+        "lazy"  # When to verify the model exists: eager, background or lazy
+    )
+    keep_alive: str = (
+        "5m"  # How long Ollama keeps the model loaded after a session call
+    )
+    sessions: Optional[OllamaSessionStore] = None
+
+    _model_checked: bool = PrivateAttr(default=False)
+    _model_check_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
 
     def __init__(
         self,
         model: Optional[str] = "deepseek-r1:8b",
         port: Optional[int] = 11434,
+        http_pool: Optional[HTTPPool] = None,
+        response_cache: Optional[LLMResponseCache] = None,
+        dispatcher: Optional[LLMDispatcher] = None,
+        check_model: str = "lazy",
+        sessions: Optional[OllamaSessionStore] = None,
+        retry_policy: Optional[RetryPolicy] = None,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -36,21 +582,53 @@ class OllamaLLM(LLM):  # Inherit from the LLM base class
         self.model = model or self.model
         self.port = port or self.port
         self.url = f"http://localhost:{self.port}"
+        self.http_pool = http_pool or get_http_pool()
+        self.response_cache = (
+            response_cache if response_cache is not None else get_llm_cache()
+        )
+        self.dispatcher = dispatcher
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.check_model = check_model
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", self.keep_alive)
+        self.sessions = sessions if sessions is not None else get_session_store()
 
-        self.check_and_pull_model()
+        # Checking (and possibly pulling) the model blocks, so by default it is
+        # deferred until the first request instead of slowing down construction
+        if self.check_model == "eager":
+            self.ensure_model()
+        elif self.check_model == "background":
+            threading.Thread(
+                target=self._ensure_model_in_background, daemon=True
+            ).start()
+
+    def ensure_model(self):
+        """Runs `check_and_pull_model` once, the first time the model is needed."""
+        if self._model_checked:
+            return
+        with self._model_check_lock:
+            if not self._model_checked:
+                self.check_and_pull_model()
+                self._model_checked = True
+
+    def _ensure_model_in_background(self):
+        try:
+            self.ensure_model()
+        except RuntimeError as e:
+            # The first request will retry the check and surface the error
+            logging.warning(f"OllamaLLM: background model check failed: {e}")
 
     def is_server_running(self) -> bool:
         """Check if the Ollama server is running on the specified port."""
         try:
-            response = requests.get(f"{self.url}/api/tags", timeout=2)
+            response = self.http_pool.get(f"{self.url}/api/tags", timeout=2)
             return response.status_code == 200
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        except (httpx.ConnectError, httpx.TimeoutException):
             return False
 
     def check_and_pull_model(self):
         """Check if the specified model exists; if not, attempt to pull it."""
         try:
-            response = requests.get(f"{self.url}/api/tags", timeout=2)
+            response = self.http_pool.get(f"{self.url}/api/tags", timeout=2)
             response.raise_for_status()
             available_models = [model["name"] for model in response.json()["models"]]
             if self.model not in available_models:
@@ -69,65 +647,235 @@ class OllamaLLM(LLM):  # Inherit from the LLM base class
                         f"Failed to pull model '{self.model}'. Error: {result.stderr.decode()}"
                     )
                 print(f"Model '{self.model}' pulled successfully.")
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise RuntimeError(f"Failed to connect to Ollama API: {e}")
 
-    def _call(self, prompt: str, **kwargs) -> str:
-        """
-        Call the Ollama API with the given prompt and return the response.
-        """
-        # Convert ChatPromptValue to a string if necessary
-        if isinstance(prompt, ChatPromptValue):
-            prompt_messages = prompt.to_messages()
-
+    @staticmethod
+    def _format_prompt(prompt) -> str:
         # Convert messages to a formatted string
-        formatted_prompt = "\n".join(
-            [f"{msg.type.capitalize()}: {msg.content}" for msg in prompt_messages]
+        return "\n".join(
+            [
+                f"{msg.type.capitalize()}: {msg.content}"
+                for msg in _prompt_messages(prompt)
+            ]
         )
 
-        url = f"{self.url}/api/generate"
+    def _build_payload(
+        self,
+        prompt,
+        stream: bool,
+        response_schema: Optional[dict] = None,
+        session_id: Optional[str] = None,
+        session_delta=None,
+        **kwargs,
+    ) -> dict:
+        """
+        Builds a `/api/generate` request.
+
+        A call with a `session_id` continues that conversation: while the session's
+        `context` is still usable only `session_delta`, the part of the prompt the
+        model has not seen yet, is sent along with it. Otherwise the full prompt is
+        replayed and the returned context starts the session over.
+        """
+        formatted_prompt = self._format_prompt(prompt)
+        context = None
+        if session_id is not None and session_delta is not None:
+            formatted_delta = self._format_prompt(session_delta)
+            context = self.sessions.get(
+                session_id, new_tokens=estimate_tokens(formatted_delta)
+            )
+            if context is not None:
+                formatted_prompt = formatted_delta
+
         payload = {
             "model": self.model,
             "prompt": formatted_prompt,  # Use the stringified prompt
-            "stream": False,
-            "temperature": self.temperature,
+            "stream": stream,
+            "options": {"temperature": self.temperature},
         }
-        response = requests.post(url, json=payload)
+        if response_schema is not None:
+            # Constrains decoding to JSON matching the schema
+            payload["format"] = response_schema
+        if session_id is not None:
+            # Keeps the model, and with it the session's KV cache, loaded between turns
+            payload["keep_alive"] = self.keep_alive
+        if context is not None:
+            payload["context"] = context
+        return payload
+
+    def _remember_context(self, session_id: Optional[str], context: Optional[list]):
+        if session_id is None:
+            return
+        if context:
+            self.sessions.put(session_id, context)
+        else:
+            self.sessions.drop(session_id)
+
+    def _complete(self, prompt, stop=None, **kwargs) -> str:
+        """
+        Call the Ollama API with the given prompt and return the response.
+        """
+        self.ensure_model()
+        url = f"{self.url}/api/generate"
+        payload = self._build_payload(prompt, stream=False, **kwargs)
+        response = self.http_pool.post(url, json=payload)
+        return self._parse_response(response, kwargs.get("session_id"))
+
+    async def _acomplete(self, prompt, stop=None, **kwargs) -> str:
+        """
+        Async variant of `_complete` that does not block a thread while waiting on Ollama.
+        """
+        await asyncio.to_thread(self.ensure_model)
+        url = f"{self.url}/api/generate"
+        payload = self._build_payload(prompt, stream=False, **kwargs)
+        response = await self.http_pool.apost(url, json=payload)
+        return self._parse_response(response, kwargs.get("session_id"))
+
+    def _parse_response(self, response, session_id: Optional[str] = None) -> str:
         if response.status_code == 200:
-            return response.json()["response"]
+            body = response.json()
+            self._record_tokens(body.get("prompt_eval_count"), body.get("eval_count"))
+            self._remember_context(session_id, body.get("context"))
+            return body["response"]
         else:
-            raise Exception(f"Error: {response.status_code}, {response.text}")
+            self._remember_context(session_id, None)
+            raise LLMRequestError(response.status_code, response.text)
+
+    @staticmethod
+    def _read_usage(chunk: dict, usage: dict):
+        usage["prompt_tokens"] = chunk.get("prompt_eval_count")
+        usage["completion_tokens"] = chunk.get("eval_count")
+
+    def _stream_completion(self, input, usage: dict, **kwargs) -> Iterator[str]:
+        """
+        Call the Ollama API with streaming enabled and yield tokens as they arrive.
+        """
+        self.ensure_model()
+        url = f"{self.url}/api/generate"
+        payload = self._build_payload(input, stream=True, **kwargs)
+        # A stream closed before the final chunk leaves the session without a
+        # context for the answer, so the next turn replays the full prompt
+        context = None
+        try:
+            attempt = 0
+            while True:
+                chunks = 0
+                try:
+                    with self.http_pool.stream("POST", url, json=payload) as response:
+                        if response.status_code != 200:
+                            response.read()
+                            raise LLMRequestError(response.status_code, response.text)
+
+                        # Ollama streams one JSON object per line
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("response"):
+                                chunks += 1
+                                yield chunk["response"]
+                            if chunk.get("done"):
+                                self._read_usage(chunk, usage)
+                                context = chunk.get("context")
+                                break
+                    return
+                except httpx.TransportError as e:
+                    # Connection errors are retried until the first token, never a partial answer
+                    delay = (
+                        None if chunks else self._retry_delay(attempt, None, e, None)
+                    )
+                    if delay is None:
+                        raise
+                time.sleep(delay)
+                attempt += 1
+        finally:
+            self._remember_context(kwargs.get("session_id"), context)
+
+    async def _astream_completion(
+        self, input, usage: dict, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of `_stream_completion`.
+        """
+        await asyncio.to_thread(self.ensure_model)
+        url = f"{self.url}/api/generate"
+        payload = self._build_payload(input, stream=True, **kwargs)
+        context = None
+        try:
+            attempt = 0
+            while True:
+                chunks = 0
+                try:
+                    async with self.http_pool.astream(
+                        "POST", url, json=payload
+                    ) as response:
+                        if response.status_code != 200:
+                            await response.aread()
+                            raise LLMRequestError(response.status_code, response.text)
+
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("response"):
+                                chunks += 1
+                                yield chunk["response"]
+                            if chunk.get("done"):
+                                self._read_usage(chunk, usage)
+                                context = chunk.get("context")
+                                break
+                    return
+                except httpx.TransportError as e:
+                    delay = (
+                        None if chunks else self._retry_delay(attempt, None, e, None)
+                    )
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            self._remember_context(kwargs.get("session_id"), context)
 
     @property
     def _llm_type(self) -> str:
         return "ollama"
 
 
-class OpenAILLM(LLM):
+class OpenAILLM(BaseHTTPLLM):
     model: str = "gpt-4o-mini"
     temperature: float = 0.7
     base_url: str = "https://api.openai.com/v1"
     api_key: Optional[str] = None
+    rate_limiter: Optional[RateLimiter] = None  # Shared across every agent
 
     def __init__(
         self,
         model: str = "gpt-4o-mini",
         temperature: float = 0.7,
+        http_pool: Optional[HTTPPool] = None,
+        response_cache: Optional[LLMResponseCache] = None,
+        dispatcher: Optional[LLMDispatcher] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
         **kwargs,
     ):
         super().__init__(**kwargs)
 
-        # Load environment variables from the root `.env`
-        BASE_DIR = Path(__file__).resolve().parent.parent.parent
-        ENV_PATH = BASE_DIR / ".env"
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.retry_policy = retry_policy or RetryPolicy()
 
-        if not ENV_PATH.exists():
+        self.http_pool = http_pool or get_http_pool()
+        self.response_cache = (
+            response_cache if response_cache is not None else get_llm_cache()
+        )
+        self.dispatcher = dispatcher
+
+        # Load environment variables from the root `.env`, the key may also come from the environment
+        if not _load_env_file() and not os.getenv("OPENAI_API_KEY"):
             raise FileNotFoundError(
                 "Error: `.env` file not found! Please create one and add the necessary environment variables."
             )
 
-        load_dotenv(ENV_PATH)
-
         # Store the API key
         self.api_key = os.getenv("OPENAI_API_KEY")
 
@@ -136,28 +884,25 @@ class OpenAILLM(LLM):
                 "OPENAI_API_KEY is not set. Please add it to the .env file or set it as an environment variable."
             )
 
+        self.base_url = os.getenv("OPENAI_BASE_URL", self.base_url)
         self.model = model or self.model
-        self.temperature = temperature or self.temperature
+        self.temperature = temperature if temperature is not None else self.temperature
 
-    def _call(self, prompt) -> str:
-        """
-        Call the OpenAI API with the given prompt and return the response.
-        """
-        url = f"{self.base_url}/chat/completions"
-        headers = {
+    def _headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
 
-        if isinstance(prompt, ChatPromptValue):
-            messages = prompt.to_messages()
-
+    def _build_payload(
+        self, prompt, stream: bool, response_schema: Optional[dict] = None
+    ) -> dict:
         openai_messages = [
             {
                 "role": "user" if msg.type == "human" else "system",
                 "content": msg.content,
             }
-            for msg in messages
+            for msg in _prompt_messages(prompt)
         ]
 
         payload = {
@@ -165,13 +910,252 @@ class OpenAILLM(LLM):
             "messages": openai_messages,
             "temperature": self.temperature,
         }
+        if response_schema is not None:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": response_schema.get("title", "response"),
+                    "schema": response_schema,
+                    "strict": True,
+                },
+            }
+        if stream:
+            payload["stream"] = True
+            # Ask for the token usage in the final chunk
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _estimate_tokens(self, payload: dict) -> int:
+        text = "".join(message["content"] for message in payload["messages"])
+        return estimate_tokens(text)
+
+    def _record_usage(self, estimated_tokens: int, response):
+        usage = response.json().get("usage") or {}
+        if "total_tokens" in usage:
+            self.rate_limiter.record_usage(estimated_tokens, usage["total_tokens"])
+
+    def _record_stream_usage(
+        self, payload: dict, estimated_tokens: int, usage: dict, chunks: int
+    ):
+        """
+        Corrects the token bucket for a stream. A stream closed before the final
+        usage chunk is charged its prompt plus one token per chunk read.
+        """
+        actual_tokens = usage.get("total_tokens")
+        if actual_tokens is None:
+            text = "".join(message["content"] for message in payload["messages"])
+            actual_tokens = estimate_tokens(text, max_completion_tokens=0) + chunks
+        self.rate_limiter.record_usage(estimated_tokens, actual_tokens)
+
+    def _post(self, payload: dict):
+        """
+        POSTs to the chat completions endpoint under the rate limiter, retrying
+        429s, 5xx responses and connection errors with jittered backoff.
+        """
+        url = f"{self.base_url}/chat/completions"
+        estimated_tokens = self._estimate_tokens(payload)
+
+        attempt = 0
+        while True:
+            response, error = None, None
+            with self.rate_limiter.acquire(estimated_tokens):
+                try:
+                    response = self.http_pool.post(
+                        url, json=payload, headers=self._headers()
+                    )
+                except httpx.TransportError as e:
+                    error = e
+
+            if response is not None and response.status_code == 200:
+                self._record_usage(estimated_tokens, response)
+                return response
+
+            status = response.status_code if response is not None else None
+            delay = self._retry_delay(attempt, status, error, response)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def _apost(self, payload: dict):
+        """
+        Async variant of `_post`.
+        """
+        url = f"{self.base_url}/chat/completions"
+        estimated_tokens = self._estimate_tokens(payload)
+
+        attempt = 0
+        while True:
+            response, error = None, None
+            async with self.rate_limiter.aacquire(estimated_tokens):
+                try:
+                    response = await self.http_pool.apost(
+                        url, json=payload, headers=self._headers()
+                    )
+                except httpx.TransportError as e:
+                    error = e
+
+            if response is not None and response.status_code == 200:
+                self._record_usage(estimated_tokens, response)
+                return response
+
+            status = response.status_code if response is not None else None
+            delay = self._retry_delay(attempt, status, error, response)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+
+            await asyncio.sleep(delay)
+            attempt += 1
 
-        response = requests.post(url, json=payload, headers=headers)
+    def _complete(self, prompt, stop=None, **kwargs) -> str:
+        """
+        Call the OpenAI API with the given prompt and return the response.
+        """
+        payload = self._build_payload(
+            prompt, stream=False, response_schema=kwargs.get("response_schema")
+        )
+        return self._parse_response(self._post(payload))
 
+    async def _acomplete(self, prompt, stop=None, **kwargs) -> str:
+        """
+        Async variant of `_complete` that does not block a thread while waiting on OpenAI.
+        """
+        payload = self._build_payload(
+            prompt, stream=False, response_schema=kwargs.get("response_schema")
+        )
+        return self._parse_response(await self._apost(payload))
+
+    def _parse_response(self, response) -> str:
         if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
+            body = response.json()
+            usage = body.get("usage") or {}
+            self._record_tokens(
+                usage.get("prompt_tokens"),
+                usage.get("completion_tokens"),
+                _cached_tokens(usage),
+            )
+            return body["choices"][0]["message"]["content"]
         else:
-            raise Exception(f"Error: {response.status_code}, {response.text}")
+            raise LLMRequestError(response.status_code, response.text)
+
+    @staticmethod
+    def _parse_stream_line(line: str, usage: dict) -> Optional[str]:
+        """
+        Returns the token carried by one SSE line, or None if it carries no text.
+        The final chunk carries the token usage, which is stored in `usage`.
+        """
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            return None
+        chunk = json.loads(data)
+        if chunk.get("usage"):
+            usage.update(chunk["usage"])
+            usage["cached_tokens"] = _cached_tokens(chunk["usage"])
+        choices = chunk.get("choices") or []
+        if choices and choices[0].get("delta", {}).get("content"):
+            return choices[0]["delta"]["content"]
+        return None
+
+    def _stream_completion(self, input, usage: dict, **kwargs) -> Iterator[str]:
+        """
+        Call the OpenAI API with streaming enabled and yield tokens as they arrive.
+        """
+        url = f"{self.base_url}/chat/completions"
+        payload = self._build_payload(
+            input, stream=True, response_schema=kwargs.get("response_schema")
+        )
+        estimated_tokens = self._estimate_tokens(payload)
+
+        attempt = 0
+        while True:
+            # Only failures before the first token are retried, never a partial response
+            response, error, chunks = None, None, 0
+            with self.rate_limiter.acquire(estimated_tokens):
+                try:
+                    with self.http_pool.stream(
+                        "POST", url, json=payload, headers=self._headers()
+                    ) as response:
+                        if response.status_code == 200:
+                            try:
+                                # Server-sent events, each line looks like `data: {...}`
+                                for line in response.iter_lines():
+                                    token = self._parse_stream_line(line, usage)
+                                    if token:
+                                        chunks += 1
+                                        yield token
+                            finally:
+                                self._record_stream_usage(
+                                    payload, estimated_tokens, usage, chunks
+                                )
+                            return
+                        response.read()
+                except httpx.TransportError as e:
+                    if chunks:
+                        raise
+                    response, error = None, e
+
+            status = response.status_code if response is not None else None
+            delay = self._retry_delay(attempt, status, error, response)
+            if delay is None:
+                if error is not None:
+                    raise error
+                raise LLMRequestError(response.status_code, response.text)
+            time.sleep(delay)
+            attempt += 1
+
+    async def _astream_completion(
+        self, input, usage: dict, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of `_stream_completion`.
+        """
+        url = f"{self.base_url}/chat/completions"
+        payload = self._build_payload(
+            input, stream=True, response_schema=kwargs.get("response_schema")
+        )
+        estimated_tokens = self._estimate_tokens(payload)
+
+        attempt = 0
+        while True:
+            response, error, chunks = None, None, 0
+            async with self.rate_limiter.aacquire(estimated_tokens):
+                try:
+                    async with self.http_pool.astream(
+                        "POST", url, json=payload, headers=self._headers()
+                    ) as response:
+                        if response.status_code == 200:
+                            try:
+                                async for line in response.aiter_lines():
+                                    token = self._parse_stream_line(line, usage)
+                                    if token:
+                                        chunks += 1
+                                        yield token
+                            finally:
+                                self._record_stream_usage(
+                                    payload, estimated_tokens, usage, chunks
+                                )
+                            return
+                        await response.aread()
+                except httpx.TransportError as e:
+                    if chunks:
+                        raise
+                    response, error = None, e
+
+            status = response.status_code if response is not None else None
+            delay = self._retry_delay(attempt, status, error, response)
+            if delay is None:
+                if error is not None:
+                    raise error
+                raise LLMRequestError(response.status_code, response.text)
+            await asyncio.sleep(delay)
+            attempt += 1
 
     @property
     def _llm_type(self) -> str:
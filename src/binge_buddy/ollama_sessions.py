@@ -0,0 +1,108 @@
+"""Conversation sessions on top of Ollama's `context` token arrays"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from binge_buddy.metrics import metrics
+
+
+def parse_keep_alive(keep_alive: str) -> float:
+    """Converts an Ollama duration like "5m", "1h" or "30" (seconds) to seconds."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if keep_alive and keep_alive[-1] in units:
+        return float(keep_alive[:-1]) * units[keep_alive[-1]]
+    return float(keep_alive)
+
+
+def sessions_enabled(sessions: Optional[bool] = None) -> bool:
+    """Resolves an agent's flag, defaulting to the OLLAMA_SESSIONS environment variable."""
+    if sessions is not None:
+        return sessions
+    return os.getenv("OLLAMA_SESSIONS", "1") == "1"
+
+
+class OllamaSessionStore:
+    """
+    Keeps the `context` returned by `/api/generate` for every ongoing conversation.
+
+    Sending it back with only the new turn lets Ollama continue where the last
+    turn ended instead of re-encoding the whole conversation. A context is only
+    handed out while the model should still hold it in memory (`ttl`, which
+    matches the `keep_alive` sent with session requests) and while it fits in
+    the model's context window (`max_tokens`), otherwise the caller falls back
+    to replaying the full prompt.
+    """
+
+    def __init__(
+        self, ttl: float = 300.0, max_tokens: int = 4096, max_sessions: int = 1024
+    ):
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[List[int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, new_tokens: int = 0) -> Optional[List[int]]:
+        """
+        Returns the context to continue the session with, or None if the full
+        prompt must be replayed.
+
+        :param new_tokens: Estimated size of the new turn and its answer, which
+            have to fit as well.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                result, context = "miss", None
+            elif time.monotonic() - entry[1] > self.ttl:
+                del self._sessions[session_id]
+                result, context = "expired", None
+            elif len(entry[0]) + new_tokens > self.max_tokens:
+                del self._sessions[session_id]
+                result, context = "too_long", None
+            else:
+                self._sessions.move_to_end(session_id)
+                result, context = "hit", entry[0]
+
+        metrics.inc("llm_session_lookups", result=result)
+        return context
+
+    def put(self, session_id: str, context: List[int]):
+        with self._lock:
+            self._sessions[session_id] = (context, time.monotonic())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def drop(self, session_id: str):
+        """Forgets a session whose context no longer matches the conversation."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_default_store: Optional[OllamaSessionStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_session_store() -> OllamaSessionStore:
+    """
+    Returns the process-wide session store, configured from environment variables:
+
+    - OLLAMA_KEEP_ALIVE how long Ollama keeps the model loaded (default "5m")
+    - OLLAMA_CONTEXT_LENGTH the model's context window in tokens (default 4096)
+    """
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = OllamaSessionStore(
+                    ttl=parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "5m")),
+                    max_tokens=int(os.getenv("OLLAMA_CONTEXT_LENGTH", "4096")),
+                )
+    return _default_store
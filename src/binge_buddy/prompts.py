@@ -0,0 +1,40 @@
+"""Prompt assembly shared by the agents"""
+
+import os
+from typing import Optional, Union
+
+from langchain.prompts import PromptTemplate, SystemMessagePromptTemplate
+from langchain.schema import SystemMessage
+
+
+def stable_prefix_enabled(stable_prefix: Optional[bool] = None) -> bool:
+    """Resolves an agent's flag, defaulting to the LLM_STABLE_PREFIX environment variable."""
+    if stable_prefix is not None:
+        return stable_prefix
+    return os.getenv("LLM_STABLE_PREFIX", "0") == "1"
+
+
+def system_prompt(
+    template: str, stable_prefix: bool
+) -> Union[SystemMessage, SystemMessagePromptTemplate]:
+    """
+    Returns the system message of an agent's chat prompt.
+
+    By default the template's variables are filled in on every call, so no two
+    requests start the same way. With `stable_prefix` the variables are replaced
+    by static references to the messages that carry the same data after the
+    system prompt. The long instructions then form a byte-identical prefix that
+    OpenAI prompt caching and Ollama's KV cache can reuse.
+    """
+    if not stable_prefix:
+        return SystemMessagePromptTemplate.from_template(template)
+
+    prompt = PromptTemplate.from_template(template)
+    return SystemMessage(
+        content=prompt.format(
+            **{
+                variable: "(provided in the messages that follow)"
+                for variable in prompt.input_variables
+            }
+        )
+    )
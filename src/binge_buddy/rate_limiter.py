@@ -0,0 +1,239 @@
+"""Client-side rate limiting and retry policy for hosted LLM APIs"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `capacity` per minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` tokens if available and returns 0, otherwise returns how many
+        seconds to wait before trying again.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def adjust(self, amount: float):
+        """Charges (or refunds, if negative) tokens after the real cost is known."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """
+    Keeps the process under a provider's requests- and tokens-per-minute quotas
+    and caps the number of concurrent requests.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        max_concurrency: int = 8,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        # Concurrency slots, shared by threads and event loops alike
+        self._active = 0
+        self._slots = threading.Condition()
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = (
+            deque()
+        )
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "throttled": 0, "total_wait_seconds": 0.0}
+
+    def _next_wait(self, estimated_tokens: int) -> float:
+        wait = self.requests.reserve(1)
+        if wait:
+            return wait
+        wait = self.tokens.reserve(estimated_tokens)
+        if wait:
+            self.requests.adjust(-1)  # Give the request slot back until we can go
+        return wait
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["throttled"] += 1
+                self._stats["total_wait_seconds"] += waited
+
+    def _take_slot(self) -> bool:
+        """Takes a concurrency slot if one is free. Caller must hold `_slots`."""
+        if self._active < self.max_concurrency:
+            self._active += 1
+            return True
+        return False
+
+    def _release_slot(self):
+        """Frees a slot, or hands it straight to the oldest waiting coroutine."""
+        with self._slots:
+            while self._async_waiters:
+                loop, waiter = self._async_waiters.popleft()
+                if waiter.done():
+                    continue  # Cancelled while waiting
+                try:
+                    loop.call_soon_threadsafe(self._grant_slot, waiter)
+                    return
+                except RuntimeError:
+                    continue  # Its event loop is closed
+            self._active -= 1
+            self._slots.notify()
+
+    def _grant_slot(self, waiter: asyncio.Future):
+        """Runs on the waiter's loop, a slot granted to a cancelled waiter is passed on."""
+        if waiter.cancelled():
+            self._release_slot()
+        else:
+            waiter.set_result(None)
+
+    @contextmanager
+    def acquire(self, estimated_tokens: int) -> Iterator[None]:
+        """Blocks until the request fits in the quotas and a concurrency slot is free."""
+        waited = 0.0
+        while True:
+            wait = self._next_wait(estimated_tokens)
+            if not wait:
+                break
+            time.sleep(wait)
+            waited += wait
+
+        started = time.monotonic()
+        with self._slots:
+            while not self._take_slot():
+                self._slots.wait()
+        waited += time.monotonic() - started
+        self._record_wait(waited)
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    @asynccontextmanager
+    async def aacquire(self, estimated_tokens: int):
+        """Async variant of `acquire` that waits without blocking the event loop."""
+        waited = 0.0
+        while True:
+            wait = self._next_wait(estimated_tokens)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+
+        started = time.monotonic()
+        with self._slots:
+            waiter = None
+            if not self._take_slot():
+                # Woken by `_release_slot` as soon as a slot is handed over
+                waiter = asyncio.get_running_loop().create_future()
+                self._async_waiters.append((asyncio.get_running_loop(), waiter))
+        if waiter is not None:
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release_slot()  # Granted just before the cancellation
+                raise
+        waited += time.monotonic() - started
+        self._record_wait(waited)
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the provider reports the real usage."""
+        self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honors the `Retry-After` header."""
+
+    retryable_statuses = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(
+        self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, status_code: Optional[int]) -> bool:
+        """None stands for a connection error or timeout, which is always retried."""
+        return status_code is None or status_code in self.retryable_statuses
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Returns how long to sleep before retry number `attempt` (starting at 0)."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after).timestamp()
+                    return min(max(retry_at - time.time(), 0.0), self.max_delay)
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def estimate_tokens(text: str, max_completion_tokens: int = 512) -> int:
+    """Rough token estimate (4 characters per token) plus room for the completion."""
+    return len(text) // 4 + max_completion_tokens
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the process-wide OpenAI rate limiter, configured from environment variables:
+
+    - OPENAI_RPM requests per minute (default 500)
+    - OPENAI_TPM tokens per minute (default 200000)
+    - OPENAI_MAX_CONCURRENCY concurrent requests (default 8)
+    """
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter(
+                    requests_per_minute=float(os.getenv("OPENAI_RPM", "500")),
+                    tokens_per_minute=float(os.getenv("OPENAI_TPM", "200000")),
+                    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+                )
+    return _default_limiter
@@ -0,0 +1,141 @@
+"""Local first stage of the memory sentinel that answers small talk without the LLM"""
+
+import os
+import random
+import re
+from typing import Optional
+
+from binge_buddy.metrics import metrics
+
+# Messages made only of these words carry nothing worth remembering
+SMALL_TALK = {
+    "ok",
+    "okay",
+    "k",
+    "kk",
+    "thanks",
+    "thank",
+    "you",
+    "thx",
+    "ty",
+    "lol",
+    "lmao",
+    "haha",
+    "hahaha",
+    "hehe",
+    "yes",
+    "yeah",
+    "yep",
+    "yup",
+    "no",
+    "nope",
+    "nah",
+    "hi",
+    "hey",
+    "hello",
+    "bye",
+    "goodbye",
+    "sure",
+    "cool",
+    "nice",
+    "great",
+    "awesome",
+    "alright",
+    "right",
+    "wow",
+    "hmm",
+    "hm",
+    "oh",
+    "ah",
+    "good",
+    "night",
+    "morning",
+    "so",
+    "much",
+    "a",
+    "lot",
+    "sounds",
+    "that",
+    "perfect",
+    "got",
+    "it",
+    "will",
+    "do",
+    "maybe",
+    "idk",
+    "please",
+    "pls",
+}
+
+# Words that hint at a preference, habit or title, the sentinel prompt decides those
+PREFERENCE_HINTS = re.compile(
+    r"\b(i|i'm|im|i've|my|me|we|our)\b|"
+    r"\b(like|love|enjoy|hate|dislike|prefer|favou?rite|fan|into|watch\w*|binge\w*|"
+    r"rewatch\w*|stream\w*|netflix|hulu|prime|disney|hbo|apple|movie\w*|film\w*|"
+    r"show\w*|series|season\w*|episode\w*|anime|genre\w*|comed\w*|horror|thriller\w*|"
+    r"drama\w*|sci-?fi|action|romance|fantasy|documentar\w*|character\w*|actor\w*|"
+    r"director\w*|avoid|never|always|usually|every)\b",
+    re.IGNORECASE,
+)
+
+
+class SentinelPrefilter:
+    """
+    Rule-based classifier in front of the sentinel prompt.
+
+    `confidence` estimates how sure it is that a message contains nothing worth
+    remembering. Messages at or above `threshold` are answered FALSE locally,
+    all others escalate to the LLM. A random `audit_rate` of the skipped messages
+    is sent to the LLM anyway to measure how often the two disagree.
+    """
+
+    def __init__(self, threshold: float = 0.8, audit_rate: float = 0.05):
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+
+    @classmethod
+    def from_env(cls) -> Optional["SentinelPrefilter"]:
+        """
+        Builds the prefilter from environment variables, or returns None if
+        SENTINEL_PREFILTER is "0":
+
+        - SENTINEL_PREFILTER_THRESHOLD minimum confidence to skip the LLM (default 0.8)
+        - SENTINEL_AUDIT_RATE share of skipped messages checked by the LLM (default 0.05)
+        """
+        if os.getenv("SENTINEL_PREFILTER", "1") != "1":
+            return None
+        return cls(
+            threshold=float(os.getenv("SENTINEL_PREFILTER_THRESHOLD", "0.8")),
+            audit_rate=float(os.getenv("SENTINEL_AUDIT_RATE", "0.05")),
+        )
+
+    @staticmethod
+    def confidence(message: str) -> float:
+        """Returns how confident the rules are that the message has no information."""
+        words = re.findall(r"[a-z']+", message.lower())
+        if not words:
+            return 1.0  # Only punctuation, emoji or numbers
+        if PREFERENCE_HINTS.search(message):
+            return 0.0
+        if all(word in SMALL_TALK for word in words):
+            return 0.95
+        # Anything else may name a title ("Inception was amazing"), so the
+        # confidence stays below the default threshold and drops with length
+        return max(0.0, 0.65 - 0.05 * len(words))
+
+    def should_skip(self, message: str) -> bool:
+        """Decides whether the sentinel can answer FALSE without the LLM and counts the decision."""
+        skip = self.confidence(message) >= self.threshold
+        metrics.inc("sentinel_prefilter", decision="skip" if skip else "escalate")
+        return skip
+
+    def should_audit(self) -> bool:
+        return random.random() < self.audit_rate
+
+    @staticmethod
+    def record_audit(contains_information: bool):
+        """Counts whether the LLM agreed with a skip decision."""
+        metrics.inc(
+            "sentinel_prefilter_audits",
+            agreement="disagree" if contains_information else "agree",
+        )
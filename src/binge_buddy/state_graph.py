@@ -1,17 +1,218 @@
+import asyncio
+import contextvars
+import copy
 import logging
+import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from binge_buddy.metrics import RunUsage, metric_labels, metrics, track_usage
+
+
+class ExecutionBudget:
+    """
+    Limits on a single graph run. None means unlimited.
+
+    :param max_node_visits: Nodes executed, counting repeated visits of a repair loop.
+    :param max_llm_calls: Requests sent to the LLM backend (cache hits are free).
+    :param max_tokens: Prompt and completion tokens reported by the backend.
+    :param deadline_seconds: Wall-clock time since the run started.
+    """
+
+    def __init__(
+        self,
+        max_node_visits: Optional[int] = None,
+        max_llm_calls: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        deadline_seconds: Optional[float] = None,
+    ):
+        self.max_node_visits = max_node_visits
+        self.max_llm_calls = max_llm_calls
+        self.max_tokens = max_tokens
+        self.deadline_seconds = deadline_seconds
+
+    @classmethod
+    def from_env(cls) -> "ExecutionBudget":
+        """
+        Reads the default budget from environment variables, 0 disables a limit:
+
+        - GRAPH_MAX_NODE_VISITS (default 24)
+        - GRAPH_MAX_LLM_CALLS (default 16)
+        - GRAPH_MAX_TOKENS (default 0)
+        - GRAPH_DEADLINE_SECONDS (default 120)
+        """
+
+        def limit(name: str, default: str, cast=int):
+            value = cast(os.getenv(name, default))
+            return value or None
+
+        return cls(
+            max_node_visits=limit("GRAPH_MAX_NODE_VISITS", "24"),
+            max_llm_calls=limit("GRAPH_MAX_LLM_CALLS", "16"),
+            max_tokens=limit("GRAPH_MAX_TOKENS", "0"),
+            deadline_seconds=limit("GRAPH_DEADLINE_SECONDS", "120", float),
+        )
+
+
+class GraphRunResult:
+    """The outcome of one graph run and what it spent of its budget."""
+
+    def __init__(self, state, budget: Optional[ExecutionBudget] = None):
+        self.state = state
+        self.budget = budget
+        self.path: List[str] = []
+        # Name of the limit that ended the run early, None if it completed
+        self.exhausted: Optional[str] = None
+        self.usage = RunUsage()
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def completed(self) -> bool:
+        return self.exhausted is None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def visit(self, node: str, state):
+        self.path.append(node)
+        # Nodes that only have side effects (e.g. the memory handler) return None
+        if state is not None:
+            self.state = state
+
+    def check_budget(self) -> Optional[str]:
+        """Returns the limit the run has reached, if any."""
+        budget = self.budget
+        if budget is None:
+            return None
+        if (
+            budget.max_node_visits is not None
+            and len(self.path) >= budget.max_node_visits
+        ):
+            self.exhausted = "node_visits"
+        elif (
+            budget.max_llm_calls is not None
+            and self.usage.llm_calls >= budget.max_llm_calls
+        ):
+            self.exhausted = "llm_calls"
+        elif budget.max_tokens is not None and self.usage.tokens >= budget.max_tokens:
+            self.exhausted = "tokens"
+        elif (
+            budget.deadline_seconds is not None
+            and time.monotonic() - self.started >= budget.deadline_seconds
+        ):
+            self.exhausted = "deadline"
+        return self.exhausted
+
+    def as_dict(self) -> dict:
+        return {
+            "completed": self.completed,
+            "exhausted": self.exhausted,
+            "path": self.path,
+            "node_visits": len(self.path),
+            "llm_calls": self.usage.llm_calls,
+            "tokens": self.usage.tokens,
+            "seconds": self.seconds,
+        }
 
 
 class CustomStateGraph:
-    def __init__(self, state_cls):
+    def __init__(self, state_cls, max_workers: Optional[int] = None):
+        """
+        Every run is limited by the budget from `ExecutionBudget.from_env`, see `set_budget`.
+
+        :param max_workers: Threads shared by the parallel nodes of this graph when
+            it runs synchronously, defaults to the GRAPH_MAX_WORKERS environment variable (4).
+        """
         self.state_cls = state_cls  # The class used for states
         self.nodes = {}
+        self.async_nodes = {}
         self.entry_point = None
         self.edges = {}
+        self.max_workers = max_workers or int(os.getenv("GRAPH_MAX_WORKERS", "4"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.budget: Optional[ExecutionBudget] = ExecutionBudget.from_env()
+        self.budget_exit: Optional[str] = None
+        self._executor_lock = threading.Lock()
 
-    def add_node(self, name, function):
-        """Adds a processing node to the graph."""
+    def add_node(self, name, function, afunction=None):
+        """
+        Adds a processing node to the graph.
+
+        `afunction` is an optional coroutine variant used by `arun`. Nodes without
+        one are run in a worker thread when the graph is executed asynchronously.
+        """
         self.nodes[name] = function
+        if afunction is not None:
+            self.async_nodes[name] = afunction
+
+    def add_parallel_node(
+        self,
+        name: str,
+        branches: List[str],
+        merge_fn: Callable[[object, Dict[str, object]], object],
+    ):
+        """
+        Adds a node that runs the already added nodes `branches` at the same time
+        and joins them with `merge_fn(state, {branch: branch_state})`.
+
+        Every branch works on its own deep copy of the state, so branches cannot
+        see each other's changes and `merge_fn` decides which fields win. The
+        branches are run on the graph's thread pool by `run` and gathered on the
+        event loop by `arun`.
+        """
+        missing = [branch for branch in branches if branch not in self.nodes]
+        if missing:
+            raise ValueError(f"Parallel node '{name}' has unknown branches {missing}")
+
+        def run_branches(state):
+            executor = self._get_executor()
+            futures = {
+                branch: executor.submit(
+                    contextvars.copy_context().run,
+                    self._run_branch,
+                    branch,
+                    copy.deepcopy(state),
+                )
+                for branch in branches
+            }
+            return merge_fn(
+                state, {branch: future.result() for branch, future in futures.items()}
+            )
+
+        async def arun_branches(state):
+            results = await asyncio.gather(
+                *(
+                    self._arun_branch(branch, copy.deepcopy(state))
+                    for branch in branches
+                )
+            )
+            return merge_fn(state, dict(zip(branches, results)))
+
+        self.add_node(name, run_branches, arun_branches)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="graph-branch"
+                    )
+        return self._executor
+
+    def _run_branch(self, branch, state):
+        with metric_labels(agent=branch), metrics.timer("node_seconds"):
+            return self.nodes[branch](state)
+
+    async def _arun_branch(self, branch, state):
+        with metric_labels(agent=branch), metrics.timer("node_seconds"):
+            if branch in self.async_nodes:
+                return await self.async_nodes[branch](state)
+            return await asyncio.to_thread(self.nodes[branch], state)
 
     def set_entry_point(self, name):
         """Sets the entry point for the graph."""
@@ -25,32 +226,114 @@ class CustomStateGraph:
         """Adds a direct edge from one node to another."""
         self.edges[from_node] = (lambda state: "next", {"next": to_node})
 
-    def run(self, initial_state):
-        """Executes the graph starting from the entry point."""
-        state = initial_state
+    def set_budget(self, budget: Optional["ExecutionBudget"]):
+        """Sets the limits every run of the graph is held to, see `execute`."""
+        self.budget = budget
+
+    def set_budget_exit(self, name: Optional[str]):
+        """
+        Sets the node that runs once when a run exhausts its budget, e.g. to keep
+        what was produced so far. Without one the run just stops.
+        """
+        self.budget_exit = name
+
+    def _next_node(self, current_node, state):
+        """Returns the node to run after `current_node`, or None at the end of the graph."""
+        if current_node not in self.edges:
+            return None  # Stop if no edges exist
+        condition_fn, transitions = self.edges[current_node]
+        # Stop if no valid transition exists
+        return transitions.get(condition_fn(state))
+
+    def execute(
+        self, initial_state, budget: Optional["ExecutionBudget"] = None
+    ) -> "GraphRunResult":
+        """
+        Executes the graph starting from the entry point.
+
+        The run is held to `budget` (or the graph's own). Limits are checked
+        before every node, so a node that has started is never interrupted. Once
+        a limit is reached the budget exit node runs instead and the run ends.
+        """
+        result = GraphRunResult(initial_state, budget or self.budget)
         current_node = self.entry_point
 
-        while current_node:
-            if current_node not in self.nodes:
-                break  # End execution if no node exists
+        with track_usage() as result.usage:
+            while current_node in self.nodes:
+                exhausted = result.check_budget()
+                if exhausted is not None:
+                    result.state = self._budget_exit(result.state, exhausted)
+                    break
 
-            # Process the current node
-            node_fn = self.nodes[current_node]
-            state = node_fn(state)
+                # Process the current node
+                with metric_labels(
+                    agent=current_node, user_id=getattr(result.state, "user_id", None)
+                ):
+                    with metrics.timer("node_seconds"):
+                        result.visit(
+                            current_node, self.nodes[current_node](result.state)
+                        )
 
-            # Determine the next node
-            if current_node in self.edges:
-                condition_fn, transitions = self.edges[current_node]
-                transition_key = condition_fn(state)
+                current_node = self._next_node(current_node, result.state)
 
-                if transition_key in transitions:
-                    current_node = transitions[transition_key]
-                else:
-                    break  # Stop if no valid transition exists
-            else:
-                break  # Stop if no edges exist
+        result.finished = time.monotonic()
+        return result
+
+    async def aexecute(
+        self, initial_state, budget: Optional["ExecutionBudget"] = None
+    ) -> "GraphRunResult":
+        """Async variant of `execute`, running the nodes on the event loop."""
+        result = GraphRunResult(initial_state, budget or self.budget)
+        current_node = self.entry_point
+
+        with track_usage() as result.usage:
+            while current_node in self.nodes:
+                exhausted = result.check_budget()
+                if exhausted is not None:
+                    result.state = await asyncio.to_thread(
+                        self._budget_exit, result.state, exhausted
+                    )
+                    break
+
+                # Process the current node, natively if it has an async variant
+                with metric_labels(
+                    agent=current_node, user_id=getattr(result.state, "user_id", None)
+                ):
+                    with metrics.timer("node_seconds"):
+                        if current_node in self.async_nodes:
+                            state = await self.async_nodes[current_node](result.state)
+                        else:
+                            state = await asyncio.to_thread(
+                                self.nodes[current_node], result.state
+                            )
+                        result.visit(current_node, state)
+
+                current_node = self._next_node(current_node, result.state)
+
+        result.finished = time.monotonic()
+        return result
+
+    def _budget_exit(self, state, exhausted: str):
+        metrics.inc("graph_budget_exhausted", limit=exhausted)
+        logging.warning(
+            f"Graph run for {getattr(state, 'user_id', None)} exhausted its {exhausted} "
+            f"budget, exiting through {self.budget_exit}"
+        )
+        if self.budget_exit is None or self.budget_exit not in self.nodes:
+            return state
+        with metric_labels(
+            agent=self.budget_exit, user_id=getattr(state, "user_id", None)
+        ):
+            output = self.nodes[self.budget_exit](state)
+        return state if output is None else output
+
+    def run(self, initial_state):
+        """Executes the graph starting from the entry point and returns the final state."""
+        return self.execute(initial_state).state
 
-        return state  # Return the final state
+    async def arun(self, initial_state):
+        """Executes the graph on the running event loop, starting from the entry point."""
+        return (await self.aexecute(initial_state)).state
 
     def run_with_logging(self, initial_state):
         """Executes the graph while logging each step."""
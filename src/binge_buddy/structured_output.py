@@ -0,0 +1,100 @@
+"""JSON schemas for the memory agents' structured-output mode"""
+
+import json
+import logging
+import os
+from typing import List, Optional
+
+from binge_buddy import utils
+from binge_buddy.enums import Attribute
+from binge_buddy.metrics import metrics
+
+# The attribute names the agents' prompts ask for, e.g. "Wants To Watch" -> "WANTS_TO_WATCH"
+ATTRIBUTES = [attribute.value.upper().replace(" ", "_") for attribute in Attribute]
+
+
+def memory_list_schema(title: str, with_attribute: bool) -> dict:
+    """
+    Returns the schema of an object wrapping a list of memories, either plain
+    strings or `{"information", "attribute"}` objects.
+
+    The list is wrapped in an object because OpenAI's strict mode requires an
+    object at the root. Every property is required and no extra ones are
+    allowed, which strict mode requires as well.
+    """
+    if with_attribute:
+        item = {
+            "type": "object",
+            "properties": {
+                "information": {"type": "string"},
+                "attribute": {"type": "string", "enum": ATTRIBUTES},
+            },
+            "required": ["information", "attribute"],
+            "additionalProperties": False,
+        }
+    else:
+        item = {"type": "string"}
+
+    return {
+        "title": title,
+        "type": "object",
+        "properties": {"memories": {"type": "array", "items": item}},
+        "required": ["memories"],
+        "additionalProperties": False,
+    }
+
+
+EXTRACTED_MEMORIES_SCHEMA = memory_list_schema("extracted_memories", False)
+ATTRIBUTED_MEMORIES_SCHEMA = memory_list_schema("attributed_memories", True)
+AGGREGATED_MEMORIES_SCHEMA = memory_list_schema("aggregated_memories", True)
+
+
+def structured_output_enabled(structured_output: Optional[bool] = None) -> bool:
+    """Resolves an agent's flag, defaulting to the LLM_STRUCTURED_OUTPUT environment variable."""
+    if structured_output is not None:
+        return structured_output
+    return os.getenv("LLM_STRUCTURED_OUTPUT", "0") == "1"
+
+
+def load_memories(response: str, with_attribute: bool = False) -> List:
+    """
+    Returns the memories of a response generated with one of the schemas above,
+    or an empty list if the backend did not honor the schema.
+
+    Items that do not match the schema, e.g. an object without an information
+    or with an unknown attribute, are dropped and counted in
+    `structured_output_rejected{reason}`, the rest of the list is kept.
+
+    :param with_attribute: Whether the items are `{"information", "attribute"}`
+        objects rather than plain strings, see `memory_list_schema`.
+    """
+    try:
+        memories = json.loads(utils.remove_think_tags(response))["memories"]
+    except (ValueError, KeyError, TypeError) as e:
+        metrics.inc("parse_failures")
+        logging.error(f"Structured output did not match the schema: {e}")
+        return []
+
+    if not isinstance(memories, list):
+        metrics.inc("parse_failures")
+        logging.error(f"Structured output did not match the schema: {memories}")
+        return []
+
+    valid = []
+    for memory in memories:
+        if with_attribute and not isinstance(memory, dict):
+            reason = "malformed"
+        else:
+            information = memory.get("information") if with_attribute else memory
+            attribute = memory.get("attribute") if with_attribute else None
+            if not isinstance(information, str) or not information.strip():
+                reason = "information"
+            elif with_attribute and attribute not in ATTRIBUTES:
+                reason = "attribute"
+            else:
+                valid.append(memory)
+                continue
+
+        metrics.inc("structured_output_rejected", reason=reason)
+        logging.warning(f"Structured output item dropped ({reason}): {memory!r}")
+    return valid
@@ -1,4 +1,5 @@
 import re
+from typing import List, Optional
 
 
 def remove_think_tags(response: str) -> str:
@@ -14,3 +15,131 @@ def remove_think_tags(response: str) -> str:
     return clean_response.strip()
 
 
+def _partial_suffix(text: str, tags: List[str]) -> int:
+    """Returns the length of the longest end of `text` that could start one of `tags`."""
+    longest = 0
+    for tag in tags:
+        for length in range(min(len(tag) - 1, len(text)), longest, -1):
+            if text.endswith(tag[:length]):
+                longest = length
+                break
+    return longest
+
+
+class ThinkTagFilter:
+    """
+    Removes <think>...</think> spans from streamed text as the chunks arrive.
+
+    Tags split across chunks are handled by holding back the end of a chunk
+    while it could still be the start of a tag.
+    """
+
+    OPEN = "<think>"
+    CLOSE = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self._thinking = False
+
+    def feed(self, chunk: str) -> str:
+        """Returns the visible text that can be released after this chunk."""
+        self._buffer += chunk
+        visible = []
+
+        while self._buffer:
+            if self._thinking:
+                end = self._buffer.find(self.CLOSE)
+                if end == -1:
+                    # Only keep what could be the start of the closing tag
+                    keep = _partial_suffix(self._buffer, [self.CLOSE])
+                    self._buffer = self._buffer[len(self._buffer) - keep :]
+                    break
+                self._buffer = self._buffer[end + len(self.CLOSE) :]
+                self._thinking = False
+            else:
+                start = self._buffer.find(self.OPEN)
+                if start == -1:
+                    keep = _partial_suffix(self._buffer, [self.OPEN])
+                    visible.append(self._buffer[: len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep :]
+                    break
+                visible.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(self.OPEN) :]
+                self._thinking = True
+
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """Returns the text held back at the end of the stream. An unclosed think span is dropped."""
+        remaining = "" if self._thinking else self._buffer
+        self._buffer = ""
+        return remaining
+
+
+class StreamFilter:
+    """
+    Filters a streamed completion down to the answer: <think> spans are removed
+    and the stream is marked `done` once the visible text reaches a stop
+    sequence or `max_tokens` chunks.
+
+    Stop sequences are only looked for after the first non-whitespace visible
+    text, so a stop sequence like "\\n" does not end the answer before it starts.
+    """
+
+    def __init__(
+        self, stop: Optional[List[str]] = None, max_tokens: Optional[int] = None
+    ):
+        self.stop = [sequence for sequence in (stop or []) if sequence]
+        self.max_tokens = max_tokens
+        self.done = False
+        self.tokens = 0  # Visible chunks released so far
+
+        self._think = ThinkTagFilter()
+        self._pending = ""  # Visible text that could be the start of a stop sequence
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        """Returns the answer text that can be released after this chunk."""
+        if self.done:
+            return ""
+        return self._release(self._think.feed(chunk), final=False)
+
+    def flush(self) -> str:
+        """Returns the text held back at the end of the stream."""
+        if self.done:
+            return ""
+        text = self._release(self._think.flush(), final=True)
+        self.done = True
+        return text
+
+    def _release(self, text: str, final: bool) -> str:
+        text = self._pending + text
+        self._pending = ""
+        if not text:
+            return ""
+
+        leading = ""
+        if not self._started:
+            answer = text.lstrip()
+            if not answer:
+                return text
+            leading, text = text[: len(text) - len(answer)], answer
+            self._started = True
+
+        self.tokens += 1
+
+        cuts = [text.find(sequence) for sequence in self.stop]
+        cuts = [cut for cut in cuts if cut != -1]
+        if cuts:
+            self.done = True
+            return leading + text[: min(cuts)]
+
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            self.done = True
+            return leading + text
+
+        if not final:
+            keep = _partial_suffix(text, self.stop)
+            self._pending = text[len(text) - keep :]
+            text = text[: len(text) - keep]
+        return leading + text
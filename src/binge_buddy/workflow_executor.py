@@ -0,0 +1,315 @@
+"""Bounded worker pool that runs the memory workflows in the background"""
+
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from binge_buddy.metrics import metrics
+
+POLICIES = ("block", "drop", "reject")
+
+
+class WorkflowQueueFull(RuntimeError):
+    """Raised by `WorkflowExecutor.submit` when a job cannot be queued."""
+
+
+class _Job:
+    def __init__(self, fn: Callable, args: tuple):
+        self.fn = fn
+        self.args = args
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        # Workers run the job with the submitter's metric labels
+        self.context = contextvars.copy_context()
+
+
+class _Lane:
+    def __init__(self):
+        # (fn, item, on_drop) in arrival order
+        self.pending: List[
+            Tuple[Callable[[List], object], object, Optional[Callable]]
+        ] = []
+        # A job for the lane is queued or running, new items just wait for it
+        self.active = False
+
+
+class WorkflowExecutor:
+    """
+    Runs workflow jobs on `max_workers` threads fed by a queue of at most `max_queue` jobs.
+
+    What happens when the queue is full depends on `policy`:
+
+    - "block" makes the submitter wait for a free slot (backpressure), up to
+      `block_timeout` seconds if set, after which the job is rejected,
+    - "drop" discards the new job and returns None,
+    - "reject" raises `WorkflowQueueFull` right away.
+
+    `submit_serial` adds per-key lanes on top: jobs of one lane run one after
+    the other, and items that arrive while the lane is busy are coalesced into
+    a single call of at most `max_coalesce` items.
+
+    `shutdown` stops accepting jobs and lets the workers drain the queue.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue: int = 64,
+        policy: str = "block",
+        block_timeout: Optional[float] = None,
+        name: str = "workflow",
+        max_coalesce: int = 8,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(
+                f"Unknown queue policy '{policy}', expected one of {POLICIES}"
+            )
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+        self.max_coalesce = max_coalesce
+
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "rejected": 0,
+            "coalesced": 0,
+            "in_flight": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+        self._closed = False
+        self._lanes: Dict[Hashable, _Lane] = {}
+
+        self._workers = [
+            threading.Thread(
+                target=self._worker_loop, name=f"{name}-worker-{i}", daemon=True
+            )
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable, *args) -> Optional[Future]:
+        """
+        Queues `fn(*args)` and returns a future for its result, or None if the
+        job was dropped.
+        """
+        if self._closed:
+            raise RuntimeError(f"Workflow executor '{self.name}' has been shut down")
+
+        job = _Job(fn, args)
+        try:
+            if self.policy == "block":
+                self._queue.put(job, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(job)
+        except queue.Full:
+            outcome = "dropped" if self.policy == "drop" else "rejected"
+            self._count(outcome)
+            logging.warning(
+                f"Workflow queue '{self.name}' is full ({self.max_queue} jobs), job {outcome}"
+            )
+            if outcome == "dropped":
+                return None
+            raise WorkflowQueueFull(
+                f"Workflow queue '{self.name}' is full ({self.max_queue} jobs)"
+            )
+
+        self._count("submitted")
+        return job.future
+
+    def submit_serial(
+        self,
+        key: Hashable,
+        fn: Callable[[List], object],
+        item,
+        on_drop: Optional[Callable[[object], None]] = None,
+    ):
+        """
+        Queues `item` on the lane `key` (e.g. a user id), to be processed by
+        `fn([item, ...])` after everything queued on the lane before it.
+
+        While a job for the lane is waiting or running, items are only added to
+        the lane. The next job takes all of them, and consecutive items with the
+        same `fn` are passed to a single call. The queue policy applies to the
+        job that starts an idle lane. If that job is refused, or the executor
+        was shut down, the lane is abandoned and `on_drop(item)` is called for
+        each of its items, including the ones that joined it meanwhile.
+        """
+        with self._lock:
+            lane = self._lanes.setdefault(key, _Lane())
+            lane.pending.append((fn, item, on_drop))
+            if lane.active:
+                return
+            lane.active = True
+
+        try:
+            future = self.submit(self._run_lane, key)
+        except RuntimeError:  # Including WorkflowQueueFull
+            self._abandon_lane(key)
+            raise
+        if future is None:
+            self._abandon_lane(key)
+
+    def _abandon_lane(self, key: Hashable):
+        """Forgets a lane whose job was refused, with the items that joined it meanwhile."""
+        with self._lock:
+            lane = self._lanes.pop(key)
+        if len(lane.pending) > 1:
+            logging.warning(
+                f"Workflow lane {key}: {len(lane.pending) - 1} more items dropped with it"
+            )
+        for _, item, on_drop in lane.pending:
+            if on_drop is None:
+                continue
+            try:
+                on_drop(item)
+            except Exception as e:
+                logging.exception(f"Workflow lane {key}: dropping an item failed: {e}")
+
+    def _run_lane(self, key: Hashable):
+        """Processes the lane's items until it is empty, so a lane never runs twice at once."""
+        while True:
+            with self._lock:
+                lane = self._lanes[key]
+                if not lane.pending:
+                    del self._lanes[key]
+                    return
+                batch = lane.pending[: self.max_coalesce]
+                lane.pending = lane.pending[self.max_coalesce :]
+
+            # Consecutive items of the same function make one call
+            start = 0
+            for end in range(1, len(batch) + 1):
+                if end == len(batch) or batch[end][0] != batch[start][0]:
+                    if end - start > 1:
+                        with self._lock:
+                            self._stats["coalesced"] += end - start - 1
+                        metrics.inc("workflow_coalesced", end - start - 1)
+                    try:
+                        batch[start][0]([item for _, item, _ in batch[start:end]])
+                    except Exception as e:
+                        logging.exception(f"Workflow lane {key} failed: {e}")
+                    start = end
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._stats[outcome] += 1
+        metrics.inc("workflow_jobs", outcome=outcome)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            wait = time.monotonic() - job.enqueued_at
+            metrics.observe("workflow_queue_wait_seconds", wait)
+            with self._lock:
+                self._stats["in_flight"] += 1
+                self._stats["total_wait_seconds"] += wait
+                self._stats["max_wait_seconds"] = max(
+                    self._stats["max_wait_seconds"], wait
+                )
+
+            try:
+                result = job.context.run(job.fn, *job.args)
+            except Exception as e:
+                logging.exception(f"Workflow job failed: {e}")
+                job.future.set_exception(e)
+                outcome = "failed"
+            else:
+                job.future.set_result(result)
+                outcome = "completed"
+            finally:
+                with self._lock:
+                    self._stats["in_flight"] -= 1
+            self._count(outcome)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns queue depth, in-flight jobs, outcomes and queue wait times."""
+        with self._lock:
+            stats = dict(self._stats)
+        started = stats["completed"] + stats["failed"] + stats["in_flight"]
+        stats["queue_depth"] = self._queue.qsize()
+        stats["mean_wait_seconds"] = (
+            stats.pop("total_wait_seconds") / started if started else 0.0
+        )
+        stats["lanes"] = len(self._lanes)
+        stats["max_workers"] = self.max_workers
+        stats["max_queue"] = self.max_queue
+        return stats
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        Stops accepting jobs and finishes the ones already queued.
+
+        :param timeout: Seconds to wait for the queue to drain, the remaining
+            jobs are abandoned with the (daemon) workers after that.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._queue.put(None)  # Queued after every pending job
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for worker in self._workers:
+                worker.join(
+                    None if deadline is None else max(0.0, deadline - time.monotonic())
+                )
+            if any(worker.is_alive() for worker in self._workers):
+                logging.warning(
+                    f"Workflow executor '{self.name}' did not drain within {timeout}s, "
+                    f"abandoning the remaining jobs"
+                )
+
+
+_default_executor: Optional[WorkflowExecutor] = None
+_default_executor_lock = threading.Lock()
+
+
+def get_workflow_executor() -> WorkflowExecutor:
+    """
+    Returns the process-wide workflow executor, configured from environment variables:
+
+    - WORKFLOW_WORKERS workflows run in parallel (default 4)
+    - WORKFLOW_QUEUE_SIZE jobs waiting for a worker (default 64)
+    - WORKFLOW_QUEUE_POLICY "block", "drop" or "reject" when the queue is full (default block)
+    - WORKFLOW_BLOCK_TIMEOUT seconds a blocked submitter waits before the job is rejected (default 5)
+    - WORKFLOW_MAX_COALESCE messages of one user combined into one run (default 8)
+    - WORKFLOW_DRAIN_SECONDS how long the queue may drain when the process exits (default 30)
+
+    The executor drains its queue when the interpreter exits.
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                executor = WorkflowExecutor(
+                    max_workers=int(os.getenv("WORKFLOW_WORKERS", "4")),
+                    max_queue=int(os.getenv("WORKFLOW_QUEUE_SIZE", "64")),
+                    policy=os.getenv("WORKFLOW_QUEUE_POLICY", "block"),
+                    block_timeout=float(os.getenv("WORKFLOW_BLOCK_TIMEOUT", "5")),
+                    max_coalesce=int(os.getenv("WORKFLOW_MAX_COALESCE", "8")),
+                )
+                atexit.register(
+                    executor.shutdown,
+                    timeout=float(os.getenv("WORKFLOW_DRAIN_SECONDS", "30")),
+                )
+                _default_executor = executor
+    return _default_executor
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+from langchain_core.language_models import FakeListLLM
+
+from binge_buddy.agent_state.states import SemanticAgentState
+from binge_buddy.durable_queue import DurableJobQueue
+from binge_buddy.message import UserMessage
+from binge_buddy.message_log import MessageLog
+from binge_buddy.workflow_executor import WorkflowExecutor
+
+
+class NoMemories:
+    def get_existing_memories(self, user_id):
+        return []
+
+    def process(self, state):
+        pass
+
+
+def make_state(content="I love Dune"):
+    message = UserMessage(content=content, user_id="u", session_id="s")
+    return SemanticAgentState(
+        user_id="u", existing_memories=[], current_user_message=message
+    )
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "workflows.db")
+
+
+def test_expired_lease_is_taken_over(path):
+    crashed = DurableJobQueue(path, lease_seconds=0.1)
+    job_id = crashed.enqueue("q", "u", make_state())
+    crashed.close()
+
+    queue = DurableJobQueue(path, lease_seconds=0.1)
+    assert queue.claim_due("q") == []
+
+    time.sleep(0.15)
+    claimed = queue.claim_due("q")
+    assert [claimed_id for claimed_id, _ in claimed] == [job_id]
+    assert claimed[0][1].current_user_message.content == "I love Dune"
+    assert queue.renew([job_id]) == [job_id]
+    queue.close()
+
+
+def test_renewed_lease_is_not_taken_over(path):
+    holder = DurableJobQueue(path, lease_seconds=0.2)
+    other = DurableJobQueue(path, lease_seconds=0.2)
+    job_id = holder.enqueue("q", "u", make_state())
+
+    for _ in range(3):
+        time.sleep(0.1)
+        assert holder.renew([job_id]) == [job_id]
+        assert other.claim_due("q") == []
+
+    time.sleep(0.25)
+    assert [claimed_id for claimed_id, _ in other.claim_due("q")] == [job_id]
+    # The job is no longer ours to run or complete
+    assert holder.renew([job_id]) == []
+    holder.complete([job_id])
+    assert other.stats()["leased"] == 1
+    holder.close()
+    other.close()
+
+
+def test_held_job_is_not_claimed_again(path):
+    queue = DurableJobQueue(path, lease_seconds=0.05)
+    job_id = queue.enqueue("q", "u", make_state())
+
+    time.sleep(0.1)
+    assert queue.claim_due("q") == []
+    assert queue.heartbeat() == [job_id]
+
+    queue.release([job_id])
+    assert queue.stats() == {"pending": 1, "leased": 0, "dead": 0}
+    queue.close()
+
+
+def test_failed_job_is_retried_then_dead(path):
+    queue = DurableJobQueue(path, max_attempts=2, retry_seconds=0.05)
+    job_id = queue.enqueue("q", "u", make_state())
+
+    queue.fail([job_id], "boom")
+    assert queue.claim_due("q") == []
+    time.sleep(0.06)
+    assert [claimed_id for claimed_id, _ in queue.claim_due("q")] == [job_id]
+
+    queue.fail([job_id], "boom")
+    assert queue.stats() == {"pending": 0, "leased": 0, "dead": 1}
+    queue.close()
+
+
+def test_waiting_job_runs_once_past_its_lease(path):
+    queue = DurableJobQueue(path, lease_seconds=0.2, poll_seconds=0.05)
+    executor = WorkflowExecutor(max_workers=2)
+    log = MessageLog(
+        "u",
+        "s",
+        NoMemories(),
+        "semantic",
+        llm=FakeListLLM(responses=[""]),
+        executor=executor,
+        durable_queue=queue,
+    )
+
+    runs = []
+    started = threading.Event()
+
+    def slow_workflow(state):
+        runs.append(state.current_user_message.content)
+        started.set()
+        time.sleep(0.6)
+
+    log.subscribers = [slow_workflow]
+    log.add_message(UserMessage(content="I love Dune", user_id="u", session_id="s"))
+    assert started.wait(2)
+    # Waits in the lane for longer than its lease while the first run is slow
+    log.add_message(UserMessage(content="and Alien", user_id="u", session_id="s"))
+
+    time.sleep(1.5)
+    executor.shutdown()
+
+    assert runs == ["I love Dune", "and Alien"]
+    assert queue.stats() == {"pending": 0, "leased": 0, "dead": 0}
+    queue.close()
@@ -0,0 +1,115 @@
+import httpx
+import pytest
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+
+from binge_buddy.fake_llm_server import FakeLLMServer
+from binge_buddy.http_pool import HTTPPool
+from binge_buddy.ollama import OllamaLLM, OpenAILLM
+from binge_buddy.rate_limiter import RetryPolicy
+
+PROMPT = ChatPromptTemplate.from_messages(
+    [("system", "You are Binge Buddy."), ("human", "{message}")]
+)
+STOP = ["HumanMessage"]
+
+
+class RecordingCallbacks(BaseCallbackHandler):
+    def __init__(self):
+        self.events = []
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.events.append("start")
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.events.append(token)
+
+    def on_llm_end(self, response, **kwargs):
+        self.events.append("end")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_SIZE", "0")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    with FakeLLMServer(port=0, tokens_per_second=0) as server:
+        yield server
+
+
+def make_llm(backend, server, **kwargs):
+    if backend == "ollama":
+        return OllamaLLM(port=server.port, **kwargs)
+    llm = OpenAILLM(temperature=0, **kwargs)
+    llm.base_url = server.url + "/v1"
+    return llm
+
+
+def record_payloads(monkeypatch, llm_cls):
+    payloads = []
+    build_payload = llm_cls._build_payload
+
+    def recording(self, prompt, stream, **kwargs):
+        payload = build_payload(self, prompt, stream, **kwargs)
+        payloads.append(
+            {
+                key: value
+                for key, value in payload.items()
+                if key not in ("stream", "stream_options")
+            }
+        )
+        return payload
+
+    monkeypatch.setattr(llm_cls, "_build_payload", recording)
+    return payloads
+
+
+@pytest.mark.parametrize("backend", ["ollama", "openai"])
+def test_streamed_call_sends_the_same_request(backend, server, monkeypatch):
+    llm = make_llm(backend, server)
+    payloads = record_payloads(monkeypatch, type(llm))
+    prompt = PROMPT.invoke({"message": "I love Dune"})
+
+    answer = llm._call(prompt, stop=STOP)
+    streamed = "".join(llm.stream(prompt, stop=STOP))
+
+    assert streamed == answer
+    assert len(payloads) == 2
+    assert payloads[0] == payloads[1]
+
+
+@pytest.mark.parametrize("backend", ["ollama", "openai"])
+def test_streamed_call_reports_visible_tokens(backend, server):
+    llm = make_llm(backend, server)
+    callbacks = RecordingCallbacks()
+
+    tokens = list(
+        llm.stream(
+            PROMPT.invoke({"message": "I love Dune"}),
+            config={"callbacks": [callbacks]},
+            stop=STOP,
+        )
+    )
+
+    assert tokens
+    assert callbacks.events == ["start", *tokens, "end"]
+
+
+@pytest.mark.parametrize("backend", ["ollama", "openai"])
+def test_streamed_call_recovers_from_a_connection_error(backend, server, monkeypatch):
+    llm = make_llm(backend, server, retry_policy=RetryPolicy(base_delay=0))
+    prompt = PROMPT.invoke({"message": "I love Dune"})
+    answer = llm._call(prompt, stop=STOP)
+
+    opened = []
+    stream = HTTPPool.stream
+
+    def flaky(self, method, url, **kwargs):
+        opened.append(url)
+        if len(opened) == 1:
+            raise httpx.ConnectError("connection refused")
+        return stream(self, method, url, **kwargs)
+
+    monkeypatch.setattr(HTTPPool, "stream", flaky)
+
+    assert "".join(llm.stream(prompt, stop=STOP)) == answer
+    assert len(opened) == 2
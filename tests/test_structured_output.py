@@ -0,0 +1,53 @@
+import json
+
+from langchain_core.language_models import FakeListLLM
+
+from binge_buddy.agent_state.states import SemanticAgentState
+from binge_buddy.agents.memory_attributor import MemoryAttributor
+from binge_buddy.message import UserMessage
+from binge_buddy.structured_output import load_memories
+
+PARTIALLY_MALFORMED = json.dumps(
+    {
+        "memories": [
+            {"information": "Likes Dune", "attribute": "LIKES"},
+            {"information": "Likes Alien"},
+            {"information": "Watches on Netflix", "attribute": "STREAMING"},
+            {"information": "  ", "attribute": "LIKES"},
+            "Dislikes horror",
+            {"information": "Dislikes horror", "attribute": "DISLIKES"},
+        ]
+    }
+)
+
+
+def test_malformed_items_are_dropped():
+    assert load_memories(PARTIALLY_MALFORMED, with_attribute=True) == [
+        {"information": "Likes Dune", "attribute": "LIKES"},
+        {"information": "Dislikes horror", "attribute": "DISLIKES"},
+    ]
+
+
+def test_plain_string_items():
+    response = json.dumps({"memories": ["Likes Dune", "", 3, {"information": "x"}]})
+    assert load_memories(response) == ["Likes Dune"]
+
+
+def test_unreadable_response_gives_no_memories():
+    assert load_memories("<think>hmm</think>not json") == []
+    assert load_memories(json.dumps({"memories": "Likes Dune"})) == []
+
+
+def test_attributor_keeps_the_well_formed_memories():
+    attributor = MemoryAttributor(FakeListLLM(responses=[""]), structured_output=True)
+    message = UserMessage(content="I like Dune", user_id="u", session_id="s")
+    state = SemanticAgentState(
+        user_id="u", existing_memories=[], current_user_message=message
+    )
+
+    memories = attributor.format_memories(PARTIALLY_MALFORMED, state)
+
+    assert [(memory.information, memory.attribute) for memory in memories] == [
+        ("Likes Dune", "LIKES"),
+        ("Dislikes horror", "DISLIKES"),
+    ]
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from binge_buddy.workflow_executor import WorkflowExecutor, WorkflowQueueFull
+
+
+def test_lane_coalesces_items_in_order():
+    executor = WorkflowExecutor(max_workers=2, max_coalesce=3)
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def slow(items):
+        calls.append(("slow", items))
+        started.set()
+        release.wait(2)
+
+    def record(items):
+        calls.append(("record", items))
+
+    def other(items):
+        calls.append(("other", items))
+
+    executor.submit_serial("u", slow, 0)
+    assert started.wait(2)
+    for item in (1, 2, 3, 4):
+        executor.submit_serial("u", record, item)
+    executor.submit_serial("u", other, 5)
+    executor.submit_serial("u", record, 6)
+    release.set()
+    executor.shutdown()
+
+    # At most `max_coalesce` items per batch, a call per run of the same function
+    assert calls == [
+        ("slow", [0]),
+        ("record", [1, 2, 3]),
+        ("record", [4]),
+        ("other", [5]),
+        ("record", [6]),
+    ]
+    assert executor.stats()["coalesced"] == 2
+    assert executor.stats()["lanes"] == 0
+
+
+def test_lanes_run_one_at_a_time():
+    executor = WorkflowExecutor(max_workers=4)
+    lock = threading.Lock()
+    running = {}
+    overlaps = []
+    seen = {"a": [], "b": []}
+
+    def run(items):
+        key = items[0][0]
+        with lock:
+            if running.get(key):
+                overlaps.append(key)
+            running[key] = True
+        seen[key].extend(index for _, index in items)
+        with lock:
+            running[key] = False
+
+    for index in range(20):
+        for key in ("a", "b"):
+            executor.submit_serial(key, run, (key, index))
+    executor.shutdown()
+
+    assert overlaps == []
+    assert seen == {"a": list(range(20)), "b": list(range(20))}
+
+
+def test_full_queue_abandons_lane_and_drops_its_items():
+    executor = WorkflowExecutor(max_workers=1, max_queue=1, policy="reject")
+    release = threading.Event()
+    started = threading.Event()
+
+    def block(items):
+        started.set()
+        release.wait(2)
+
+    dropped = []
+    executor.submit_serial("busy", block, 0)
+    assert started.wait(2)
+    executor.submit_serial("queued", block, 1)
+
+    with pytest.raises(WorkflowQueueFull):
+        executor.submit_serial("u", block, 2, on_drop=dropped.append)
+    assert dropped == [2]
+    assert executor.stats()["lanes"] == 2
+
+    release.set()
+    executor.shutdown()
+    assert executor.stats()["lanes"] == 0
+
+
+def test_shutdown_abandons_new_lanes():
+    executor = WorkflowExecutor(max_workers=1)
+    executor.shutdown()
+
+    dropped = []
+    with pytest.raises(RuntimeError):
+        executor.submit_serial("u", lambda items: None, 1, on_drop=dropped.append)
+    assert dropped == [1]
+    # The lane is not left active, so nothing would be queued on it forever
+    assert executor.stats()["lanes"] == 0
+
+
+def test_failing_batch_does_not_stop_the_lane():
+    executor = WorkflowExecutor(max_workers=1)
+    calls = []
+
+    def fail(items):
+        calls.append(items)
+        raise RuntimeError("boom")
+
+    executor.submit_serial("u", fail, 1)
+    executor.submit_serial("u", calls.append, 2)
+    executor.shutdown()
+
+    assert calls[-1] == [2]